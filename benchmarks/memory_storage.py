@@ -0,0 +1,61 @@
+"""
+Compares the native in-memory storage against SQLite using an in-memory database, both
+created through the StorageFactory, over a full generation cycle.
+
+Run it from the root of the repository:
+    python -m benchmarks.memory_storage --population 50000 --genes 30
+"""
+import argparse
+import random
+import time
+
+from coordinator.services.storage.factory import StorageFactory, StorageDrivers
+from shared.models.value_objects.individual import IndividualValue, IndividualFitnessValue
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    res = fn(*args)
+    return res, time.perf_counter() - start
+
+
+def run(storage, population):
+    ex_id, _ = storage.create_experiment('benchmark')
+    generation_id = storage.create_generation(ex_id)
+    timings = {}
+    _, timings['store population'] = timed(storage.store_population, generation_id, population)
+    untested, timings['untested'] = timed(storage.get_non_evaluated_individuals, generation_id)
+    start = time.perf_counter()
+    for ind in untested[:len(untested) // 2]:  # results arriving one by one
+        storage.store_individual_fitness(ind.id, random.random())
+    storage.flush()
+    timings['single fitness'] = time.perf_counter() - start
+    batch = [IndividualFitnessValue(id=ind.id, fitness=random.random())
+             for ind in untested[len(untested) // 2:]]
+    _, timings['batch fitness'] = timed(storage.store_fitness_batch, batch)
+    _, timings['count untested'] = timed(storage.count_non_evaluated_individuals, generation_id)
+    _, timings['population'] = timed(storage.get_population, generation_id)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--population', type=int, default=50000)
+    parser.add_argument('--genes', type=int, default=30)
+    args = parser.parse_args()
+    population = [IndividualValue(encoding=[[random.random() for _ in range(args.genes)]])
+                  for _ in range(args.population)]
+    drivers = {
+        'sqlite :memory:': lambda: StorageFactory.create(driver=StorageDrivers.SQLITE,
+                                                         database=':memory:'),
+        'native memory': lambda: StorageFactory.create(driver=StorageDrivers.MEMORY),
+    }
+    results = {label: run(create(), population) for label, create in drivers.items()}
+    phases = next(iter(results.values())).keys()
+    print(f'{"phase (secs)":>16}' + ''.join(f'{label:>18}' for label in results))
+    for phase in phases:
+        print(f'{phase:>16}' + ''.join(f'{timings[phase]:18.4f}' for timings in results.values()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Compares the message codecs used on the bus (JSON and the binary format with packed numeric
+arrays or NumPy buffers) by size and encode/decode time. It runs offline, without a broker.
+
+Run it from the root of the repository:
+    python -m benchmarks.message_serialization --genes 1000 --envelope-size 10
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from shared.services.messaging.codecs.implementations.binary_message_codec import BinaryMessageCodec
+from shared.services.messaging.codecs.implementations.json_message_codec import JsonMessageCodec
+
+
+def timed(fn, *args, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        res = fn(*args)
+    return res, (time.perf_counter() - start) / repeat
+
+
+def run(codec, individuals, results, repeat: int):
+    body, encode_secs = timed(codec.encode_individuals, individuals, repeat=repeat)
+    _, decode_secs = timed(codec.decode_individuals, body, repeat=repeat)
+    results_body, _ = timed(codec.encode_results, results, repeat=1)
+    return {
+        'individuals (B)': len(body),
+        'encode (ms)': encode_secs * 1000,
+        'decode (ms)': decode_secs * 1000,
+        'results (B)': len(results_body),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--genes', type=int, default=1000)
+    parser.add_argument('--envelope-size', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    genomes = [[[random.random() for _ in range(args.genes)]] for _ in range(args.envelope_size)]
+    lists = list(enumerate(genomes, start=1))
+    arrays = [(_id, np.asarray(genome[0])) for _id, genome in lists]
+    results = [(_id, random.random()) for _id, _ in lists]
+    codecs = {
+        'json': (JsonMessageCodec(), lists),
+        'binary packed': (BinaryMessageCodec('packed'), lists),
+        'binary numpy': (BinaryMessageCodec('numpy'), arrays),
+    }
+    measures = {label: run(codec, individuals, results, args.repeat)
+                for label, (codec, individuals) in codecs.items()}
+    columns = next(iter(measures.values())).keys()
+    print(f'{"codec":>14}' + ''.join(f'{column:>18}' for column in columns))
+    for label, measure in measures.items():
+        print(f'{label:>14}' + ''.join(f'{value:18.3f}' if isinstance(value, float)
+                                       else f'{value:18}' for value in measure.values()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Compresses the message of a large genome (e.g. network weights) with every algorithm and
+level, and reports the bytes saved and whether it pays off for a given link bandwidth.
+It runs offline, without a broker.
+
+Run it from the root of the repository:
+    python -m benchmarks.payload_compression --genes 50000 --bandwidth-mbps 100
+"""
+import argparse
+import random
+
+from shared.services.messaging.codecs.implementations.binary_message_codec import BinaryMessageCodec
+from shared.services.messaging.codecs.implementations.json_message_codec import JsonMessageCodec
+from shared.services.messaging.compression.payload_compressor import PayloadCompressor, ZLIB, LZMA
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--genes', type=int, default=50000)
+    parser.add_argument('--decimals', type=int, default=4, help='precision of the weights')
+    parser.add_argument('--bandwidth-mbps', type=float, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    genome = [[round(random.gauss(0, 1), args.decimals) for _ in range(args.genes)]]
+    bandwidth = args.bandwidth_mbps * 1e6 / 8
+    print(f'{"codec":>8}{"algorithm":>12}{"level":>8}{"ratio":>10}'
+          f'{"saved (B)":>14}{"secs saved":>14}')
+    for label, codec in (('json', JsonMessageCodec()),
+                         ('binary', BinaryMessageCodec('packed'))):
+        body = codec.encode_individuals([(1, genome)])
+        for algorithm, levels in ((ZLIB, (1, 6, 9)), (LZMA, (0, 6))):
+            for level in levels:
+                compressor = PayloadCompressor(algorithm, level=level, threshold=0)
+                for _ in range(args.repeat):
+                    compressed, content_encoding = compressor.compress(body)
+                    compressor.decompress(compressed, content_encoding)
+                stats = compressor.stats
+                print(f'{label:>8}{algorithm:>12}{level:>8}{stats.ratio:10.3f}'
+                      f'{stats.bytes_saved // args.repeat:14}'
+                      f'{stats.time_saved(bandwidth) / args.repeat:14.4f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Simulates the makespan of a generation whose evaluation times are heavy-tailed, with the
+individuals delivered in storage order and with the priorities given by the cost estimators
+(PriorityScale levels, the most expensive first). It runs offline, without a broker.
+
+Run it from the root of the repository:
+    python -m benchmarks.priority_dispatch --population 2000 --workers 16
+"""
+import argparse
+import heapq
+import random
+
+from coordinator.services.scheduling.implementations.genome_size_estimator import GenomeSizeCostEstimator
+from coordinator.services.scheduling.priority_scale import PriorityScale
+
+
+def makespan(evaluation_secs, workers: int) -> float:
+    """
+    Every idle worker takes the next individual of the queue
+    """
+    finish_times = [0.0] * workers
+    for secs in evaluation_secs:
+        heapq.heappush(finish_times, heapq.heappop(finish_times) + secs)
+    return max(finish_times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--population', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--max-priority', type=int, default=10)
+    parser.add_argument('--noise', type=float, default=0.3, help='error of the estimations')
+    args = parser.parse_args()
+    # Genome sizes (and evaluation times) follow a heavy-tailed distribution
+    genomes = [(_id, [[0.0] * int(random.paretovariate(1.5) * 10)])
+               for _id in range(args.population)]
+    secs = {_id: len(genome[0]) * 0.01 * random.uniform(1 - args.noise, 1 + args.noise)
+            for _id, genome in genomes}
+    estimator, scale = GenomeSizeCostEstimator(), PriorityScale(args.max_priority)
+    priorities = {_id: scale.priority(estimator.estimate(_id, genome)) for _id, genome in genomes}
+    # The broker delivers the highest priority first, FIFO within a priority
+    by_priority = sorted(genomes, key=lambda ind: -priorities[ind[0]])
+    fifo = makespan((secs[_id] for _id, _ in genomes), args.workers)
+    prioritized = makespan((secs[_id] for _id, _ in by_priority), args.workers)
+    ideal = sum(secs.values()) / args.workers
+    print(f'{"dispatch":>14}{"makespan (s)":>16}{"vs ideal":>12}')
+    for label, value in (('storage order', fifo), ('priority', prioritized)):
+        print(f'{label:>14}{value:16.2f}{value / ideal:12.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares the concurrent read/write throughput of SqliteStorage using a single shared
+connection against the WAL mode with a pool of read-only connections.
+
+Run it from the root of the repository:
+    python -m benchmarks.sqlite_concurrency --population 5000 --readers 2 --seconds 5
+"""
+import argparse
+import os
+import tempfile
+import time
+from threading import Thread, Event
+
+from coordinator.services.storage.factory import StorageFactory, StorageDrivers
+from shared.models.value_objects.individual import IndividualValue
+
+
+def run(wal: bool, population_size: int, readers: int, seconds: float):
+    with tempfile.TemporaryDirectory() as directory:
+        storage = StorageFactory.create(driver=StorageDrivers.SQLITE,
+                                        database=os.path.join(directory, 'bench.db'),
+                                        fitness_batch_size=64,
+                                        wal=wal, readers_count=readers)
+        ex_id, _ = storage.create_experiment('benchmark')
+        generation_id = storage.create_generation(ex_id)
+        storage.store_population(generation_id,
+                                 [IndividualValue(encoding=[[i, i + 1, i + 2]])
+                                  for i in range(population_size)])
+        individual_ids = [ind.id for ind in storage.get_population(generation_id)]
+        stop_event = Event()
+        writes, reads = [0], [0] * readers
+
+        def writer():
+            while not stop_event.is_set():
+                for _id in individual_ids:
+                    if stop_event.is_set():
+                        break
+                    storage.store_individual_fitness(_id, writes[0])
+                    writes[0] += 1
+            storage.flush()
+
+        def reader(index: int):
+            while not stop_event.is_set():
+                storage.get_population(generation_id)
+                reads[index] += 1
+
+        threads = [Thread(target=writer)] + [Thread(target=reader, args=(i,)) for i in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+        return writes[0] / seconds, sum(reads) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--population', type=int, default=5000)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+    for label, wal in (('single cursor', False), ('WAL + readers pool', True)):
+        writes, reads = run(wal, args.population, args.readers, args.seconds)
+        print(f'{label:>20}: {writes:12.1f} writes/s {reads:10.1f} population reads/s')
+
+
+if __name__ == '__main__':
+    main()
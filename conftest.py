@@ -0,0 +1 @@
+# Keeps the root of the repository in the import path of the tests
@@ -1,8 +1,9 @@
 from typing import TypeAlias, Callable, List, TypeVar
 
 from shared.models.value_objects.individual import IndividualValue
+from shared.models.value_objects.population import PopulationBatch
 
 T = TypeVar('T')
 
-NextCallback: TypeAlias = Callable[[List[IndividualValue[T]]], None]
+NextCallback: TypeAlias = Callable[[List[IndividualValue[T]] | PopulationBatch], None]
 StopCallback: TypeAlias = Callable[[], None]
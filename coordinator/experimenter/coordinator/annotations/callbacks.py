@@ -1,4 +1,4 @@
-from typing import TypeAlias, Callable, List, TypeVar
+from typing import TypeAlias, Callable, List, TypeVar, Iterable
 
 from coordinator.experimenter.annotations.callbacks import NextCallback, StopCallback
 
@@ -8,5 +8,5 @@ T = TypeVar('T')
 
 CreateNewGenerationCallback: TypeAlias = Callable[
     [List[IndividualEntity[T]], NextCallback[T], StopCallback], any]
-OnTestingPopReadyCb: TypeAlias = Callable[[List[IndividualEntity[T]]], any]
+OnTestingPopReadyCb: TypeAlias = Callable[[Iterable[IndividualEntity[T]]], any]
 OnPopulationTestedCb: TypeAlias = Callable[[List[IndividualEntity[T]]], any]
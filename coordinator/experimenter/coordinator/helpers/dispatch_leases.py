@@ -0,0 +1,170 @@
+import heapq
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, List, Tuple, Iterable
+
+from shared.annotations.custom import UUID
+
+
+@dataclass(slots=True)
+class _Lease:
+    attempts: int
+    dispatched_at: float  # wall clock (monotonic)
+    deadline: float  # lease clock
+    released_at: float | None = None  # wall clock (monotonic), when the result arrived
+
+    @property
+    def is_released(self) -> bool:
+        return self.released_at is not None
+
+
+class DispatchLeases:
+    """
+    Tracks when every individual was sent to the workers and until when its result is
+    expected. Only the individuals whose lease expires are sent again, every time with a
+    longer lease (exponential backoff) until the max number of attempts is reached, and with
+    the lease of that attempt from then on, so every generation can still be completed.
+    The lease time only runs while the individuals queue is empty: the individuals waiting
+    in the queue are not being evaluated by anyone yet
+    """
+
+    def __init__(self, lease_secs: float = 60, backoff: float = 2.0,
+                 max_lease_secs: float | None = None, max_attempts: int = 5):
+        """
+        :param lease_secs: time given to evaluate an individual the first time it is sent
+        :param backoff: the lease is multiplied by this on every new attempt
+        :param max_lease_secs: max lease, no limit if not provided
+        :param max_attempts: the lease grows until an individual is sent this many times, it
+        doesn't grow anymore afterwards (see exhausted_count)
+        """
+        self.lease_secs = lease_secs
+        self.backoff = backoff
+        self.max_lease_secs = max_lease_secs
+        self.max_attempts = max(1, max_attempts)
+        self._leases: Dict[UUID, _Lease] = {}
+        self._deadlines: List[Tuple[float, int, UUID]] = []  # heap, may have outdated entries
+        self._sequence = 0  # breaks the ties in the heap, ids may not be comparable
+        self._paused_secs = 0.0
+        self._paused_at: float | None = None
+        self._redispatched_count = 0
+        self._duplicate_evaluations = 0
+        self._lock = Lock()
+
+    @property
+    def redispatched_count(self) -> int:
+        """
+        :return: times an individual was sent again since the leases were created
+        """
+        return self._redispatched_count
+
+    @property
+    def duplicate_evaluations(self) -> int:
+        """
+        :return: results received for individuals that already had one
+        """
+        return self._duplicate_evaluations
+
+    @property
+    def exhausted_count(self) -> int:
+        """
+        :return: individuals without a result that were sent max_attempts times or more
+        """
+        with self._lock:
+            return sum(1 for lease in self._leases.values()
+                       if not lease.is_released and lease.attempts >= self.max_attempts)
+
+    def grant(self, individual_ids: Iterable[UUID]):
+        """
+        Starts the lease of individuals sent for the first time, or sent again from scratch
+        """
+        with self._lock:
+            now = self.__clock()
+            dispatched_at = time.monotonic()
+            for individual_id in individual_ids:
+                self.__start(individual_id, _Lease(attempts=1, dispatched_at=dispatched_at,
+                                                   deadline=now + self.lease_secs))
+
+    def release(self, individual_id: UUID) -> bool:
+        """
+        Ends the lease of an individual whose result arrived
+        :return: False if it was already released (a duplicate evaluation) or not leased
+        """
+        with self._lock:
+            lease = self._leases.get(individual_id)
+            if lease is None:
+                return False
+            if lease.is_released:
+                self._duplicate_evaluations += 1
+                return False
+            lease.released_at = time.monotonic()
+            return True
+
+    def turnaround_secs(self, individual_id: UUID) -> float | None:
+        """
+        :return: secs from the latest dispatch of an individual to its result, including the
+        time it waited in the queue. None if the result didn't arrive
+        """
+        with self._lock:
+            lease = self._leases.get(individual_id)
+            if lease is None or lease.released_at is None:
+                return None
+            return lease.released_at - lease.dispatched_at
+
+    def expire(self) -> List[UUID]:
+        """
+        Renews the expired leases with a longer lease
+        :return: the ids of the individuals that must be sent again
+        """
+        with self._lock:
+            now = self.__clock()
+            expired = []
+            while self._deadlines and self._deadlines[0][0] <= now:
+                deadline, _, individual_id = heapq.heappop(self._deadlines)
+                lease = self._leases.get(individual_id)
+                if lease is None or lease.is_released or lease.deadline != deadline:
+                    continue
+                # Past the max attempts, the individual keeps being sent with the longest lease
+                secs = self.lease_secs * self.backoff ** min(lease.attempts, self.max_attempts - 1)
+                if self.max_lease_secs is not None:
+                    secs = min(secs, self.max_lease_secs)
+                self.__start(individual_id, _Lease(attempts=lease.attempts + 1,
+                                                   dispatched_at=time.monotonic(),
+                                                   deadline=now + secs))
+                expired.append(individual_id)
+            self._redispatched_count += len(expired)
+            return expired
+
+    def pause(self):
+        """
+        Stops the lease time, e.g. while the individuals queue is not empty
+        """
+        with self._lock:
+            if self._paused_at is None:
+                self._paused_at = time.monotonic()
+
+    def resume(self):
+        with self._lock:
+            if self._paused_at is not None:
+                self._paused_secs += time.monotonic() - self._paused_at
+                self._paused_at = None
+
+    def clear(self):
+        """
+        Removes every lease, the counters are kept
+        """
+        with self._lock:
+            self._leases.clear()
+            self._deadlines.clear()
+
+    def __start(self, individual_id: UUID, lease: _Lease):
+        self._leases[individual_id] = lease
+        self._sequence += 1
+        heapq.heappush(self._deadlines, (lease.deadline, self._sequence, individual_id))
+
+    def __clock(self) -> float:
+        """
+        :return: the lease time, which doesn't run while paused
+        """
+        now = self._paused_at if self._paused_at is not None else time.monotonic()
+        return now - self._paused_secs
@@ -2,13 +2,14 @@ import time
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from threading import Thread, Event
-from typing import TypeVar, Generic, List
+from typing import TypeVar, Generic, Iterable, List, Tuple
 
 from shared.annotations.custom import UUID, FitnessScore
 from coordinator.experimenter.coordinator.implementation import ExperimentCoordinator
 from shared.models.entities.individual import IndividualEntity
 from coordinator.services.messaging.bus.interfaces.imessage_bus import IMessageBus
 from coordinator.services.messaging.pubsub.publisher.interfaces.ipubsub_publisher import IPubSubPublisher
+from coordinator.services.scheduling.interfaces.icost_estimator import ICostEstimator
 from shared.utils.observable_scalar import ObservableScalar
 from shared.utils.promise import PromiseStatus
 from shared.utils.thread_safe import global_thread_safe
@@ -29,11 +30,22 @@ def safe_pause_coordinator_thread(fn):
 class ExperimentCoordinatorRunner(Generic[T]):
     def __init__(self, experiment_coordinator: ExperimentCoordinator,
                  message_bus: IMessageBus, pubsub_pub: IPubSubPublisher,
-                 monitor_interval_secs=5.0):
+                 monitor_interval_secs=5.0,
+                 cost_estimator: ICostEstimator[T] | None = None):
+        """
+        :param experiment_coordinator:
+        :param message_bus:
+        :param pubsub_pub:
+        :param monitor_interval_secs:
+        :param cost_estimator: predicts the evaluation cost of the individuals sent, so the
+        message bus can deliver the most expensive first. It learns from the evaluation time
+        reported by the workers along with the results
+        """
         self.experiment_coordinator = experiment_coordinator
         self.message_bus: IMessageBus = message_bus
         self.pubsub_pub: IPubSubPublisher = pubsub_pub
         self.monitor_interval_secs = monitor_interval_secs
+        self.cost_estimator = cost_estimator
         self.stop_event = Event()
         self.monitor_thread: Thread = Thread()
         self._is_terminated = ObservableScalar[bool](False)
@@ -84,14 +96,14 @@ class ExperimentCoordinatorRunner(Generic[T]):
         # Observers
         experiment_coordinator.is_terminated \
             .observe(lambda it_is, _: self.terminate() if it_is else '')
-        # Events
+        # Events. Every generation has its own queue, so the individuals left from the
+        # previous one don't need to be purged
         experiment_coordinator \
-            .add_on_population_evaluated_listener(lambda _: self.message_bus
-                                                  .clear_individuals_queue) \
-            .add_on_testing_sample_selected_listener(lambda _: self.pubsub_pub
-                                                     .broadcast_new_generation_signal()) \
+            .add_on_testing_sample_selected_listener(lambda _: self.__start_generation()) \
             .add_on_testing_sample_selected_listener(self.__send_testing_sample)
-        message_bus.add_on_result_received_listener(self.__add_result)
+        message_bus.add_on_results_received_listener(self.__add_results)
+        if self.cost_estimator is not None:
+            message_bus.add_on_evaluation_secs_received_listener(self.__record_evaluation_secs)
 
     @global_thread_safe
     def __stop_messaging_services(self):
@@ -101,21 +113,42 @@ class ExperimentCoordinatorRunner(Generic[T]):
 
     @global_thread_safe
     def __start(self, _await: bool):
+        # Even when awaiting, the results are tagged with the generation and the workers that
+        # join must learn which queue to consume
+        self.__start_generation()
         if not _await:
-            pending_ind = self.experiment_coordinator.untested_individuals
-            self.pubsub_pub.broadcast_new_generation_signal()
-            self.__send_testing_sample(pending_ind)
+            self.__send_testing_sample(self.experiment_coordinator.iter_untested_individuals())
+        else:  # they may be in the queue already, they are sent again once the leases expire
+            self.experiment_coordinator.lease_pending_individuals()
         self.start_threaded_monitor()
 
+    @global_thread_safe
+    def __start_generation(self):
+        generation_id = self.experiment_coordinator.generation_id
+        if self.cost_estimator is not None:
+            self.cost_estimator.clear_pending()  # the previous individuals won't be recorded
+        self.message_bus.start_generation(generation_id)
+        self.pubsub_pub.broadcast_new_generation_signal(generation_id)
+
     @global_thread_safe
     @safe_pause_coordinator_thread
-    def __add_result(self, _id: UUID, fitness: FitnessScore):
-        self.experiment_coordinator.add_individual_fitness(_id, fitness)
+    def __add_results(self, results: List[Tuple[UUID, FitnessScore]]):
+        self.experiment_coordinator.add_individual_fitness_batch(results)
 
     @global_thread_safe
-    def __send_testing_sample(self, sample: List[IndividualEntity]):
-        for ind in sample:
-            self.message_bus.send_individual(ind.id, ind.encoding)
+    def __record_evaluation_secs(self, individual_ids: List[UUID], evaluation_secs: float):
+        for individual_id in individual_ids:
+            self.cost_estimator.record(individual_id, evaluation_secs)
+
+    @global_thread_safe
+    def __send_testing_sample(self, sample: Iterable[IndividualEntity]):
+        leased_sample = self.experiment_coordinator.lease_individuals(sample)
+        self.message_bus.send_individuals(((ind.id, ind.encoding) for ind in leased_sample),
+                                          cost=self.__cost)
+
+    @property
+    def __cost(self):
+        return self.cost_estimator.estimate if self.cost_estimator is not None else None
 
     @global_thread_safe
     def __monitor(self):
@@ -128,12 +161,12 @@ class ExperimentCoordinatorRunner(Generic[T]):
                 continue
             msgs_count_promise = message_bus.pending_deliveries_count
             msgs_count_promise \
-                .then(self.__resend_sample_on_timeout) \
+                .then(self.__resend_expired_individuals) \
                 .catch(lambda e: print('EXCEPTION', e))  # TODO handle it
 
     @global_thread_safe
-    def __resend_sample_on_timeout(self, pending_msgs_count: int):
-        experiment_coordinator = self.experiment_coordinator
-        if experiment_coordinator.timeout(pending_msgs_count):
-            testing_sample = experiment_coordinator.untested_individuals
-            self.__send_testing_sample(testing_sample)
+    def __resend_expired_individuals(self, pending_msgs_count: int):
+        # Only the individuals whose lease expired, their leases are already renewed
+        expired = self.experiment_coordinator.expired_individuals(pending_msgs_count)
+        self.message_bus.send_individuals(((ind.id, ind.encoding) for ind in expired),
+                                          cost=self.__cost)
@@ -1,13 +1,19 @@
-import time
 from threading import Thread
-from typing import NamedTuple, TypeVar, Generic, List
+from typing import NamedTuple, TypeVar, Generic, List, Iterable, Tuple, Iterator, Collection
 
 from coordinator.experimenter.coordinator.annotations.callbacks import OnTestingPopReadyCb, OnPopulationTestedCb
+from coordinator.experimenter.coordinator.helpers.dispatch_leases import DispatchLeases
+from coordinator.experimenter.experiments.interfaces.ibatch_experiment import IBatchExperiment
 from coordinator.experimenter.experiments.interfaces.iexperiment import IExperiment
 from shared.annotations.custom import UUID, FitnessScore
-from shared.models.value_objects.individual import IndividualValue
+from shared.models.entities.individual import IndividualEntity
+from shared.models.value_objects.individual import IndividualValue, IndividualFitnessValue
+from shared.models.value_objects.population import PopulationBatch
+from coordinator.services.storage.checkpoints.generation_checkpoint import GenerationCheckpoint
+from coordinator.services.storage.checkpoints.store import GenerationCheckpoints
 from coordinator.services.storage.interfaces.istorage import IStorage
 from shared.utils.event_listener import EventListener
+from shared.utils.lazy_iterable import LazyIterable
 from shared.utils.observable_scalar import ObservableScalar
 
 
@@ -21,29 +27,44 @@ T = TypeVar('T')
 
 class ExperimentCoordinator(Generic[T]):
     def __init__(self, experiment_id: UUID,
-                 experiment: IExperiment[T],
+                 experiment: IExperiment[T] | IBatchExperiment[T],
                  storage: IStorage[T],
-                 max_time_between_results_secs=60):
+                 max_time_between_results_secs=60,
+                 chunk_size=1000,
+                 checkpoints: GenerationCheckpoints | None = None,
+                 leases: DispatchLeases | None = None):
         """
         :param experiment_id:
         :param experiment: an IExperiment implementation and its method, apply_genetic_operations,
-        will be called when the population is evaluated
+        will be called when the population is evaluated. If it is an IBatchExperiment, the
+        population is passed as a PopulationBatch
         :param storage:
-        :param max_time_between_results_secs: This will be used in the timeout method
+        :param max_time_between_results_secs: the initial lease of the individuals sent if
+        the leases are not provided
+        :param chunk_size: max number of individuals loaded at a time from the storage when
+        the untested individuals are streamed
+        :param checkpoints: if provided, a memory-mapped checkpoint is written when a generation
+        starts and the untested individuals are read from it instead of the storage, so
+        resuming an experiment doesn't need to load its population
+        :param leases: the dispatch leases of the individuals sent to the workers, see
+        lease_individuals and expired_individuals
         """
         self._storage = storage
         self._ex_id: UUID = experiment_id
         self._experimenter = experiment
-        self._max_time_between_results_secs = max_time_between_results_secs
+        self._chunk_size = chunk_size
+        self._checkpoints = checkpoints
+        self._checkpoint: GenerationCheckpoint | None = None
+        self._leases = leases or DispatchLeases(lease_secs=max_time_between_results_secs)
         self._generation_id = self._storage.get_latest_generation_id(self._ex_id)
         self._pending_individuals: set[UUID] = set()
-        self._latest_result_date: float | None = None
         self._is_busy = ObservableScalar[bool](False)
         self._is_terminated = ObservableScalar[bool](False)
         self._testing_sample_listeners = EventListener[OnTestingPopReadyCb[T]]()
         self._pop_tested_listeners = EventListener[OnPopulationTestedCb[T]]()
         self._new_gen_listeners = EventListener[OnPopulationTestedCb[T]]()
-        self.__sync_and_get_untested_individuals()
+        self.__sync_untested_ids()
+        self.__load_checkpoint()
 
     @property
     def is_busy(self):
@@ -53,33 +74,125 @@ class ExperimentCoordinator(Generic[T]):
     def is_terminated(self):
         return self._is_terminated
 
+    @property
+    def generation_id(self) -> UUID | None:
+        """
+        :return: the generation being evaluated
+        """
+        return self._generation_id
+
+    @property
+    def leases(self) -> DispatchLeases:
+        return self._leases
+
+    @property
+    def duplicate_evaluations(self) -> int:
+        """
+        :return: results received for individuals that were already evaluated, e.g. because
+        they were sent again to another worker
+        """
+        return self._leases.duplicate_evaluations
+
     @property
     def untested_individuals(self):
         return self.__sync_and_get_untested_individuals()
 
+    def iter_untested_individuals(self) -> Iterable[IndividualEntity[T]]:
+        """
+        Same as untested_individuals but the individuals are streamed from the storage in
+        chunks instead of being loaded all at once
+        """
+        self.__sync_untested_ids()
+        return self.__stream_untested_individuals()
+
     def stop(self):
+        self._storage.flush()  # persist the buffered results
+        if self._checkpoint is not None:
+            self._checkpoint.close()
+            self._checkpoint = None
         self._is_terminated.value = True
         self._pending_individuals.clear()  # clear pending individuals
-        self._latest_result_date = None
+        self._leases.clear()
         self._is_busy.value = False
 
+    def lease_individuals(self, individuals: Iterable[IndividualEntity[T]]) \
+            -> Iterator[IndividualEntity[T]]:
+        """
+        Starts the lease of every individual as it is iterated, pass the individuals sent to
+        the workers through it
+        """
+        leases = self._leases
+        for individual in individuals:
+            leases.grant((individual.id,))
+            yield individual
+
+    def lease_pending_individuals(self):
+        """
+        Starts the lease of every pending individual without sending them, e.g. when resuming
+        an experiment whose individuals were already sent. They are sent again once it expires
+        """
+        self.__sync_untested_ids()
+        self._leases.grant(self._pending_individuals)
+
+    def expired_individuals(self, undelivered_individuals_count: int) \
+            -> Iterable[IndividualEntity[T]]:
+        """
+        Renews the leases that expired, the lease time doesn't run while there are individuals
+        waiting to be delivered
+        :param undelivered_individuals_count: the number of individuals that are still pending
+        to be received by workers
+        :return: the pending individuals whose lease expired, they should be sent again
+        """
+        if undelivered_individuals_count > 0:
+            self._leases.pause()
+            return []
+        self._leases.resume()
+        if self._is_busy.value:
+            return []
+        expired = self._pending_individuals.intersection(self._leases.expire())
+        return self.__stream_individuals(expired) if expired else []
+
     def add_individual_fitness(self, individual_id: UUID, fitness_score: FitnessScore):
+        self._leases.release(individual_id)
         # Check if the individual's fitness was already stored
         if self._is_busy.value or individual_id not in self._pending_individuals:
             return
         # Store the fitness score
         self._storage.store_individual_fitness(individual_id, fitness_score)
         self._pending_individuals.remove(individual_id)  # update tracker
-        self.__refresh_latest_result_date()  # update event tracker
         # Check if there are individuals that need to be tracked
         if len(self._pending_individuals) == 0:
             self.__stage_new_generation()
 
+    def add_individual_fitness_batch(self, results: Iterable[Tuple[UUID, FitnessScore]]):
+        """
+        Same as add_individual_fitness for many results, they are stored in a single storage
+        call. The results of individuals that are not pending are ignored
+        :param results: pairs of individual id and fitness score
+        """
+        if self._is_busy.value:
+            return
+        pending = self._pending_individuals
+        release = self._leases.release
+        fitness_values = {}
+        for individual_id, fitness_score in results:
+            release(individual_id)
+            if individual_id in pending and individual_id not in fitness_values:
+                fitness_values[individual_id] = IndividualFitnessValue(individual_id, fitness_score)
+        if not fitness_values:
+            return
+        self._storage.store_fitness_batch(list(fitness_values.values()))
+        pending.difference_update(fitness_values)  # update tracker
+        if len(pending) == 0:
+            self.__stage_new_generation()
+
     def add_on_testing_sample_selected_listener(self, listener: OnTestingPopReadyCb[T]):
         """
         Listeners are notified when a new testing sample is selected, that is, when a new
         generation is created only the individuals that don't have a fitness assigned
         will be sent in order to be evaluated.
+        The sample is an iterable that streams the individuals from the storage, so it can be
+        iterated more than once but it is not a list.
         :param listener:
         """
         self._testing_sample_listeners.add_listener(listener)
@@ -93,53 +206,82 @@ class ExperimentCoordinator(Generic[T]):
         self._pop_tested_listeners.add_listener(listener)
         return self
 
-    def timeout(self, undelivered_individuals_count: int) -> bool:
-        """
-        Checks if too much time has elapsed since the last result arrived. This time period is
-        defined in the constructor.
-        This could be useful to determine whether to send again the pending individuals to the
-        workers.
-        :param undelivered_individuals_count: the number of individuals that are still pending
-        to be received by workers
-        :return: True if timeout, False otherwise
-        """
-        if self._is_busy.value or len(self._pending_individuals) == 0:
-            return False
-        if self._latest_result_date is None:
-            self.__refresh_latest_result_date()
-            return False
-        current_time = time.time()
-        time_elapsed = current_time - self._latest_result_date
-        return (time_elapsed >= self._max_time_between_results_secs
-                and undelivered_individuals_count == 0)
-
     def __stage_new_generation(self):
         self._is_busy.value = True
+        self._storage.flush()  # the whole population must be persisted before reading it
         current_population = self._storage.get_population(self._generation_id)
+        if self._checkpoint is not None:  # the checkpoint keeps the final fitness scores
+            self._checkpoint.update_fitness((ie.id, ie.fitness) for ie in current_population)
         self._pop_tested_listeners(current_population)
-        population = [IndividualValue(encoding=ie.encoding, fitness=ie.fitness)
-                      for ie in current_population]
+        if isinstance(self._experimenter, IBatchExperiment):
+            population = PopulationBatch.from_entities(current_population)
+        else:
+            population = [IndividualValue(encoding=ie.encoding, fitness=ie.fitness)
+                          for ie in current_population]
         gen_number = self._storage.count_generations(self._ex_id)
         Thread(target=self._experimenter.apply_genetic_operations,
                args=(gen_number, population, self.__start_new_generation, self.stop,)
                ).start()
 
-    def __start_new_generation(self, new_individuals: List[IndividualValue[T]]):
+    def __start_new_generation(self, new_individuals: List[IndividualValue[T]] | PopulationBatch):
+        if isinstance(new_individuals, PopulationBatch):
+            new_individuals = new_individuals.to_individual_values()
         # Create a new generation
         self._generation_id = self._storage.create_generation(self._ex_id)
         # Store the new population
         self._storage.store_population(self._generation_id, new_individuals)
+        self.__load_checkpoint()
         # Get the individuals that doesn't have a fitness assigned yet
-        sample = self.__sync_and_get_untested_individuals()
-        self.__refresh_latest_result_date()
+        self.__sync_untested_ids()
+        self._leases.clear()  # the individuals of the previous generation are not sent again
+        sample = self.__stream_untested_individuals()
         self._testing_sample_listeners(sample)
         self._is_busy.value = False
+        # Archive the generations out of the retention policy, if the storage has one
+        self._storage.apply_retention(self._ex_id)
 
     def __sync_and_get_untested_individuals(self):
+        self._storage.flush()  # the buffered results must not be pending again
         pending_individuals = self._storage.get_non_evaluated_individuals(self._generation_id)
         self._pending_individuals.clear()  # clear pending individuals
         self._pending_individuals.update([ind.id for ind in pending_individuals])
         return pending_individuals
 
-    def __refresh_latest_result_date(self):
-        self._latest_result_date = time.time()
+    def __sync_untested_ids(self):
+        self._storage.flush()  # the buffered results must not be pending again
+        pending_ids = self._storage.get_non_evaluated_ids(self._generation_id)
+        self._pending_individuals.clear()  # clear pending individuals
+        self._pending_individuals.update(pending_ids)
+
+    def __stream_untested_individuals(self) -> LazyIterable[IndividualEntity[T]]:
+        checkpoint = self._checkpoint
+        if checkpoint is not None:
+            pending = self._pending_individuals
+            return LazyIterable(lambda: checkpoint.iter_individuals(only_ids=pending))
+        storage, generation_id, chunk_size = self._storage, self._generation_id, self._chunk_size
+        return LazyIterable(lambda: storage.iter_untested(generation_id, chunk_size))
+
+    def __stream_individuals(self, ids: Collection[UUID]) -> LazyIterable[IndividualEntity[T]]:
+        checkpoint = self._checkpoint
+        if checkpoint is not None:
+            return LazyIterable(lambda: checkpoint.iter_individuals(only_ids=ids))
+        storage, generation_id, chunk_size = self._storage, self._generation_id, self._chunk_size
+        return LazyIterable(lambda: (ind for ind in storage.iter_untested(generation_id, chunk_size)
+                                     if ind.id in ids))
+
+    def __load_checkpoint(self):
+        """
+        Maps the checkpoint of the current generation, writing it first if it is missing
+        """
+        if self._checkpoints is None or self._generation_id is None:
+            return
+        # The individuals of the previous generation are no longer sent, so its checkpoint is
+        # closed before mapping the new one, otherwise every generation would leak its map
+        if self._checkpoint is not None:
+            self._checkpoint.close()
+            self._checkpoint = None
+        if not self._checkpoints.exists(self._ex_id, self._generation_id):
+            self._storage.flush()
+            self._checkpoints.save(self._ex_id, self._generation_id, self._storage,
+                                   self._chunk_size)
+        self._checkpoint = self._checkpoints.open(self._ex_id, self._generation_id)
@@ -0,0 +1,27 @@
+from abc import ABC, abstractmethod
+from typing import TypeVar, Generic
+
+from coordinator.experimenter.annotations.callbacks import NextCallback, StopCallback
+from shared.models.value_objects.population import PopulationBatch
+
+T = TypeVar('T')
+
+
+class IBatchExperiment(ABC, Generic[T]):
+    """
+    Implement this interface instead of IExperiment to receive the evaluated population as
+    NumPy arrays (see PopulationBatch)
+    """
+    @abstractmethod
+    def apply_genetic_operations(self, generation_number: int,
+                                 population: PopulationBatch,
+                                 _next: NextCallback, _stop: StopCallback) -> None:
+        """
+        Receives an evaluated population in order to create a new generation.
+        :param generation_number: The current generation
+        :param population: evaluated population
+        :param _next: callback to proceed with the created population after applying GA
+        operations, it accepts either a PopulationBatch or a list of IndividualValue
+        :param _stop: callback to terminate the experimentation process
+        """
+        raise NotImplementedError
@@ -0,0 +1,70 @@
+from typing import TypeVar, Generic
+
+import numpy as np
+
+from coordinator.experimenter.annotations.callbacks import NextCallback, StopCallback
+from coordinator.experimenter.experiments.interfaces.ibatch_experiment import IBatchExperiment
+from shared.models.value_objects.population import PopulationBatch
+
+T = TypeVar('T')
+
+
+def tournament_selection(fitness: np.ndarray, count: int, tournament_size=3,
+                         rng: np.random.Generator | None = None) -> np.ndarray:
+    """
+    :return: the indexes of the winners of `count` tournaments
+    """
+    rng = rng or np.random.default_rng()
+    contestants = rng.integers(0, len(fitness), size=(count, tournament_size))
+    winners = np.argmax(fitness[contestants], axis=1)
+    return contestants[np.arange(count), winners]
+
+
+def roulette_selection(fitness: np.ndarray, count: int,
+                       rng: np.random.Generator | None = None) -> np.ndarray:
+    """
+    :return: the indexes of `count` individuals selected proportionally to their fitness
+    """
+    rng = rng or np.random.default_rng()
+    weights = fitness - fitness.min()  # fitness could be negative
+    total = weights.sum()
+    if total == 0:
+        return rng.integers(0, len(fitness), size=count)
+    return rng.choice(len(fitness), size=count, p=weights / total)
+
+
+class MyBatchExperiment(IBatchExperiment[T], Generic[T]):
+    def __init__(self, elite_size=3, mutation_rate=0.1):
+        super().__init__()
+        self._counter = 1
+        self._elite_size = elite_size
+        self._mutation_rate = mutation_rate
+        self._rng = np.random.default_rng()
+
+    def apply_genetic_operations(self, generation_number: int,
+                                 population: PopulationBatch,
+                                 _next: NextCallback[T], _stop: StopCallback) -> None:
+        # All the following is a dummy example
+        fitness = np.nan_to_num(population.fitness, nan=-np.inf)
+        print(f'Population {generation_number} of {len(fitness)} individuals, '
+              f'best fitness: {fitness.max()}')
+        if self._counter >= 2:
+            return _stop()
+        encodings = population.encodings
+        pop_size = len(encodings)
+        # keep the best individuals as 'elite'
+        elite = np.argsort(fitness)[::-1][:self._elite_size]
+        # one-point crossover between parents selected by tournament
+        parents_a = encodings[tournament_selection(fitness, pop_size - len(elite), rng=self._rng)]
+        parents_b = encodings[tournament_selection(fitness, pop_size - len(elite), rng=self._rng)]
+        cut = self._rng.integers(1, encodings.shape[1], size=(len(parents_a), 1)) \
+            if encodings.shape[1] > 1 else np.ones((len(parents_a), 1), dtype=int)
+        children = np.where(np.arange(encodings.shape[1]) < cut, parents_a, parents_b)
+        # random reset mutation
+        mutated = self._rng.random(children.shape) < self._mutation_rate
+        children = np.where(mutated, self._rng.integers(0, 6, size=children.shape), children)
+        new_encodings = np.concatenate([children, encodings[elite]])
+        new_fitness = np.concatenate([np.full(len(children), np.nan), population.fitness[elite]])
+        self._counter += 1
+        _next(PopulationBatch.from_encodings(new_encodings, population.genome_shape,
+                                             fitness=new_fitness))
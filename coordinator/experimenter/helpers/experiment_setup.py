@@ -1,5 +1,6 @@
 from enum import Enum
-from typing import Generic, List, Tuple, TypeVar
+from itertools import islice
+from typing import Generic, Tuple, TypeVar, Iterable
 
 from shared.models.value_objects.individual import IndividualValue
 from shared.annotations.custom import UUID
@@ -17,7 +18,8 @@ class ExperimentIntegrityViolations(Enum):
 class ExperimentSetupHelper(Generic[T]):
     @classmethod
     def setup(cls, experiment_name: str, storage: IStorage[T],
-              initial_population_encodings: List[IndividualValue[T]]) -> Tuple[UUID, bool]:
+              initial_population_encodings: Iterable[IndividualValue[T]],
+              chunk_size: int = 1000) -> Tuple[UUID, bool]:
         """
         Creates and stores the experiment information along with the initial population. If
         there is already another experiment with the same name, it will finish the remaining
@@ -25,7 +27,9 @@ class ExperimentSetupHelper(Generic[T]):
         actions will be taken
         :param experiment_name: the name for the new experiment
         :param storage: storage adapter
-        :param initial_population_encodings:
+        :param initial_population_encodings: it can be a generator, then the population is
+        created and stored in chunks
+        :param chunk_size: max number of individuals stored at a time
         :return: The UUID of the experiment and True if the passed population was stored as the initial population,
         otherwise False meaning that the population already stored will be used instead
         """
@@ -41,7 +45,9 @@ class ExperimentSetupHelper(Generic[T]):
             else storage.get_latest_generation_id(experiment_id)
         if problem.NO_POPULATION or problem.NO_GENERATIONS:
             # Store the initial population
-            storage.store_population(generation_id, initial_population_encodings)
+            individuals = iter(initial_population_encodings)
+            while chunk := list(islice(individuals, chunk_size)):
+                storage.store_population(generation_id, chunk)
             return experiment_id, True
         return experiment_id, False
 
@@ -59,7 +65,6 @@ class ExperimentSetupHelper(Generic[T]):
         generation_id = storage.get_latest_generation_id(experiment_id)
         if not generation_id:  # there must be at least one generation
             return False, ExperimentIntegrityViolations.NO_GENERATIONS
-        has_population = len(storage.get_population(generation_id)) > 0  # is there a population
-        if not has_population:
+        if not storage.has_population(generation_id):  # is there a population
             return False, ExperimentIntegrityViolations.NO_POPULATION
         return True, None
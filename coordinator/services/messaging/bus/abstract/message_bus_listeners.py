@@ -1,7 +1,9 @@
 from abc import ABC
-from typing import TypeVar, Generic
+from typing import TypeVar, Generic, List, Tuple
 
-from coordinator.services.messaging.bus.interfaces.imessage_bus import IMessageBus, ResultReceivedListenerCb
+from coordinator.services.messaging.bus.interfaces.imessage_bus import IMessageBus, ResultReceivedListenerCb, \
+    ResultsReceivedListenerCb, EvaluationSecsReceivedListenerCb
+from shared.annotations.custom import UUID, FitnessScore
 from shared.utils.event_listener import EventListener
 
 T = TypeVar('T')
@@ -10,7 +12,27 @@ T = TypeVar('T')
 class MessageBusListeners(IMessageBus[T], ABC, Generic[T]):
     def __init__(self):
         self.result_receiver_listeners = EventListener()
+        self.results_receiver_listeners = EventListener()
+        self.evaluation_secs_receiver_listeners = EventListener()
 
     def add_on_result_received_listener(self, listener: ResultReceivedListenerCb):
         self.result_receiver_listeners.add_listener(listener)
         return self
+
+    def add_on_results_received_listener(self, listener: ResultsReceivedListenerCb):
+        self.results_receiver_listeners.add_listener(listener)
+        return self
+
+    def add_on_evaluation_secs_received_listener(self, listener: EvaluationSecsReceivedListenerCb):
+        self.evaluation_secs_receiver_listeners.add_listener(listener)
+        return self
+
+    def _notify_results_received(self, results: List[Tuple[UUID, FitnessScore]]):
+        if self.results_receiver_listeners.listeners:
+            self.results_receiver_listeners(results)
+            return
+        for individual_id, fitness in results:
+            self.result_receiver_listeners(individual_id, fitness)
+
+    def _notify_evaluation_secs_received(self, individual_ids: List[UUID], evaluation_secs: float):
+        self.evaluation_secs_receiver_listeners(individual_ids, evaluation_secs)
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, TypeAlias, Callable
+from typing import Generic, TypeVar, TypeAlias, Callable, Iterable, Tuple, List
 
 from shared.annotations.custom import UUID, FitnessScore
 from shared.services.messaging.bus.interfaces.imessage_bus import IMessageBusControls
@@ -8,6 +8,8 @@ from shared.utils.promise import Promise
 T = TypeVar('T')
 
 ResultReceivedListenerCb: TypeAlias = Callable[[UUID, FitnessScore], any]
+ResultsReceivedListenerCb: TypeAlias = Callable[[List[Tuple[UUID, FitnessScore]]], any]
+EvaluationSecsReceivedListenerCb: TypeAlias = Callable[[List[UUID], float], any]
 
 
 class IMessageBus(IMessageBusControls, ABC, Generic[T]):
@@ -17,7 +19,33 @@ class IMessageBus(IMessageBusControls, ABC, Generic[T]):
         raise NotImplementedError
 
     @abstractmethod
-    def send_individual(self, individual_id: UUID, encoding: T):
+    def send_individual(self, individual_id: UUID, encoding: T, cost: float | None = None):
+        """
+        :param individual_id:
+        :param encoding:
+        :param cost: the expected evaluation cost, implementations can deliver the most
+        expensive individuals first
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def send_individuals(self, individuals: Iterable[Tuple[UUID, T]],
+                         cost: Callable[[UUID, T], float] | None = None):
+        """
+        Sends many individuals, implementations can pack them in fewer messages
+        :param individuals: pairs of id and encoding
+        :param cost: estimates the evaluation cost of an individual, implementations can
+        deliver the most expensive individuals first
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def start_generation(self, generation_id: UUID):
+        """
+        The individuals sent from now on belong to this generation, implementations can tag
+        them and route them apart, so the work of previous generations can be dropped
+        :param generation_id:
+        """
         raise NotImplementedError
 
     @abstractmethod
@@ -27,3 +55,23 @@ class IMessageBus(IMessageBusControls, ABC, Generic[T]):
     @abstractmethod
     def add_on_result_received_listener(self, listener: ResultReceivedListenerCb):
         return self
+
+    @abstractmethod
+    def add_on_results_received_listener(self, listener: ResultsReceivedListenerCb):
+        """
+        Listeners receive all the results of a message at once, as pairs of id and fitness
+        score. If there are no such listeners, the results are passed one by one to the result
+        received listeners
+        :param listener:
+        """
+        return self
+
+    @abstractmethod
+    def add_on_evaluation_secs_received_listener(self, listener: EvaluationSecsReceivedListenerCb):
+        """
+        Listeners receive the ids of the results of a message and the secs the worker spent
+        evaluating each of them, if the worker reported it. It doesn't include the time the
+        individuals waited to be delivered
+        :param listener:
+        """
+        return self
@@ -1,11 +1,22 @@
-import json
-from typing import TypeVar, Generic, Tuple
+from concurrent.futures import Future
+from itertools import batched
+from typing import TypeVar, Generic, Tuple, Iterable, Callable, Dict, List
+from uuid import uuid4
 
-from shared.annotations.custom import UUID, FitnessScore
+import pika
+
+from shared.annotations.custom import UUID
 from coordinator.services.messaging.bus.abstract.message_bus_listeners import MessageBusListeners
 from coordinator.services.messaging.bus.interfaces.imessage_bus import IMessageBus
 from coordinator.services.messaging.pubsub.publisher.interfaces.ipubsub_publisher import IPubSubPublisher
-from shared.services.messaging.implementations.rabbitmq import RabbitMqMessagingBaseControls
+from coordinator.services.scheduling.priority_scale import PriorityScale
+from shared.services.messaging.chunked_transfer import TransferManifest, CHUNK_HEADER, split_in_chunks
+from shared.services.messaging.codecs.interfaces.imessage_codec import IMessageCodec
+from shared.services.messaging.command_queue import on_ioloop
+from shared.services.messaging.compression.payload_compressor import PayloadCompressor
+from shared.services.messaging.implementations.rabbitmq import RabbitMqMessagingBaseControls, GENERATION_HEADER, \
+    EVALUATION_SECS_HEADER
+from shared.services.messaging.publisher_confirms import PublisherConfirms, PublishDispatch
 from shared.utils.promise import Promise
 
 T = TypeVar('T')
@@ -16,52 +27,166 @@ class RabbitMqMessaging(RabbitMqMessagingBaseControls,
                         IMessageBus[T], IPubSubPublisher,
                         Generic[T]):
     """
-    An AMQP 0-9-1 implementation of both Messaging Queue and PubSub Publisher
+    An AMQP 0-9-1 implementation of both Messaging Queue and PubSub Publisher.
+    Its methods can be called from any thread: the messages are encoded on the calling thread
+    and the channel operations run on the ioloop. The methods that send messages return a
+    future resolved once the messages are written to the connection, or confirmed by the
+    broker in confirm mode
     """
-    def __init__(self, connection_string: str, experiment_id: UUID):
-        RabbitMqMessagingBaseControls.__init__(self, connection_string, experiment_id)
+    def __init__(self, connection_string: str, experiment_id: UUID, envelope_size: int = 1,
+                 message_codec: IMessageCodec[T] | None = None,
+                 compressor: PayloadCompressor | None = None,
+                 max_message_size: int | None = None, transfer_timeout: float = 300,
+                 generation_queue_expires: float = 600, max_priority: int | None = None,
+                 confirm_window: int | None = None, max_retransmissions: int = 3,
+                 max_backlog: int = 8192):
+        """
+        :param connection_string:
+        :param experiment_id:
+        :param envelope_size: max number of individuals packed in a single message by
+        send_individuals. Setting it to the sample size of the workers (or a divisor of it)
+        lets a worker fill its sample with a few deliveries
+        :param message_codec: the codec of the messages sent, JSON if not provided. Received
+        messages are decoded according to their content type
+        :param compressor: compresses the messages larger than its threshold, e.g. large
+        genomes. Compressed messages received are decompressed either way
+        :param max_message_size: messages of individuals larger than this (in bytes, after the
+        compression) are split in chunks of this size, sent through a queue of their own.
+        Keep it below the message size limit of the broker. If not provided, nothing is split
+        :param transfer_timeout: secs a chunked transfer can wait for a consumer, its queue
+        is deleted by the broker afterwards. Until a worker consumes it, the queue is declared
+        again along with the generation queue, since its manifest may wait behind the whole
+        generation
+        :param generation_queue_expires: secs a generation queue lives once nobody uses it, so
+        the queues of the previous generations are deleted by the broker with their messages
+        :param max_priority: if provided, the generation queues are priority queues with this
+        many levels (up to 255, RabbitMQ recommends no more than 10) and the individuals sent
+        with a cost are delivered the most expensive first
+        :param confirm_window: if provided, the messages are published in confirm mode with up
+        to this many messages waiting for their confirmation, the rest wait their turn. The
+        messages rejected by the broker are published again, and nothing is published while
+        the broker blocks the connection
+        :param max_retransmissions: max times a message rejected by the broker is published
+        again in confirm mode, the future of its send fails afterwards
+        :param max_backlog: max messages waiting their turn in confirm mode, the sends from
+        other threads than the ioloop wait for room beyond it
+        """
+        RabbitMqMessagingBaseControls.__init__(self, connection_string, experiment_id,
+                                               message_codec=message_codec, compressor=compressor)
         MessageBusListeners.__init__(self)
         self.ex_id = experiment_id
+        self.envelope_size = max(1, envelope_size)
+        self.max_message_size = max_message_size
+        self.transfer_timeout = transfer_timeout
+        self.generation_queue_expires = generation_queue_expires
+        self._generation_id: UUID | None = None
+        self._generation_q: str | None = None
+        self.max_priority = max_priority
+        self._priority_scale = PriorityScale(max_priority) if max_priority else None
+        # The transfer queues not consumed yet: their generation queue and dispatch
+        self._transfer_queues: Dict[str, Tuple[str, PublishDispatch]] = {}
+        self._confirms = PublisherConfirms(confirm_window, max_retransmissions, max_backlog) \
+            if confirm_window else None
+        self._undecodable_results_count = 0
+
+    @property
+    def publisher_confirms(self) -> PublisherConfirms | None:
+        """
+        :return: the state of the confirm mode (messages in flight, backlog), None if disabled
+        """
+        return self._confirms
+
+    @property
+    def undecodable_results_count(self) -> int:
+        """
+        :return: messages of results that couldn't be decoded, they are dropped
+        """
+        return self._undecodable_results_count
 
     @property
     def pending_deliveries_count(self) -> Promise[int]:
         promise = Promise[int]()
         resolve, reject = promise.handlers
-        try:
-            self.channel.queue_declare(queue=self.individuals_q, passive=True,
-                                       callback=lambda frame: resolve(frame.method.message_count))
-        except Exception as e:
-            reject(e)
+        if self._generation_q is None:
+            resolve(0)
+            return promise
+        # Declared again, so the queue of the current generation doesn't expire. The messages
+        # not published yet in confirm mode are not delivered either
+        self._commands.submit(self.__declare_generation_queue,
+                              callback=lambda frame: resolve(frame.method.message_count +
+                                                             self.__backlog_count)) \
+            .add_done_callback(lambda future: future.exception() and reject(future.exception()))
         return promise
 
-    def send_individual(self, individual_id: UUID, encoding: T):
-        msg = {'id': individual_id, 'encoding': encoding}
-        msg_json = json.dumps(msg)
-        self.channel.basic_publish(exchange='',
-                                   routing_key=self.individuals_q,
-                                   body=msg_json)
+    def send_individual(self, individual_id: UUID, encoding: T,
+                        cost: float | None = None) -> Future:
+        priority = self.__priority(cost) if cost is not None else None
+        dispatch = PublishDispatch()
+        self.__publish_individuals(
+            self._message_codec.encode_individuals([(individual_id, encoding)]), dispatch, priority)
+        return self.__seal(dispatch)
+
+    def send_individuals(self, individuals: Iterable[Tuple[UUID, T]],
+                         cost: Callable[[UUID, T], float] | None = None) -> Future:
+        encode = self._message_codec.encode_individuals
+        dispatch = PublishDispatch()
+        if cost is None or self._priority_scale is None:
+            for envelope in batched(individuals, self.envelope_size):
+                self.__publish_individuals(encode(envelope), dispatch)
+            return self.__seal(dispatch)
+        # The individuals share envelopes with others of the same priority
+        envelopes: Dict[int, List[Tuple[UUID, T]]] = {}
+        for individual in individuals:
+            priority = self.__priority(cost(*individual))
+            envelope = envelopes.setdefault(priority, [])
+            envelope.append(individual)
+            if len(envelope) >= self.envelope_size:
+                self.__publish_individuals(encode(envelope), dispatch, priority)
+                del envelopes[priority]
+        for priority in sorted(envelopes, reverse=True):  # the most expensive first
+            self.__publish_individuals(encode(envelopes[priority]), dispatch, priority)
+        return self.__seal(dispatch)
+
+    def start_generation(self, generation_id: UUID) -> Future:
+        # Set right away, the individuals sent next from this thread go to the new queue
+        self._generation_id = generation_id
+        self._generation_q = self.generation_queue(generation_id)
+        self._set_payload_headers({GENERATION_HEADER: generation_id})
+        return self._commands.submit(self.__declare_generation_queue)
 
+    @on_ioloop
     def clear_individuals_queue(self):
-        self.channel.queue_purge(queue=self.individuals_q)
+        if self._generation_q is not None:
+            self.channel.queue_purge(queue=self._generation_q)
 
-    def broadcast_new_generation_signal(self):
-        self.channel.basic_publish(exchange=self.new_gen_ex, routing_key='',
-                                   body='NEW GENERATION INCOMING')
+    def broadcast_new_generation_signal(self, generation_id: UUID | None = None) -> Future:
+        if generation_id is None:
+            generation_id = self._generation_id
+        properties = None
+        if generation_id is not None:
+            properties = pika.BasicProperties(headers={GENERATION_HEADER: generation_id})
+        dispatch = PublishDispatch()
+        self.__submit_publish(dispatch, [
+            dict(exchange=self.new_gen_ex, routing_key='', body='NEW GENERATION INCOMING',
+                 properties=properties)])
+        return self.__seal(dispatch)
 
-    def broadcast_experiment_termination_signal(self):
-        self.channel.basic_publish(exchange=self.termination_ex, routing_key='',
-                                   body='EXPERIMENT TERMINATED')
+    def broadcast_experiment_termination_signal(self) -> Future:
+        dispatch = PublishDispatch()
+        self.__submit_publish(dispatch, [
+            dict(exchange=self.termination_ex, routing_key='', body='EXPERIMENT TERMINATED')])
+        return self.__seal(dispatch)
 
     def on_channel_open(self, channel):
         self.channel = channel
+        if self._confirms is not None:
+            self.__setup_confirms(channel)
         # Setup exchanges (pub/sub)
         channel.exchange_declare(exchange=self.new_gen_ex,
                                  exchange_type='fanout')
         channel.exchange_declare(exchange=self.termination_ex,
                                  exchange_type='fanout')
-        # Setup queues
-        channel.queue_declare(queue=self.individuals_q,
-                              callback=self._acknowledge_queue_declaration)
+        # Setup queues, the queues of the individuals are declared by start_generation
         channel.queue_declare(queue=self.results_q,
                               callback=self._acknowledge_queue_declaration)
         channel.basic_consume(queue=self.results_q,
@@ -71,20 +196,129 @@ class RabbitMqMessaging(RabbitMqMessagingBaseControls,
         if self._is_fully_initialized:
             self._call_start_callback()
 
-    def __on_result_received_msg(self, channel, method, _, body):
-        res = self.__message_parser(body)
-        if res:
-            self.result_receiver_listeners(res[0], res[1])
-            channel.basic_ack(delivery_tag=method.delivery_tag)
-        else:
-            channel.basic_nack(delivery_tag=method.delivery_tag)
+    def _on_keep_alive(self):
+        super()._on_keep_alive()
+        # Workers that joined after the new generation signal learn which queue to consume
+        if self._generation_id is not None:
+            self.broadcast_new_generation_signal()
+
+    def __declare_generation_queue(self, callback=None):
+        arguments = {'x-expires': int(self.generation_queue_expires * 1000)}
+        if self.max_priority:
+            arguments['x-max-priority'] = self.max_priority
+        self.channel.queue_declare(queue=self._generation_q, callback=callback,
+                                   arguments=arguments)
+        for transfer_q, (generation_q, dispatch) in list(self._transfer_queues.items()):
+            if generation_q != self._generation_q:  # stale, it expires by itself
+                del self._transfer_queues[transfer_q]
+                continue
+            self.__declare_transfer_queue(transfer_q, callback=lambda frame, d=dispatch:
+                                          self.__on_transfer_queue_declared(frame, d))
 
-    @staticmethod
-    def __message_parser(raw_msg: str | bytes | bytearray) -> Tuple[UUID, FitnessScore] | None:
+    def __declare_transfer_queue(self, queue: str, callback=None):
+        self.channel.queue_declare(queue=queue, callback=callback,
+                                   arguments={'x-expires': int(self.transfer_timeout * 1000)})
+
+    def __on_transfer_queue_declared(self, frame, dispatch: PublishDispatch):
+        declared = frame.method
+        # Consumed by a worker, which deletes it once complete, or empty once its chunks were
+        # published because it was already consumed (and declared again)
+        if declared.consumer_count > 0 \
+                or (declared.message_count == 0 and dispatch.future.done()):
+            self._transfer_queues.pop(declared.queue, None)
+
+    def __setup_confirms(self, channel):
+        self._confirms.attach(channel)
+        channel.add_on_close_callback(lambda _, reason: self._confirms.fail(
+            ConnectionError(f'The channel is closed: {reason}')))
+        # The broker blocks the publishers when it is low on memory or disk
+        self.connection.add_on_connection_blocked_callback(lambda *_: self._confirms.block())
+        self.connection.add_on_connection_unblocked_callback(lambda *_: self._confirms.unblock())
+
+    @property
+    def __backlog_count(self) -> int:
+        return self._confirms.backlog_count if self._confirms is not None else 0
+
+    def __priority(self, cost: float) -> int | None:
+        return self._priority_scale.priority(cost) if self._priority_scale else None
+
+    def __publish_individuals(self, body: bytes, dispatch: PublishDispatch,
+                              priority: int | None = None):
+        """
+        Prepares the messages on the calling thread and publishes them on the ioloop
+        :param dispatch: of the send the messages belong to
+        """
+        body, properties = self._compress_payload(body, priority)
+        if self.max_message_size is None or len(body) <= self.max_message_size:
+            self.__submit_publish(dispatch, [
+                dict(exchange='', routing_key=self._generation_q, body=body,
+                     properties=properties)])
+            return
+        # The chunks go to a queue of their own and a manifest takes the place of the message,
+        # the consumer that receives the manifest consumes the chunks
+        manifest = TransferManifest(queue=f'{self.individuals_q}-transfer-{uuid4().hex}',
+                                    chunks=-(-len(body) // self.max_message_size),
+                                    chunk_size=self.max_message_size, size=len(body))
+        messages = [dict(exchange='', routing_key=manifest.queue, body=chunk,
+                         properties=pika.BasicProperties(headers={CHUNK_HEADER: index}))
+                    for index, chunk in enumerate(split_in_chunks(body, manifest.chunk_size))]
+        messages.append(dict(exchange='', routing_key=self._generation_q, body=b'',
+                             properties=pika.BasicProperties(
+                                 content_type=properties.content_type,
+                                 content_encoding=properties.content_encoding,
+                                 priority=properties.priority,
+                                 headers={**(properties.headers or {}),
+                                          **manifest.to_headers()})))
+        self.__submit_publish(dispatch, messages, transfer=(manifest.queue, self._generation_q))
+
+    def __submit_publish(self, dispatch: PublishDispatch, messages: List[dict],
+                         transfer: Tuple[str, str] | None = None):
+        if self._confirms is not None:  # waits while the backlog is full
+            self._confirms.reserve(len(messages))
+        self._commands.submit(self.__publish, dispatch, messages, transfer=transfer)
+
+    def __publish(self, dispatch: PublishDispatch, messages: List[dict],
+                  transfer: Tuple[str, str] | None = None):
+        """
+        :param transfer: the queue of the chunks and its generation queue, declared first
+        """
         try:
-            msg = json.loads(raw_msg)
-        except TypeError:
-            return None
-        if 'id' not in msg or 'fitness' not in msg:
-            return None
-        return msg['id'], msg['fitness']
+            if transfer is not None:
+                transfer_q, generation_q = transfer
+                self.__declare_transfer_queue(transfer_q)
+                self._transfer_queues[transfer_q] = (generation_q, dispatch)
+            for message in messages:
+                if self._confirms is None:
+                    self.channel.basic_publish(**message)
+                else:
+                    self._confirms.publish(**message, dispatch=dispatch)
+        except Exception as e:
+            dispatch.fail(e)
+
+    def __seal(self, dispatch: PublishDispatch) -> Future:
+        """
+        :return: a future resolved once the messages submitted so far for the dispatch are
+        published, or confirmed in confirm mode
+        """
+        # If the connection closes before, the commands of the dispatch never run
+        self._commands.submit(dispatch.seal) \
+            .add_done_callback(lambda future: future.exception() and dispatch.fail(future.exception()))
+        return dispatch.future
+
+    def __on_result_received_msg(self, channel, method, properties, body):
+        generation_id = (properties.headers or {}).get(GENERATION_HEADER)
+        if generation_id is not None and generation_id != self._generation_id:
+            channel.basic_ack(delivery_tag=method.delivery_tag)  # late, dropped unread
+            return
+        codec, body = self._read_payload(properties, body)
+        results = codec.decode_results(body) if codec and body is not None else None
+        if results:
+            self._notify_results_received(results)
+            evaluation_secs = (properties.headers or {}).get(EVALUATION_SECS_HEADER)
+            if isinstance(evaluation_secs, (int, float)) and evaluation_secs >= 0:
+                self._notify_evaluation_secs_received([_id for _id, _ in results],
+                                                      evaluation_secs)
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+        else:  # requeued, it would be redelivered forever
+            self._undecodable_results_count += 1
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
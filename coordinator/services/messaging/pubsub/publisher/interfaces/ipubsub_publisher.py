@@ -1,11 +1,16 @@
 from abc import abstractmethod
 
+from shared.annotations.custom import UUID
 from shared.services.messaging.pubsub.interfaces.ipubsub import IPubSubControls
 
 
 class IPubSubPublisher(IPubSubControls):
     @abstractmethod
-    def broadcast_new_generation_signal(self):
+    def broadcast_new_generation_signal(self, generation_id: UUID | None = None):
+        """
+        :param generation_id: the generation that starts, so the subscribers can tell it apart
+        from the previous ones
+        """
         raise NotImplementedError
 
     @abstractmethod
@@ -0,0 +1,48 @@
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable
+
+from shared.annotations.custom import UUID
+from coordinator.services.scheduling.implementations.genome_size_estimator import genome_size
+from coordinator.services.scheduling.interfaces.icost_estimator import ICostEstimator
+
+
+class EvaluationTimeCostEstimator(ICostEstimator[Any]):
+    """
+    The cost is the average evaluation time observed for similar genomes. Genomes are similar
+    when they have the same key, by default their number of genes. Genomes without history
+    get the average of all the observations
+    """
+
+    def __init__(self, key: Callable[[Any], Hashable] = genome_size, smoothing: float = 0.2):
+        """
+        :param key: groups similar genomes
+        :param smoothing: weight of every new observation in the moving average of its group
+        """
+        self.key = key
+        self.smoothing = smoothing
+        self._averages: Dict[Hashable, float] = {}
+        self._overall: float | None = None
+        self._pending_keys: Dict[UUID, Hashable] = {}  # of the individuals estimated
+        self._lock = Lock()
+
+    def estimate(self, individual_id: UUID, encoding: Any) -> float:
+        key = self.key(encoding)
+        with self._lock:
+            self._pending_keys[individual_id] = key
+            cost = self._averages.get(key, self._overall)
+        return 1.0 if cost is None else cost
+
+    def record(self, individual_id: UUID, evaluation_secs: float):
+        with self._lock:
+            key = self._pending_keys.pop(individual_id, None)
+            if key is None:
+                return
+            self._averages[key] = self.__smooth(self._averages.get(key), evaluation_secs)
+            self._overall = self.__smooth(self._overall, evaluation_secs)
+
+    def clear_pending(self):
+        with self._lock:
+            self._pending_keys.clear()
+
+    def __smooth(self, average: float | None, value: float) -> float:
+        return value if average is None else average + self.smoothing * (value - average)
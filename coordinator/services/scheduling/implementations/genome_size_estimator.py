@@ -0,0 +1,27 @@
+from typing import Any
+
+from shared.annotations.custom import UUID
+from coordinator.services.scheduling.interfaces.icost_estimator import ICostEstimator
+
+
+def genome_size(encoding: Any) -> int:
+    """
+    :return: the number of genes of a list of numbers, a list of lists or a NumPy array
+    """
+    size = getattr(encoding, 'size', None)  # NumPy arrays
+    if isinstance(size, int):
+        return size
+    try:
+        return sum(len(row) if isinstance(row, (list, tuple)) else 1 for row in encoding)
+    except TypeError:
+        return 1
+
+
+class GenomeSizeCostEstimator(ICostEstimator[Any]):
+    """
+    The cost is the number of genes, for evaluations that grow with the size of the genome
+    (e.g. the weights of a network)
+    """
+
+    def estimate(self, individual_id: UUID, encoding: Any) -> float:
+        return max(1, genome_size(encoding))
@@ -0,0 +1,35 @@
+from abc import ABC, abstractmethod
+from typing import Generic, TypeVar
+
+from shared.annotations.custom import UUID
+
+T = TypeVar('T')
+
+
+class ICostEstimator(ABC, Generic[T]):
+    """
+    Predicts how expensive an individual is to evaluate, so the most expensive individuals
+    can be sent first and the generation doesn't wait for a few late stragglers
+    """
+
+    @abstractmethod
+    def estimate(self, individual_id: UUID, encoding: T) -> float:
+        """
+        :return: the expected cost, in any unit as long as it is positive and proportional
+        to the evaluation time
+        """
+        raise NotImplementedError
+
+    def record(self, individual_id: UUID, evaluation_secs: float):
+        """
+        Called with the observed evaluation time of an individual previously estimated, the
+        estimators that learn from it can override this
+        """
+        pass
+
+    def clear_pending(self):
+        """
+        Called when a new generation starts, the individuals estimated until then won't be
+        recorded. The estimators that keep them can override this
+        """
+        pass
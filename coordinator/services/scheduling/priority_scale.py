@@ -0,0 +1,26 @@
+import math
+from threading import Lock
+
+
+class PriorityScale:
+    """
+    Maps costs to message priorities from 0 to max_priority. The costs are placed on a log
+    scale between the min and max costs seen so far, so the most expensive individuals get
+    the highest priority
+    """
+
+    def __init__(self, max_priority: int):
+        self.max_priority = max_priority
+        self._min: float | None = None
+        self._max: float | None = None
+        self._lock = Lock()
+
+    def priority(self, cost: float) -> int:
+        value = math.log(max(cost, 1e-9))
+        with self._lock:
+            self._min = value if self._min is None else min(self._min, value)
+            self._max = value if self._max is None else max(self._max, value)
+            low, high = self._min, self._max
+        if high == low:
+            return 0
+        return round((value - low) / (high - low) * self.max_priority)
@@ -0,0 +1,59 @@
+import gzip
+import os
+import pickle
+from typing import Any, List
+
+from shared.annotations.custom import UUID
+
+
+class ArchiveSegments:
+    """
+    Append-only, gzip compressed files holding archived generations. Every segment holds up to
+    `generations_per_segment` consecutive generations of an experiment and every generation is
+    appended as an independent gzip member, so a segment is never rewritten.
+    """
+
+    def __init__(self, directory: str, generations_per_segment: int):
+        self._directory = directory
+        self._generations_per_segment = max(1, generations_per_segment)
+
+    def segment_path(self, experiment_id: UUID, generation_seq: int) -> str:
+        """
+        :param experiment_id:
+        :param generation_seq: the generation number inside the experiment, starting at 1
+        :return: the path of the segment where the generation is (or will be) archived
+        """
+        first_seq = ((generation_seq - 1) // self._generations_per_segment
+                     * self._generations_per_segment + 1)
+        return os.path.join(self._directory, f'ex-{experiment_id}', f'segment-{first_seq:08d}.gz')
+
+    def append(self, experiment_id: UUID, generation_seq: int, generation_id: UUID,
+               records: List[Any]) -> str:
+        """
+        Archives the records of a generation
+        :return: the path of the segment
+        """
+        path = self.segment_path(experiment_id, generation_seq)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab') as f:
+            with gzip.GzipFile(fileobj=f, mode='wb') as member:
+                pickle.dump((generation_id, records), member, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        return path
+
+    @staticmethod
+    def read(path: str, generation_id: UUID) -> List[Any] | None:
+        """
+        :return: the archived records of the generation, None if it is not in the segment
+        """
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, 'rb') as f:
+            while True:
+                try:
+                    archived_generation_id, records = pickle.load(f)
+                except EOFError:
+                    return None
+                if archived_generation_id == generation_id:
+                    return records
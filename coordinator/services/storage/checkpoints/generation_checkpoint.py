@@ -0,0 +1,194 @@
+import json
+import math
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Iterable, Iterator, Dict, Collection, List
+
+from shared.annotations.custom import UUID, FitnessScore
+from shared.models.entities.individual import IndividualEntity
+from shared.services.serialization.interfaces.igenome_codec import IGenomeCodec
+from shared.services.serialization.registry import GenomeCodecRegistry
+
+# magic, version, reserved, generation id, individuals count, codec id
+_HEADER = struct.Struct('<8sHH4xqq16s')
+_MAGIC = b'DGACKPT\0'
+# Version 2 is written when the ids are not integers
+_VERSION, _TEXT_IDS_VERSION = 1, 2
+
+
+class GenerationCheckpoint:
+    """
+    A generation stored as columns in a single file, little-endian and 8-byte aligned:
+    header | ids (int64) | fitness (float64, NaN if missing) | encoding offsets (uint64, count + 1)
+    | encodings packed one after another with the codec named in the header.
+    If the ids are not integers (version 2), the ids column is replaced by id offsets (uint64,
+    count + 2) after the encoding offsets, and the generation id followed by the individual ids
+    are written as JSON after the encodings.
+    The file is memory-mapped, so opening it is immediate regardless of its size and only the
+    accessed encodings are read (and decoded). The fitness column can be updated in place.
+    """
+
+    def __init__(self, path: str, writable: bool = False,
+                 codec_registry: GenomeCodecRegistry | None = None):
+        """
+        Use GenerationCheckpoint.open instead
+        """
+        self.path = path
+        self._file = open(path, 'r+b' if writable else 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0,
+                               access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, version, _, self.generation_id, count, codec_id = _HEADER.unpack_from(buffer)
+        if magic != _MAGIC or version not in (_VERSION, _TEXT_IDS_VERSION):
+            self.close()
+            raise ValueError(f'{path} is not a generation checkpoint (version {_VERSION} or '
+                             f'{_TEXT_IDS_VERSION})')
+        self._codec = (codec_registry or GenomeCodecRegistry.default()) \
+            .get(codec_id.rstrip(b'\0').decode())
+        self._count = count
+        if sys.byteorder != 'little':
+            raise NotImplementedError('Checkpoints can only be mapped on little-endian machines')
+        has_text_ids = version == _TEXT_IDS_VERSION
+        fitness_start = _HEADER.size if has_text_ids else _HEADER.size + 8 * count
+        offsets_start = fitness_start + 8 * count
+        self._data_start = offsets_start + 8 * (count + 1)
+        if has_text_ids:
+            id_offsets_start, self._data_start = \
+                self._data_start, self._data_start + 8 * (count + 2)
+        self.fitness = buffer[fitness_start:offsets_start].cast('d')
+        self._offsets = buffer[offsets_start:offsets_start + 8 * (count + 1)].cast('Q')
+        self._buffer = buffer
+        if has_text_ids:
+            with buffer[id_offsets_start:self._data_start].cast('Q') as id_offsets:
+                ids_start = self._data_start + self._offsets[count]
+                ids = [json.loads(bytes(buffer[ids_start + start:ids_start + end]))
+                       for start, end in zip(id_offsets, id_offsets[1:])]
+            self.generation_id, self.ids = ids[0], ids[1:]
+        else:
+            self.ids = buffer[_HEADER.size:fitness_start].cast('q')
+        self._index: Dict[UUID, int] | None = None
+
+    @classmethod
+    def open(cls, path: str, writable: bool = False,
+             codec_registry: GenomeCodecRegistry | None = None) -> 'GenerationCheckpoint':
+        """
+        Memory-maps a checkpoint. It doesn't need any storage, so it can be used for offline
+        analysis too
+        :param path:
+        :param writable: True to allow updating the fitness column
+        :param codec_registry: the registry where the codec of the encodings is looked up
+        """
+        return cls(path, writable, codec_registry)
+
+    @staticmethod
+    def write(path: str, generation_id: UUID, individuals: Iterable[IndividualEntity],
+              codec: IGenomeCodec):
+        """
+        Writes a checkpoint, the individuals can be streamed since only the ids and fitness
+        are kept in memory. The file is replaced atomically
+        """
+        ids: List[UUID] = []
+        fitness, offsets = array('d'), array('Q', [0])
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.TemporaryFile(dir=directory) as data:
+            for ind in individuals:
+                raw = codec.encode(ind.encoding)
+                data.write(raw)
+                ids.append(ind.id)
+                fitness.append(math.nan if ind.fitness is None else ind.fitness)
+                offsets.append(offsets[-1] + len(raw))
+            has_text_ids = not all(isinstance(_id, int) for _id in (generation_id, *ids))
+            if has_text_ids:
+                raw_ids = [json.dumps(_id).encode() for _id in (generation_id, *ids)]
+                id_offsets = array('Q', [0])
+                for raw_id in raw_ids:
+                    id_offsets.append(id_offsets[-1] + len(raw_id))
+                columns = [fitness, offsets, id_offsets]
+            else:
+                columns = [array('q', ids), fitness, offsets]
+            if sys.byteorder != 'little':
+                for column in columns:
+                    column.byteswap()
+            fd, tmp_path = tempfile.mkstemp(prefix=f'{os.path.basename(path)}.',
+                                            suffix='.tmp', dir=directory)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, _TEXT_IDS_VERSION if has_text_ids else _VERSION, 0,
+                                     0 if has_text_ids else generation_id, len(ids),
+                                     codec.codec_id.encode()))
+                for column in columns:
+                    f.write(column.tobytes())
+                data.seek(0)
+                shutil.copyfileobj(data, f)
+                if has_text_ids:
+                    f.write(b''.join(raw_ids))
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def index_of(self, individual_id: UUID) -> int | None:
+        if self._index is None:
+            self._index = {_id: i for i, _id in enumerate(self.ids)}
+        return self._index.get(individual_id)
+
+    def encoding(self, index: int):
+        start = self._data_start + self._offsets[index]
+        end = self._data_start + self._offsets[index + 1]
+        return self._codec.decode(self._buffer[start:end])
+
+    def individual(self, index: int) -> IndividualEntity:
+        fitness = self.fitness[index]
+        return IndividualEntity(id=self.ids[index], encoding=self.encoding(index),
+                                fitness=None if math.isnan(fitness) else fitness)
+
+    def iter_individuals(self, only_ids: Collection[UUID] | None = None) -> Iterator[IndividualEntity]:
+        """
+        :param only_ids: if provided, only the individuals with these ids are yielded. The
+        iteration stops if the checkpoint is closed meanwhile
+        """
+        for index in range(self._count):
+            if self._mmap.closed:
+                return
+            if only_ids is None or self.ids[index] in only_ids:
+                yield self.individual(index)
+
+    def update_fitness(self, values: Iterable[tuple[UUID, FitnessScore | None]]):
+        """
+        Writes the given fitness scores in place, the checkpoint must be opened as writable
+        """
+        for individual_id, fitness in values:
+            index = self.index_of(individual_id)
+            if index is not None:
+                self.fitness[index] = math.nan if fitness is None else fitness
+        self._mmap.flush()
+
+    def as_numpy(self):
+        """
+        :return: the ids and fitness columns as NumPy arrays that share the mapped memory, they
+        must be released before closing the checkpoint. Ids that are not integers are copied
+        """
+        import numpy as np
+        ids = np.array(self.ids) if isinstance(self.ids, list) \
+            else np.frombuffer(self.ids, dtype='<i8')
+        return ids, np.frombuffer(self.fitness, dtype='<f8')
+
+    def close(self):
+        for view in ('ids', 'fitness', '_offsets', '_buffer'):
+            if isinstance(getattr(self, view, None), memoryview):
+                getattr(self, view).release()
+        self._mmap.close()
+        self._file.close()
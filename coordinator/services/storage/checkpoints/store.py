@@ -0,0 +1,75 @@
+import os
+
+from coordinator.services.storage.checkpoints.generation_checkpoint import GenerationCheckpoint
+from coordinator.services.storage.interfaces.istorage import IStorage
+from shared.annotations.custom import UUID
+from shared.services.serialization.interfaces.igenome_codec import IGenomeCodec
+from shared.services.serialization.registry import GenomeCodecRegistry
+
+
+class GenerationCheckpoints:
+    """
+    Manages the checkpoint files of the experiments, one per generation
+    """
+
+    def __init__(self, directory: str = 'checkpoints', codec: str | IGenomeCodec = 'json',
+                 keep: int = 2, codec_registry: GenomeCodecRegistry | None = None):
+        """
+        :param directory: where the checkpoints are written
+        :param codec: the codec (or its id) used to pack the encodings. The default one keeps
+        any JSON genome as is, 'packed' is more compact for numeric genomes but decodes integers
+        mixed with floats as floats
+        :param keep: number of latest checkpoints kept per experiment, the older ones are deleted
+        :param codec_registry:
+        """
+        self._directory = directory
+        self._codecs = codec_registry or GenomeCodecRegistry.default()
+        self._codec = self._codecs.resolve(codec)
+        self._keep = max(1, keep)
+
+    def path(self, experiment_id: UUID, generation_id: UUID) -> str:
+        return os.path.join(self._directory, f'ex-{experiment_id}',
+                            f'generation-{generation_id}.ckpt')
+
+    def exists(self, experiment_id: UUID, generation_id: UUID) -> bool:
+        return os.path.exists(self.path(experiment_id, generation_id))
+
+    def save(self, experiment_id: UUID, generation_id: UUID, storage: IStorage,
+             chunk_size: int = 1000):
+        """
+        Writes the checkpoint of a generation streaming its population from the storage
+        """
+        GenerationCheckpoint.write(self.path(experiment_id, generation_id), generation_id,
+                                   storage.iter_population(generation_id, chunk_size),
+                                   self._codec)
+        self.__remove_old(experiment_id)
+
+    def open(self, experiment_id: UUID, generation_id: UUID,
+             writable: bool = True) -> GenerationCheckpoint | None:
+        """
+        :return: the memory-mapped checkpoint, None if there is no checkpoint for the generation
+        """
+        path = self.path(experiment_id, generation_id)
+        if not os.path.exists(path):
+            return None
+        return GenerationCheckpoint.open(path, writable, self._codecs)
+
+    def __remove_old(self, experiment_id: UUID):
+        directory = os.path.join(self._directory, f'ex-{experiment_id}')
+        checkpoints = []
+        for entry in os.scandir(directory):
+            if not entry.name.endswith('.ckpt'):
+                continue
+            try:
+                with GenerationCheckpoint.open(entry.path, codec_registry=self._codecs) as ckpt:
+                    checkpoints.append((ckpt.generation_id, entry.stat().st_mtime_ns, entry.path))
+            except ValueError:  # not a checkpoint, it is left as is
+                continue
+        # Ordered by the generation they store. Text ids have no order, then the time they were
+        # written is used instead
+        if all(isinstance(generation_id, int) for generation_id, _, _ in checkpoints):
+            checkpoints.sort(key=lambda checkpoint: checkpoint[0])
+        else:
+            checkpoints.sort(key=lambda checkpoint: checkpoint[1])
+        for _, _, path in checkpoints[:-self._keep]:
+            os.remove(path)
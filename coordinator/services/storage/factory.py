@@ -2,6 +2,8 @@ from enum import Enum
 from typing import TypeVar, Generic
 
 from coordinator.services.storage.interfaces.istorage import IStorage
+from shared.services.serialization.interfaces.igenome_codec import IGenomeCodec
+from shared.services.serialization.registry import GenomeCodecRegistry
 
 T = TypeVar('T')
 
@@ -9,15 +11,28 @@ T = TypeVar('T')
 class StorageDrivers(Enum):
     SQLITE = 1
     MEMORY = 2
+    SHARDED_SQLITE = 3
 
 
 class StorageFactory(Generic[T]):
+    @classmethod
+    def register_codec(cls, codec: IGenomeCodec):
+        """
+        Makes a custom genome codec available to the storages, then it can be selected by its
+        id through the codec parameter of create
+        :param codec:
+        """
+        GenomeCodecRegistry.default().register(codec)
+        return cls
 
     @classmethod
     def create(cls, driver: StorageDrivers, **kwargs) -> IStorage[T]:
         if driver == StorageDrivers.SQLITE:
             from coordinator.services.storage.implementations.sqlite.sqlite import SqliteStorage
             return SqliteStorage[T](**kwargs)
+        elif driver == StorageDrivers.SHARDED_SQLITE:
+            from coordinator.services.storage.implementations.sqlite.sharded import ShardedSqliteStorage
+            return ShardedSqliteStorage[T](**kwargs)
         else:
             from coordinator.services.storage.implementations.in_memory import InMemoryStorage
-            return InMemoryStorage[T]()
+            return InMemoryStorage[T](**kwargs)
@@ -1,10 +1,352 @@
-from typing import TypeVar
+import copy
+import heapq
+import os
+import pickle
+import tempfile
+import time
+from dataclasses import dataclass, field
+from threading import RLock
+from typing import TypeVar, Generic, Dict, List, Tuple, Iterator
 
-from coordinator.services.storage.implementations.sqlite.sqlite import SqliteStorage
+from coordinator.services.storage.archive.segments import ArchiveSegments
+from coordinator.services.storage.interfaces.istorage import IStorage
+from coordinator.services.storage.retention import RetentionPolicy
+from shared.annotations.custom import UUID, FitnessScore
+from shared.models.entities.individual import IndividualEntity
+from shared.models.value_objects.generation_stats import GenerationStats
+from shared.models.value_objects.individual import IndividualValue, IndividualFitnessValue
+from shared.models.value_objects.population import PopulationBatch
+from shared.utils.running_stats import RunningStats
 
 T = TypeVar('T')
 
 
-class InMemoryStorage(SqliteStorage[T]):
-    def __init__(self):
-        super().__init__(':memory:')
+@dataclass(slots=True)
+class _ExperimentRecord:
+    name: str
+    generation_ids: List[int] = field(default_factory=list)
+    last_generation_seq: int = 0
+    # Min-heap of (fitness, individual id) with the best individuals
+    hall_of_fame: List[Tuple[FitnessScore, int]] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class _GenerationRecord:
+    experiment_id: int
+    seq: int
+    individual_ids: List[int] = field(default_factory=list)
+    # Used as an ordered set of the individuals without a fitness
+    untested_ids: Dict[int, None] = field(default_factory=dict)
+    archive_segment: str | None = None
+    stats: RunningStats = field(default_factory=RunningStats)
+
+
+@dataclass(slots=True)
+class _IndividualRecord(Generic[T]):
+    generation_id: int
+    encoding: T
+    fitness: FitnessScore | None
+
+
+class InMemoryStorage(IStorage[T]):
+    """
+    Keeps everything in dictionaries. The encodings are kept as the given Python objects, so
+    they are never serialized (unless a snapshot is taken) and the returned individuals share
+    them with the storage.
+    """
+
+    def __init__(self, snapshot_path: str | None = None,
+                 snapshot_interval_secs: float = 60,
+                 retention: RetentionPolicy | None = None,
+                 hall_of_fame_size: int = 100):
+        """
+        :param snapshot_path: if provided, the storage is restored from this file (when it
+        exists) and snapshot writes to it
+        :param snapshot_interval_secs: min time between the snapshots written when the storage
+        is flushed. Call snapshot to write one at any other time, e.g. after stopping
+        :param retention: if provided, apply_retention moves the old generations to archive
+        segments, keeping only their elites in memory
+        :param hall_of_fame_size: number of best individuals of every experiment tracked as the
+        results arrive, they are never archived and serve the top-k queries without a range
+        """
+        self._snapshot_path = snapshot_path
+        self._snapshot_interval_secs = snapshot_interval_secs
+        self._latest_snapshot_time = time.monotonic()
+        self._retention = retention
+        self._hall_of_fame_size = max(0, hall_of_fame_size)
+        self._archive = None if retention is None \
+            else ArchiveSegments(retention.archive_dir, retention.generations_per_segment)
+        self._lock = RLock()
+        self._experiments: Dict[int, _ExperimentRecord] = {}
+        self._experiment_names: Dict[str, int] = {}
+        self._generations: Dict[int, _GenerationRecord] = {}
+        self._individuals: Dict[int, _IndividualRecord[T]] = {}
+        self._last_ids = {'experiment': 0, 'generation': 0, 'individual': 0}
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.__restore(snapshot_path)
+
+    def create_experiment(self, name: str) -> Tuple[UUID, bool]:
+        with self._lock:
+            if name in self._experiment_names:
+                return self._experiment_names[name], True
+            experiment_id = self.__next_id('experiment')
+            self._experiments[experiment_id] = _ExperimentRecord(name=name)
+            self._experiment_names[name] = experiment_id
+            return experiment_id, False
+
+    def experiment_exist(self, experiment_id: UUID) -> bool:
+        return experiment_id in self._experiments
+
+    def create_generation(self, experiment_id: UUID) -> UUID:
+        with self._lock:
+            experiment = self._experiments.get(experiment_id)
+            if experiment is None:
+                raise KeyError(f'Experiment {experiment_id} does not exist')
+            generation_id = self.__next_id('generation')
+            experiment.last_generation_seq += 1
+            experiment.generation_ids.append(generation_id)
+            self._generations[generation_id] = _GenerationRecord(
+                experiment_id=experiment_id, seq=experiment.last_generation_seq)
+            return generation_id
+
+    def store_population(self, generation_id: UUID, individuals: List[IndividualValue[T]]):
+        with self._lock:
+            generation = self._generations.get(generation_id)
+            if generation is None:
+                raise KeyError(f'Generation {generation_id} does not exist')
+            for ind in individuals:
+                individual_id = self.__next_id('individual')
+                self._individuals[individual_id] = _IndividualRecord(
+                    generation_id=generation_id, encoding=ind.encoding, fitness=ind.fitness)
+                generation.individual_ids.append(individual_id)
+                if ind.fitness is None:
+                    generation.untested_ids[individual_id] = None
+                else:
+                    generation.stats.add(ind.fitness)
+                    self.__update_hall_of_fame(generation.experiment_id, individual_id,
+                                               ind.fitness)
+
+    def store_individual_fitness(self, individual_id: UUID, fitness: FitnessScore):
+        with self._lock:
+            individual = self._individuals.get(individual_id)
+            if individual is None or individual.fitness is not None:
+                return  # only the first score of an individual is stored
+            individual.fitness = fitness
+            generation = self._generations[individual.generation_id]
+            generation.untested_ids.pop(individual_id, None)
+            generation.stats.add(fitness)
+            self.__update_hall_of_fame(generation.experiment_id, individual_id, fitness)
+
+    def store_fitness_batch(self, fitness_values: List[IndividualFitnessValue]):
+        with self._lock:
+            for fv in fitness_values:
+                self.store_individual_fitness(fv.id, fv.fitness)
+
+    def flush(self):
+        """
+        Writes a snapshot if the snapshot interval elapsed since the latest one
+        """
+        if (self._snapshot_path and time.monotonic() - self._latest_snapshot_time
+                >= self._snapshot_interval_secs):
+            self.snapshot()
+
+    def snapshot(self, path: str | None = None):
+        """
+        Writes the whole storage to a file. The file is replaced atomically, so a failure while
+        writing never corrupts the previous snapshot
+        :param path: the snapshot path of the storage if not provided
+        """
+        path = path or self._snapshot_path
+        if not path:
+            raise ValueError('The storage has no snapshot path')
+        with self._lock:
+            state = (self._experiments, self._experiment_names, self._generations,
+                     self._individuals, self._last_ids)
+            fd, tmp_path = tempfile.mkstemp(prefix=f'{os.path.basename(path)}.',
+                                            suffix='.tmp', dir=os.path.dirname(path) or None)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            self._latest_snapshot_time = time.monotonic()
+
+    def apply_retention(self, experiment_id: UUID):
+        policy = self._retention
+        experiment = self._experiments.get(experiment_id)
+        if policy is None or experiment is None:
+            return
+        with self._lock:
+            horizon = experiment.last_generation_seq - max(1, policy.hot_generations)
+            for generation_id in experiment.generation_ids:
+                generation = self._generations[generation_id]
+                if generation.seq > horizon:
+                    break
+                if generation.archive_segment is None:
+                    self.__archive_generation(experiment_id, generation_id, generation)
+
+    def __archive_generation(self, experiment_id: UUID, generation_id: UUID,
+                             generation: _GenerationRecord):
+        records = [(_id, self._individuals[_id].encoding, self._individuals[_id].fitness)
+                   for _id in generation.individual_ids]
+        generation.archive_segment = self._archive.append(experiment_id, generation.seq,
+                                                          generation_id, records)
+        evaluated = sorted((record for record in records if record[2] is not None),
+                           key=lambda record: record[2], reverse=True)
+        elite_ids = {record[0] for record in evaluated[:self._retention.keep_elites]}
+        elite_ids.update(_id for _, _id in self._experiments[experiment_id].hall_of_fame)
+        for _id in generation.individual_ids:
+            if _id not in elite_ids:
+                del self._individuals[_id]
+        generation.individual_ids = [_id for _id in generation.individual_ids if _id in elite_ids]
+        generation.untested_ids.clear()
+
+    def get_experiment_id(self, experiment_name: str) -> UUID | None:
+        return self._experiment_names.get(experiment_name)
+
+    def get_latest_generation_id(self, experiment_id: UUID) -> UUID | None:
+        experiment = self._experiments.get(experiment_id)
+        if not experiment or not experiment.generation_ids:
+            return None
+        return experiment.generation_ids[-1]
+
+    def get_individual(self, individual_id: UUID) -> IndividualEntity[T] | None:
+        individual = self._individuals.get(individual_id)
+        if individual is None:
+            return None
+        return IndividualEntity(id=individual_id, encoding=individual.encoding,
+                                fitness=individual.fitness)
+
+    def get_population(self, generation_id: UUID) -> List[IndividualEntity[T]]:
+        with self._lock:
+            generation = self._generations.get(generation_id)
+            if generation is None:
+                return []
+            if generation.archive_segment is not None:
+                return self.__read_archived_population(generation_id, generation)
+            return self.__to_entities(generation.individual_ids)
+
+    def get_population_batch(self, generation_id: UUID) -> PopulationBatch:
+        return PopulationBatch.from_entities(self.get_population(generation_id))
+
+    def get_non_evaluated_individuals(self, generation_id: UUID) -> List[IndividualEntity[T]]:
+        with self._lock:
+            generation = self._generations.get(generation_id)
+            if generation is None:
+                return []
+            return self.__to_entities(generation.untested_ids)
+
+    def get_non_evaluated_ids(self, generation_id: UUID) -> List[UUID]:
+        with self._lock:
+            generation = self._generations.get(generation_id)
+            return [] if generation is None else list(generation.untested_ids)
+
+    def iter_population(self, generation_id: UUID,
+                        chunk_size: int = 1000) -> Iterator[IndividualEntity[T]]:
+        with self._lock:
+            generation = self._generations.get(generation_id)
+            if generation is not None and generation.archive_segment is not None:
+                return iter(self.__read_archived_population(generation_id, generation))
+            individual_ids = [] if generation is None else list(generation.individual_ids)
+        return self.__iter_entities(individual_ids, chunk_size)
+
+    def iter_untested(self, generation_id: UUID,
+                      chunk_size: int = 1000) -> Iterator[IndividualEntity[T]]:
+        return self.__iter_entities(self.get_non_evaluated_ids(generation_id), chunk_size)
+
+    def has_population(self, generation_id: UUID) -> bool:
+        generation = self._generations.get(generation_id)
+        return generation is not None and (len(generation.individual_ids) > 0
+                                           or generation.archive_segment is not None)
+
+    def count_non_evaluated_individuals(self, generation_id: UUID) -> int:
+        generation = self._generations.get(generation_id)
+        return 0 if generation is None else len(generation.untested_ids)
+
+    def count_generations(self, experiment_id: UUID) -> int:
+        experiment = self._experiments.get(experiment_id)
+        return 0 if experiment is None else len(experiment.generation_ids)
+
+    def get_generation_stats(self, experiment_id: UUID,
+                             generations: range | None = None) -> List[GenerationStats]:
+        if generations is not None and generations.step < 0:
+            raise ValueError('The range of generations must be increasing')
+        experiment = self._experiments.get(experiment_id)
+        if experiment is None:
+            return []
+        with self._lock:
+            generation_ids = experiment.generation_ids if generations is None \
+                else [experiment.generation_ids[number - 1] for number in generations
+                      if 0 < number <= len(experiment.generation_ids)]
+            return [GenerationStats.from_running_stats(
+                generation_id, self._generations[generation_id].seq,
+                copy.deepcopy(self._generations[generation_id].stats))
+                for generation_id in generation_ids]
+
+    def get_top_k(self, experiment_id: UUID, k: int,
+                  generations: range | None = None) -> List[IndividualEntity[T]]:
+        if generations is not None and generations.step < 0:
+            raise ValueError('The range of generations must be increasing')
+        experiment = self._experiments.get(experiment_id)
+        if experiment is None or k <= 0:
+            return []
+        with self._lock:
+            if generations is None and k <= self._hall_of_fame_size:
+                best = heapq.nlargest(k, experiment.hall_of_fame)
+                return self.__to_entities([_id for _, _id in best])
+            generation_ids = experiment.generation_ids if generations is None \
+                else [experiment.generation_ids[number - 1] for number in generations
+                      if 0 < number <= len(experiment.generation_ids)]
+            individuals = self._individuals
+            candidates = ((individuals[_id].fitness, _id)
+                          for generation_id in generation_ids
+                          for _id in self._generations[generation_id].individual_ids
+                          if individuals[_id].fitness is not None)
+            return self.__to_entities([_id for _, _id in heapq.nlargest(k, candidates)])
+
+    def __update_hall_of_fame(self, experiment_id: UUID, individual_id: UUID,
+                              fitness: FitnessScore):
+        if self._hall_of_fame_size == 0:
+            return
+        hall_of_fame = self._experiments[experiment_id].hall_of_fame
+        if len(hall_of_fame) < self._hall_of_fame_size:
+            heapq.heappush(hall_of_fame, (fitness, individual_id))
+        elif fitness > hall_of_fame[0][0]:
+            heapq.heapreplace(hall_of_fame, (fitness, individual_id))
+
+    def __to_entities(self, individual_ids) -> List[IndividualEntity[T]]:
+        individuals = self._individuals
+        entities = []
+        for _id in individual_ids:
+            individual = individuals[_id]
+            entities.append(IndividualEntity(id=_id, encoding=individual.encoding,
+                                             fitness=individual.fitness))
+        return entities
+
+    @staticmethod
+    def __read_archived_population(generation_id: UUID,
+                                   generation: _GenerationRecord) -> List[IndividualEntity[T]]:
+        records = ArchiveSegments.read(generation.archive_segment, generation_id)
+        if records is None:
+            raise FileNotFoundError(f'Generation {generation_id} is missing in the archive '
+                                    f'segment {generation.archive_segment}')
+        return [IndividualEntity(id=_id, encoding=encoding, fitness=fitness)
+                for _id, encoding, fitness in records]
+
+    def __iter_entities(self, individual_ids: List[int],
+                        chunk_size: int) -> Iterator[IndividualEntity[T]]:
+        for start in range(0, len(individual_ids), chunk_size):
+            with self._lock:
+                chunk = self.__to_entities(individual_ids[start:start + chunk_size])
+            yield from chunk
+
+    def __next_id(self, kind: str) -> int:
+        self._last_ids[kind] += 1
+        return self._last_ids[kind]
+
+    def __restore(self, path: str):
+        with open(path, 'rb') as f:
+            (self._experiments, self._experiment_names, self._generations,
+             self._individuals, self._last_ids) = pickle.load(f)
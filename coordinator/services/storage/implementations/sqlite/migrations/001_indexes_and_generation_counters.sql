@@ -0,0 +1,32 @@
+-- Generation sequence number (1, 2, 3, ...) per experiment and maintained counters
+ALTER TABLE experiments ADD COLUMN last_generation_seq INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE experiments ADD COLUMN generations_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE generations ADD COLUMN seq INTEGER;
+
+UPDATE generations SET seq = (
+    SELECT COUNT(*) FROM generations AS g
+    WHERE g.experiment_id = generations.experiment_id AND g.id <= generations.id
+);
+UPDATE experiments SET
+    generations_count = (SELECT COUNT(*) FROM generations WHERE experiment_id = experiments.id),
+    last_generation_seq = (SELECT IFNULL(MAX(seq), 0) FROM generations WHERE experiment_id = experiments.id);
+
+CREATE TRIGGER IF NOT EXISTS generations_after_insert AFTER INSERT ON generations
+BEGIN
+    UPDATE experiments
+    SET last_generation_seq = last_generation_seq + 1, generations_count = generations_count + 1
+    WHERE id = NEW.experiment_id;
+    UPDATE generations
+    SET seq = (SELECT last_generation_seq FROM experiments WHERE id = NEW.experiment_id)
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS generations_after_delete AFTER DELETE ON generations
+BEGIN
+    UPDATE experiments SET generations_count = generations_count - 1 WHERE id = OLD.experiment_id;
+END;
+
+-- Indexes
+CREATE UNIQUE INDEX IF NOT EXISTS generations_experiment_seq_idx ON generations (experiment_id, seq);
+CREATE INDEX IF NOT EXISTS individuals_generation_idx ON individuals (generation_id);
+CREATE INDEX IF NOT EXISTS individuals_untested_idx ON individuals (generation_id) WHERE fitness IS NULL;
@@ -0,0 +1,3 @@
+-- Encodings are stored as BLOBs produced by the genome codec identified in this column.
+-- The rows stored before this migration keep their JSON text
+ALTER TABLE individuals ADD COLUMN codec VARCHAR(16) NOT NULL DEFAULT 'json';
@@ -0,0 +1,36 @@
+-- Encodings are stored once in the genomes table, identified by a hash of their codec and bytes,
+-- and the individuals reference them. genome_hash is a function registered by the storage
+CREATE TABLE IF NOT EXISTS genomes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hash BLOB NOT NULL UNIQUE,
+    codec VARCHAR(16) NOT NULL,
+    encoding BLOB NOT NULL
+);
+
+-- The JSON text stored before the codecs is written again in the compact form of the codec,
+-- so it has the same hash as the new writes of the same genome. reencode is registered by the
+-- storage as well
+UPDATE individuals SET encoding = reencode(codec, encoding) WHERE typeof(encoding) = 'text';
+
+INSERT OR IGNORE INTO genomes (hash, codec, encoding)
+SELECT genome_hash(codec, encoding), codec, encoding FROM individuals ORDER BY id;
+
+CREATE TABLE individuals_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    generation_id INTEGER NOT NULL,
+    genome_id INTEGER NOT NULL,
+    fitness FLOAT,
+    FOREIGN KEY (generation_id) REFERENCES generations(id) ON DELETE CASCADE,
+    FOREIGN KEY (genome_id) REFERENCES genomes(id)
+);
+
+INSERT INTO individuals_new (id, generation_id, genome_id, fitness)
+SELECT i.id, i.generation_id, g.id, i.fitness
+FROM individuals AS i JOIN genomes AS g ON g.hash = genome_hash(i.codec, i.encoding);
+
+DROP TABLE individuals;
+ALTER TABLE individuals_new RENAME TO individuals;
+
+CREATE INDEX IF NOT EXISTS individuals_generation_idx ON individuals (generation_id);
+CREATE INDEX IF NOT EXISTS individuals_untested_idx ON individuals (generation_id) WHERE fitness IS NULL;
+CREATE INDEX IF NOT EXISTS individuals_genome_idx ON individuals (genome_id);
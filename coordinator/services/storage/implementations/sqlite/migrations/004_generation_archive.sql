@@ -0,0 +1,12 @@
+-- Generations moved to the archive segments, along with their summary
+CREATE TABLE IF NOT EXISTS archived_generations (
+    generation_id INTEGER PRIMARY KEY,
+    segment TEXT NOT NULL,
+    individuals_count INTEGER NOT NULL,
+    evaluated_count INTEGER NOT NULL,
+    fitness_min FLOAT,
+    fitness_max FLOAT,
+    fitness_mean FLOAT,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (generation_id) REFERENCES generations(id) ON DELETE CASCADE
+);
@@ -0,0 +1,15 @@
+-- Fitness statistics of every generation, updated as the fitness scores are stored
+CREATE TABLE IF NOT EXISTS generation_stats (
+    generation_id INTEGER PRIMARY KEY,
+    count INTEGER,
+    sum FLOAT NOT NULL DEFAULT 0,
+    sum_squares FLOAT NOT NULL DEFAULT 0,
+    min FLOAT,
+    max FLOAT,
+    sketch BLOB,
+    FOREIGN KEY (generation_id) REFERENCES generations(id) ON DELETE CASCADE
+);
+
+-- The statistics of the existing generations are rebuilt from their population (count is
+-- NULL) the first time they are read
+INSERT OR IGNORE INTO generation_stats (generation_id) SELECT id FROM generations;
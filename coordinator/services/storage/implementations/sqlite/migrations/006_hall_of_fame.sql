@@ -0,0 +1,21 @@
+-- Used by the top-k queries, the best individuals are found scanning it backwards
+CREATE INDEX IF NOT EXISTS individuals_fitness_idx ON individuals (fitness) WHERE fitness IS NOT NULL;
+
+-- The best individuals of every experiment, trimmed to the configured size as results arrive
+CREATE TABLE IF NOT EXISTS hall_of_fame (
+    individual_id INTEGER PRIMARY KEY,
+    experiment_id INTEGER NOT NULL,
+    fitness FLOAT NOT NULL,
+    FOREIGN KEY (individual_id) REFERENCES individuals(id) ON DELETE CASCADE,
+    FOREIGN KEY (experiment_id) REFERENCES experiments(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS hall_of_fame_experiment_idx ON hall_of_fame (experiment_id, fitness);
+
+-- Backfill with the best 100 individuals (the default size) of every experiment
+INSERT OR IGNORE INTO hall_of_fame (individual_id, experiment_id, fitness)
+SELECT id, experiment_id, fitness FROM (
+    SELECT i.id, g.experiment_id, i.fitness,
+        ROW_NUMBER() OVER (PARTITION BY g.experiment_id ORDER BY i.fitness DESC) AS position
+    FROM individuals AS i JOIN generations AS g ON g.id = i.generation_id
+    WHERE i.fitness IS NOT NULL
+) WHERE position <= 100;
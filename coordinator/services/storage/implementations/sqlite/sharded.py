@@ -0,0 +1,307 @@
+import dataclasses
+import heapq
+import os
+import sqlite3
+from collections import defaultdict
+from threading import RLock
+from typing import TypeVar, Tuple, List, Dict, Iterator, NamedTuple
+
+from coordinator.services.storage.implementations.sqlite.sqlite import SqliteStorage
+from coordinator.services.storage.interfaces.istorage import IStorage
+from shared.annotations.custom import UUID, FitnessScore
+from shared.models.entities.individual import IndividualEntity
+from shared.models.value_objects.generation_stats import GenerationStats
+from shared.models.value_objects.individual import IndividualValue, IndividualFitnessValue
+from shared.models.value_objects.population import PopulationBatch
+
+T = TypeVar('T')
+
+# Generation and individual ids are composed as: shard id << _SHARD_SHIFT | id inside the shard
+_SHARD_SHIFT = 40
+_LOCAL_ID_MASK = (1 << _SHARD_SHIFT) - 1
+
+
+class _Shard(NamedTuple):
+    id: int
+    local_experiment_id: int
+    first_generation_seq: int
+    path: str
+
+
+class ShardedSqliteStorage(IStorage[T]):
+    """
+    Stores every experiment in its own SQLite files (shards), so experiments never share a
+    writer. Optionally, an experiment is split in many shards by ranges of generations.
+    A catalogue database maps the experiments to their shards.
+    The ids of generations and individuals embed the shard where they are stored.
+    """
+    __CATALOGUE_SCRIPT = 'catalogue.sql'
+
+    def __init__(self, directory: str = 'shards',
+                 generations_per_shard: int | None = None,
+                 **shard_kwargs):
+        """
+        :param directory: where the catalogue and the shard files are stored
+        :param generations_per_shard: if provided, a new shard is created for every range of
+        this many generations of an experiment
+        :param shard_kwargs: parameters passed to the SqliteStorage of every shard (e.g. wal,
+        codec, retention). The archive directory of a retention policy is kept per shard
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._generations_per_shard = generations_per_shard
+        self._shard_kwargs = shard_kwargs
+        self._lock = RLock()
+        self._storages: Dict[int, SqliteStorage[T]] = {}
+        self._experiment_shards: Dict[UUID, List[_Shard]] = {}
+        self.con = sqlite3.connect(os.path.join(directory, 'catalogue.db'), check_same_thread=False)
+        self.con.execute('PRAGMA foreign_keys=ON')
+        self.__catalogue_init()
+
+    def create_experiment(self, name: str) -> Tuple[UUID, bool]:
+        with self._lock:
+            experiment_id = self.get_experiment_id(name)
+            if experiment_id is not None:
+                return experiment_id, True
+            # Committed along with its first shard, so no experiment is left without shards
+            cur = self.con.execute('INSERT INTO experiments (name) VALUES (?)', (name,))
+            experiment_id = cur.lastrowid
+            try:
+                self.__create_shard(experiment_id, name, first_generation_seq=1)
+            except BaseException:
+                self._experiment_shards.pop(experiment_id, None)
+                raise
+            return experiment_id, False
+
+    def experiment_exist(self, experiment_id: UUID) -> bool:
+        with self._lock:
+            res = self.con.execute('SELECT id FROM experiments WHERE id = ?', (experiment_id,))
+            return res.fetchone() is not None
+
+    def create_generation(self, experiment_id: UUID) -> UUID:
+        with self._lock:
+            shard = self.__latest_shard(experiment_id)
+            storage = self.__storage(shard)
+            local_count = storage.count_generations(shard.local_experiment_id)
+            if self._generations_per_shard and local_count >= self._generations_per_shard:
+                name = self.con.execute('SELECT name FROM experiments WHERE id = ?',
+                                        (experiment_id,)).fetchone()[0]
+                shard = self.__create_shard(experiment_id, name,
+                                            shard.first_generation_seq + local_count)
+                storage = self.__storage(shard)
+            return self.__global_id(shard.id, storage.create_generation(shard.local_experiment_id))
+
+    def store_population(self, generation_id: UUID, individuals: List[IndividualValue[T]]):
+        storage, local_id = self.__route(generation_id)
+        storage.store_population(local_id, individuals)
+
+    def store_individual_fitness(self, individual_id: UUID, fitness: FitnessScore):
+        storage, local_id = self.__route(individual_id)
+        storage.store_individual_fitness(local_id, fitness)
+
+    def store_fitness_batch(self, fitness_values: List[IndividualFitnessValue]):
+        batches: Dict[int, List[IndividualFitnessValue]] = defaultdict(list)
+        for fv in fitness_values:
+            batches[fv.id >> _SHARD_SHIFT].append(
+                IndividualFitnessValue(id=fv.id & _LOCAL_ID_MASK, fitness=fv.fitness))
+        for shard_id, batch in batches.items():
+            self.__storage_by_id(shard_id).store_fitness_batch(batch)
+
+    def flush(self):
+        for storage in list(self._storages.values()):
+            storage.flush()
+
+    def apply_retention(self, experiment_id: UUID):
+        # The hot generations are the latest ones of the experiment, they may span many shards
+        generations_count = self.count_generations(experiment_id)
+        for shard in self.__shards(experiment_id):
+            self.__storage(shard).apply_retention(
+                shard.local_experiment_id,
+                last_generation_seq=generations_count - (shard.first_generation_seq - 1))
+
+    def get_experiment_id(self, experiment_name: str) -> UUID | None:
+        with self._lock:
+            res = self.con.execute('SELECT id FROM experiments WHERE name = ?',
+                                   (experiment_name,)).fetchone()
+        return None if not res else res[0]
+
+    def get_latest_generation_id(self, experiment_id: UUID) -> UUID | None:
+        for shard in reversed(self.__shards(experiment_id)):
+            local_id = self.__storage(shard).get_latest_generation_id(shard.local_experiment_id)
+            if local_id is not None:
+                return self.__global_id(shard.id, local_id)
+        return None
+
+    def get_individual(self, individual_id: UUID) -> IndividualEntity[T] | None:
+        storage, local_id = self.__route(individual_id)
+        individual = storage.get_individual(local_id)
+        if individual is not None:
+            individual.id = individual_id
+        return individual
+
+    def get_population(self, generation_id: UUID) -> List[IndividualEntity[T]]:
+        storage, local_id = self.__route(generation_id)
+        return self.__globalize(generation_id, storage.get_population(local_id))
+
+    def get_population_batch(self, generation_id: UUID) -> PopulationBatch:
+        return PopulationBatch.from_entities(self.get_population(generation_id))
+
+    def get_non_evaluated_individuals(self, generation_id: UUID) -> List[IndividualEntity[T]]:
+        storage, local_id = self.__route(generation_id)
+        return self.__globalize(generation_id, storage.get_non_evaluated_individuals(local_id))
+
+    def get_non_evaluated_ids(self, generation_id: UUID) -> List[UUID]:
+        storage, local_id = self.__route(generation_id)
+        shard_bits = generation_id & ~_LOCAL_ID_MASK
+        return [shard_bits | _id for _id in storage.get_non_evaluated_ids(local_id)]
+
+    def iter_population(self, generation_id: UUID,
+                        chunk_size: int = 1000) -> Iterator[IndividualEntity[T]]:
+        storage, local_id = self.__route(generation_id)
+        return self.__iter_globalized(generation_id, storage.iter_population(local_id, chunk_size))
+
+    def iter_untested(self, generation_id: UUID,
+                      chunk_size: int = 1000) -> Iterator[IndividualEntity[T]]:
+        storage, local_id = self.__route(generation_id)
+        return self.__iter_globalized(generation_id, storage.iter_untested(local_id, chunk_size))
+
+    def has_population(self, generation_id: UUID) -> bool:
+        storage, local_id = self.__route(generation_id)
+        return storage.has_population(local_id)
+
+    def count_non_evaluated_individuals(self, generation_id: UUID) -> int:
+        storage, local_id = self.__route(generation_id)
+        return storage.count_non_evaluated_individuals(local_id)
+
+    def count_generations(self, experiment_id: UUID) -> int:
+        shards = self.__shards(experiment_id)
+        if not shards:
+            return 0
+        latest = shards[-1]
+        local_count = self.__storage(latest).count_generations(latest.local_experiment_id)
+        return latest.first_generation_seq - 1 + local_count
+
+    def get_generation_stats(self, experiment_id: UUID,
+                             generations: range | None = None) -> List[GenerationStats]:
+        generation_stats = []
+        for shard in self.__shards(experiment_id):
+            offset = shard.first_generation_seq - 1  # generation numbers inside the shard
+            local_range = None if generations is None \
+                else range(generations.start - offset, generations.stop - offset,
+                           generations.step)
+            storage = self.__storage(shard)
+            for stats in storage.get_generation_stats(shard.local_experiment_id, local_range):
+                generation_stats.append(stats._replace(
+                    generation_id=self.__global_id(shard.id, stats.generation_id),
+                    generation_number=stats.generation_number + offset))
+        return generation_stats
+
+    def get_top_k(self, experiment_id: UUID, k: int,
+                  generations: range | None = None) -> List[IndividualEntity[T]]:
+        candidates = []
+        for shard in self.__shards(experiment_id):
+            offset = shard.first_generation_seq - 1
+            local_range = None if generations is None \
+                else range(generations.start - offset, generations.stop - offset,
+                           generations.step)
+            storage = self.__storage(shard)
+            shard_bits = self.__global_id(shard.id, 0)
+            for individual in storage.get_top_k(shard.local_experiment_id, k, local_range):
+                individual.id |= shard_bits
+                candidates.append(individual)
+        return heapq.nlargest(k, candidates, key=lambda individual: individual.fitness)
+
+    @staticmethod
+    def __global_id(shard_id: int, local_id: int) -> int:
+        return shard_id << _SHARD_SHIFT | local_id
+
+    def __route(self, global_id: UUID) -> Tuple[SqliteStorage[T], int]:
+        return self.__storage_by_id(global_id >> _SHARD_SHIFT), global_id & _LOCAL_ID_MASK
+
+    @staticmethod
+    def __globalize(global_generation_id: int,
+                    individuals: List[IndividualEntity[T]]) -> List[IndividualEntity[T]]:
+        shard_bits = global_generation_id & ~_LOCAL_ID_MASK
+        for individual in individuals:
+            individual.id |= shard_bits
+        return individuals
+
+    @staticmethod
+    def __iter_globalized(global_generation_id: int,
+                          individuals: Iterator[IndividualEntity[T]]) -> Iterator[IndividualEntity[T]]:
+        shard_bits = global_generation_id & ~_LOCAL_ID_MASK
+        for individual in individuals:
+            individual.id |= shard_bits
+            yield individual
+
+    def __shards(self, experiment_id: UUID) -> List[_Shard]:
+        with self._lock:
+            if experiment_id not in self._experiment_shards:
+                res = self.con.execute('''
+                SELECT id, local_experiment_id, first_generation_seq, path
+                FROM shards WHERE experiment_id = ?
+                ORDER BY first_generation_seq
+                ''', (experiment_id,))
+                self._experiment_shards[experiment_id] = [_Shard(*row) for row in res.fetchall()]
+            return self._experiment_shards[experiment_id]
+
+    def __latest_shard(self, experiment_id: UUID) -> _Shard:
+        shards = self.__shards(experiment_id)
+        if not shards:
+            raise KeyError(f'Experiment {experiment_id} does not exist')
+        return shards[-1]
+
+    def __create_shard(self, experiment_id: UUID, experiment_name: str,
+                       first_generation_seq: int) -> _Shard:
+        with self._lock:
+            shards = self.__shards(experiment_id)  # loaded before the new shard is inserted
+            try:
+                cur = self.con.execute('''
+                INSERT INTO shards (experiment_id, local_experiment_id, first_generation_seq, path)
+                VALUES (?, 0, ?, '')
+                ''', (experiment_id, first_generation_seq))
+                shard_id = cur.lastrowid
+                path = os.path.join(f'ex-{experiment_id}', f'shard-{shard_id}.db')
+                os.makedirs(os.path.join(self._directory, f'ex-{experiment_id}'), exist_ok=True)
+                storage = self.__open_storage(shard_id, path)
+                local_experiment_id, _ = storage.create_experiment(experiment_name)
+                self.con.execute('UPDATE shards SET local_experiment_id = ?, path = ? WHERE id = ?',
+                                 (local_experiment_id, path, shard_id))
+                self.con.commit()
+            except BaseException:
+                self.con.rollback()  # along with the experiment, if it is being created
+                raise
+            shard = _Shard(shard_id, local_experiment_id, first_generation_seq, path)
+            shards.append(shard)
+            return shard
+
+    def __storage(self, shard: _Shard) -> SqliteStorage[T]:
+        with self._lock:
+            if shard.id not in self._storages:
+                self.__open_storage(shard.id, shard.path)
+            return self._storages[shard.id]
+
+    def __storage_by_id(self, shard_id: int) -> SqliteStorage[T]:
+        with self._lock:
+            if shard_id not in self._storages:
+                res = self.con.execute('SELECT path FROM shards WHERE id = ?', (shard_id,))
+                row = res.fetchone()
+                if row is None:
+                    raise KeyError(f'Shard {shard_id} does not exist')
+                self.__open_storage(shard_id, row[0])
+            return self._storages[shard_id]
+
+    def __open_storage(self, shard_id: int, path: str) -> SqliteStorage[T]:
+        kwargs = dict(self._shard_kwargs)
+        retention = kwargs.get('retention')
+        if retention is not None:  # the local experiment ids are repeated across shards
+            kwargs['retention'] = dataclasses.replace(
+                retention, archive_dir=os.path.join(retention.archive_dir, f'shard-{shard_id}'))
+        storage = SqliteStorage[T](os.path.join(self._directory, path), **kwargs)
+        self._storages[shard_id] = storage
+        return storage
+
+    def __catalogue_init(self):
+        script_path = os.path.join(os.path.dirname(__file__), self.__CATALOGUE_SCRIPT)
+        with open(script_path, 'r') as f:
+            self.con.executescript(f'BEGIN; {f.read()} COMMIT;')
@@ -1,131 +1,616 @@
-import json
+import hashlib
 import os
 import sqlite3
-from typing import Tuple, List, TypeVar
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from queue import Queue
+from threading import Lock, RLock, Timer
+from typing import Tuple, List, TypeVar, Iterator, Dict, Iterable
 
+from coordinator.services.storage.archive.segments import ArchiveSegments
 from coordinator.services.storage.interfaces.istorage import IStorage
+from coordinator.services.storage.retention import RetentionPolicy
 from shared.annotations.custom import UUID, FitnessScore
 from shared.models.entities.individual import IndividualEntity
-from shared.models.value_objects.individual import IndividualValue
-from shared.utils.thread_safe import global_thread_safe
+from shared.models.value_objects.generation_stats import GenerationStats
+from shared.models.value_objects.individual import IndividualValue, IndividualFitnessValue
+from shared.models.value_objects.population import PopulationBatch
+from shared.services.serialization.interfaces.igenome_codec import IGenomeCodec
+from shared.services.serialization.registry import GenomeCodecRegistry
+from shared.utils.quantile_sketch import QuantileSketch
+from shared.utils.running_stats import RunningStats
 
 T = TypeVar('T')
 
 
 class SqliteStorage(IStorage[T]):
     __SETUP_SCRIPT = 'setup.sql'
+    __MIGRATIONS_DIR = 'migrations'
+    __MEMORY_DATABASE = ':memory:'
 
-    def __init__(self, database: str = 'database.db'):
+    def __init__(self, database: str = 'database.db',
+                 fitness_batch_size: int = 256,
+                 fitness_flush_interval_ms: int = 500,
+                 wal: bool = False,
+                 readers_count: int = 4,
+                 codec: str | IGenomeCodec = 'json',
+                 codec_registry: GenomeCodecRegistry | None = None,
+                 retention: RetentionPolicy | None = None,
+                 hall_of_fame_size: int = 100):
+        """
+        :param database: path to the database file
+        :param fitness_batch_size: fitness scores are buffered and written in a single
+        transaction once this many results are pending
+        :param fitness_flush_interval_ms: max time a fitness score can stay in the buffer
+        before being written. The reads don't flush the buffer, so they may lag the stored
+        fitness scores by at most one batch, call flush before reading to see every score
+        :param wal: enables the write-ahead log journal, then the writes go through a single
+        writer connection while the reads are served by a pool of read-only connections, so
+        reads and writes do not block each other. The readers see the committed data, the
+        buffered fitness scores are visible once flushed. Ignored for in-memory databases
+        :param readers_count: the number of read-only connections when the WAL mode is enabled
+        :param codec: the codec (or its id) used to store new encodings. Stored encodings are
+        always decoded with the codec they were stored with
+        :param codec_registry: the codecs available to decode the stored encodings, the default
+        registry is used if not provided
+        :param retention: if provided, apply_retention moves the old generations to archive
+        segments, keeping only their summary and elites in the database
+        :param hall_of_fame_size: number of best individuals of every experiment tracked as the
+        results arrive, they are never archived and serve the top-k queries without a range
+        """
+        self._database = database
+        self._codecs = codec_registry or GenomeCodecRegistry.default()
+        self._codec = self._codecs.resolve(codec)
+        self._retention = retention
+        self._hall_of_fame_size = max(0, hall_of_fame_size)
+        self._archive = None if retention is None \
+            else ArchiveSegments(retention.archive_dir, retention.generations_per_segment)
+        self._write_lock = RLock()
+        self._readers: Queue[sqlite3.Connection] | None = None
         self.con = sqlite3.connect(database, check_same_thread=False)
         self.cur = self.con.cursor()
         self.con.execute('PRAGMA foreign_keys=ON')
+        self.con.create_function('genome_hash', 2, self.__genome_hash, deterministic=True)
+        self.con.create_function('reencode', 2, self.__reencode, deterministic=True)
+        is_wal = wal and database != self.__MEMORY_DATABASE
+        if is_wal:
+            self.con.execute('PRAGMA journal_mode=WAL')
+            self.con.execute('PRAGMA synchronous=NORMAL')  # durable at checkpoints on WAL
+        self._fitness_batch_size = max(1, fitness_batch_size)
+        self._fitness_flush_interval_secs = fitness_flush_interval_ms / 1000
+        self._fitness_buffer: List[IndividualFitnessValue] = []
+        self._fitness_buffer_lock = Lock()
+        self._flush_timer: Timer | None = None
         self.__database_init()
+        if is_wal:
+            self.__open_readers(max(1, readers_count))
+
+    @property
+    def is_wal(self) -> bool:
+        return self._readers is not None
 
-    @global_thread_safe
     def create_experiment(self, name: str) -> Tuple[UUID, bool]:
-        try:
-            self.cur.execute('INSERT INTO experiments (name) VALUES (?)', (name,))
-            self.con.commit()
-            return self.cur.lastrowid, False
-        except sqlite3.IntegrityError:
-            return self.get_experiment_id(name), True
+        with self.__writer() as cur:
+            try:
+                cur.execute('INSERT INTO experiments (name) VALUES (?)', (name,))
+                self.con.commit()
+                return cur.lastrowid, False
+            except sqlite3.IntegrityError:
+                self.con.rollback()
+        return self.get_experiment_id(name), True
 
-    @global_thread_safe
     def create_generation(self, experiment_id: UUID) -> UUID:
-        self.cur.execute('INSERT INTO generations (experiment_id) VALUES (?)',
-                         (experiment_id,))
-        self.con.commit()
-        return self.cur.lastrowid
+        with self.__writer() as cur:
+            cur.execute('INSERT INTO generations (experiment_id) VALUES (?)',
+                        (experiment_id,))
+            self.con.commit()
+            return cur.lastrowid
 
-    @global_thread_safe
     def experiment_exist(self, experiment_id: UUID) -> bool:
-        res = self.cur.execute('SELECT id FROM experiments WHERE id = ?',
-                               (experiment_id,))
-        return res.fetchone() is not None
+        with self.__reader() as cur:
+            res = cur.execute('SELECT id FROM experiments WHERE id = ?',
+                              (experiment_id,))
+            return res.fetchone() is not None
 
-    @global_thread_safe
     def store_population(self, generation_id: UUID, individuals: List[IndividualValue[T]]):
-        values = [(generation_id, json.dumps(ind.encoding), ind.fitness) for ind in individuals]
-        self.cur.executemany('''
-        INSERT INTO individuals (generation_id, encoding, fitness) 
-        VALUES (?, ?, ?)''', values)
-        self.con.commit()
+        codec = self._codec
+        genomes = {}  # hash -> encoded genome, repeated encodings are encoded only once
+        values = []
+        stats = RunningStats()  # individuals stored with a fitness (e.g. elites)
+        for ind in individuals:
+            if ind.fitness is not None:
+                stats.add(ind.fitness)
+            raw_encoding = codec.encode(ind.encoding)
+            genome_hash = self.__genome_hash(codec.codec_id, raw_encoding)
+            genomes[genome_hash] = raw_encoding
+            values.append((generation_id, genome_hash, ind.fitness))
+        with self.__writer() as cur:
+            # Only the encodings not seen before are written
+            cur.executemany('''
+            INSERT OR IGNORE INTO genomes (hash, codec, encoding)
+            VALUES (?, ?, ?)''', [(h, codec.codec_id, raw) for h, raw in genomes.items()])
+            cur.executemany('''
+            INSERT INTO individuals (generation_id, genome_id, fitness)
+            VALUES (?, (SELECT id FROM genomes WHERE hash = ?), ?)''', values)
+            if stats.count:
+                self.__merge_generation_stats(cur, {generation_id: stats})
+                res = cur.execute('''
+                SELECT i.id, i.fitness, g.experiment_id
+                FROM individuals AS i JOIN generations AS g ON g.id = i.generation_id
+                WHERE i.generation_id = ? AND i.fitness IS NOT NULL
+                ''', (generation_id,)).fetchall()
+                self.__update_hall_of_fame(cur, res[0][2], [row[:2] for row in res])
+            self.con.commit()
 
-    @global_thread_safe
     def store_individual_fitness(self, individual_id: UUID, fitness: FitnessScore):
-        self.cur.execute('UPDATE individuals SET fitness = ? WHERE id = ?',
-                         (fitness, individual_id))
-        self.con.commit()
+        with self._fitness_buffer_lock:
+            self._fitness_buffer.append(IndividualFitnessValue(id=individual_id, fitness=fitness))
+            is_full = len(self._fitness_buffer) >= self._fitness_batch_size
+            if not is_full and self._flush_timer is None:
+                self._flush_timer = Timer(self._fitness_flush_interval_secs, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        if is_full:
+            self.flush()
+
+    def store_fitness_batch(self, fitness_values: List[IndividualFitnessValue]):
+        scores = {}  # only the first score of an individual is stored
+        for fv in fitness_values:
+            scores.setdefault(fv.id, fv.fitness)
+        with self.__writer() as cur:
+            stats: Dict[UUID, RunningStats] = defaultdict(RunningStats)
+            candidates: Dict[UUID, List[Tuple[UUID, FitnessScore]]] = defaultdict(list)
+            for individual_id, generation_id, experiment_id in self.__select_untested(
+                    cur, list(scores)):
+                stats[generation_id].add(scores[individual_id])
+                candidates[experiment_id].append((individual_id, scores[individual_id]))
+            cur.executemany('UPDATE individuals SET fitness = ? WHERE id = ? AND fitness IS NULL',
+                            [(fitness, _id) for _id, fitness in scores.items()])
+            self.__merge_generation_stats(cur, stats)
+            for experiment_id, experiment_candidates in candidates.items():
+                self.__update_hall_of_fame(cur, experiment_id, experiment_candidates)
+            self.con.commit()
+
+    def flush(self):
+        if not self._fitness_buffer:  # nothing buffered, avoid contending with the writer
+            return
+        # The lock is held while writing so that readers never see a partially flushed buffer
+        with self._fitness_buffer_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._fitness_buffer:
+                return
+            pending, self._fitness_buffer = self._fitness_buffer, []
+            try:
+                self.store_fitness_batch(pending)
+            except Exception:
+                self._fitness_buffer = pending  # kept for the next flush
+                raise
 
-    @global_thread_safe
     def get_experiment_id(self, experiment_name: str) -> UUID | None:
-        q = self.cur.execute('SELECT id FROM experiments WHERE name = ?',
-                             (experiment_name,))
-        res = q.fetchone()
+        with self.__reader() as cur:
+            q = cur.execute('SELECT id FROM experiments WHERE name = ?',
+                            (experiment_name,))
+            res = q.fetchone()
         return None if not res else res[0]
 
-    @global_thread_safe
     def get_latest_generation_id(self, experiment_id: UUID) -> UUID | None:
-        q = self.cur.execute('''
-        SELECT id FROM generations
-        WHERE experiment_id = ?
-        ORDER BY created_at DESC
-        LIMIT 1
-        ''', (experiment_id,))
-        res = q.fetchone()
+        with self.__reader() as cur:
+            q = cur.execute('''
+            SELECT id FROM generations
+            WHERE experiment_id = ?
+            ORDER BY seq DESC
+            LIMIT 1
+            ''', (experiment_id,))
+            res = q.fetchone()
         return None if not res else res[0]
 
-    @global_thread_safe
     def get_individual(self, individual_id: UUID) -> IndividualEntity[T] | None:
-        q = self.cur.execute('''
-        SELECT id, encoding, fitness FROM individuals WHERE id = ?
-        ''', (individual_id,))
-        res = q.fetchone()
+        with self.__reader() as cur:
+            q = cur.execute('''
+            SELECT i.id, g.id, g.codec, g.encoding, i.fitness
+            FROM individuals AS i JOIN genomes AS g ON g.id = i.genome_id
+            WHERE i.id = ?
+            ''', (individual_id,))
+            res = q.fetchone()
         if not res:
             return None
-        _id, raw_encoding, fitness = res
-        encoding = json.loads(raw_encoding)
-        return IndividualEntity[T](id=_id, encoding=encoding, fitness=fitness)
+        return self.__parse_to_entities([res])[0]
 
-    @global_thread_safe
     def get_population(self, generation_id: UUID) -> List[IndividualEntity[T]]:
-        res = self.cur.execute('''
-        SELECT id, encoding, fitness FROM individuals WHERE generation_id = ?
-        ''', (generation_id,))
-        return self.__parse_to_entities(res.fetchall())
+        archived = self.__read_archived_population(generation_id)
+        if archived is not None:
+            return archived
+        with self.__reader() as cur:
+            res = cur.execute('''
+            SELECT i.id, g.id, g.codec, g.encoding, i.fitness
+            FROM individuals AS i JOIN genomes AS g ON g.id = i.genome_id
+            WHERE i.generation_id = ?
+            ''', (generation_id,))
+            records = res.fetchall()
+        return self.__parse_to_entities(records)
+
+    def get_population_batch(self, generation_id: UUID) -> PopulationBatch:
+        return PopulationBatch.from_entities(self.get_population(generation_id))
 
-    @global_thread_safe
     def get_non_evaluated_individuals(self, generation_id: UUID) -> List[IndividualEntity[T]]:
-        res = self.cur.execute('''
-        SELECT id, encoding, fitness 
-        FROM individuals 
-        WHERE generation_id = ? AND fitness IS NULL
-        ''', (generation_id,))
-        return self.__parse_to_entities(res.fetchall())
-
-    @global_thread_safe
+        with self.__reader() as cur:
+            res = cur.execute('''
+            SELECT i.id, g.id, g.codec, g.encoding, i.fitness
+            FROM individuals AS i JOIN genomes AS g ON g.id = i.genome_id
+            WHERE i.generation_id = ? AND i.fitness IS NULL
+            ''', (generation_id,))
+            records = res.fetchall()
+        return self.__parse_to_entities(records)
+
+    def get_non_evaluated_ids(self, generation_id: UUID) -> List[UUID]:
+        with self.__reader() as cur:
+            res = cur.execute('''
+            SELECT id FROM individuals WHERE generation_id = ? AND fitness IS NULL
+            ''', (generation_id,))
+            return [row[0] for row in res.fetchall()]
+
+    def iter_population(self, generation_id: UUID,
+                        chunk_size: int = 1000) -> Iterator[IndividualEntity[T]]:
+        archived = self.__read_archived_population(generation_id)
+        if archived is not None:
+            return iter(archived)
+        return self.__iter_individuals(generation_id, chunk_size, untested_only=False)
+
+    def iter_untested(self, generation_id: UUID,
+                      chunk_size: int = 1000) -> Iterator[IndividualEntity[T]]:
+        return self.__iter_individuals(generation_id, chunk_size, untested_only=True)
+
+    def has_population(self, generation_id: UUID) -> bool:
+        with self.__reader() as cur:
+            q = cur.execute('''
+            SELECT EXISTS (SELECT 1 FROM individuals WHERE generation_id = ?)
+                OR EXISTS (SELECT 1 FROM archived_generations
+                           WHERE generation_id = ? AND individuals_count > 0)
+            ''', (generation_id, generation_id))
+            return bool(q.fetchone()[0])
+
+    def count_non_evaluated_individuals(self, generation_id: UUID) -> int:
+        with self.__reader() as cur:
+            q = cur.execute('''
+            SELECT COUNT(*)
+            FROM individuals
+            WHERE generation_id = ? AND fitness IS NULL
+            ''', (generation_id,))
+            return q.fetchone()[0]
+
     def count_generations(self, experiment_id: UUID) -> int:
-        q = self.cur.execute('''
-        SELECT COUNT(*)
-        FROM generations
-        WHERE experiment_id = ?
-        ''', (experiment_id,))
-        res = q.fetchone()
+        with self.__reader() as cur:
+            q = cur.execute('SELECT generations_count FROM experiments WHERE id = ?',
+                            (experiment_id,))
+            res = q.fetchone()
         return 0 if not res else res[0]
 
-    @global_thread_safe
+    def get_generation_stats(self, experiment_id: UUID,
+                             generations: range | None = None) -> List[GenerationStats]:
+        if generations is not None and generations.step < 0:
+            raise ValueError('The range of generations must be increasing')
+        start, stop, step = (1, 1 << 62, 1) if generations is None \
+            else (generations.start, generations.stop, generations.step)
+        with self.__reader() as cur:
+            res = cur.execute('''
+            SELECT g.id, g.seq, s.generation_id IS NOT NULL,
+                s.count, s.sum, s.sum_squares, s.min, s.max, s.sketch
+            FROM generations AS g LEFT JOIN generation_stats AS s ON s.generation_id = g.id
+            WHERE g.experiment_id = ? AND g.seq >= ? AND g.seq < ?
+            ORDER BY g.seq
+            ''', (experiment_id, start, stop))
+            rows = res.fetchall()
+        generation_stats = []
+        for generation_id, seq, has_stats, *stats_row in rows:
+            if (seq - start) % step:
+                continue
+            if not has_stats:  # nothing evaluated yet
+                stats = RunningStats()
+            elif stats_row[0] is None:  # created before the statistics were tracked
+                stats = self.__rebuild_generation_stats(generation_id)
+            else:
+                stats = self.__to_running_stats(stats_row)
+            generation_stats.append(GenerationStats.from_running_stats(generation_id, seq, stats))
+        return generation_stats
+
+    def get_top_k(self, experiment_id: UUID, k: int,
+                  generations: range | None = None) -> List[IndividualEntity[T]]:
+        if k <= 0:
+            return []
+        if generations is None and k <= self._hall_of_fame_size:
+            with self.__reader() as cur:
+                records = cur.execute('''
+                SELECT i.id, g.id, g.codec, g.encoding, i.fitness
+                FROM hall_of_fame AS h
+                JOIN individuals AS i ON i.id = h.individual_id
+                JOIN genomes AS g ON g.id = i.genome_id
+                WHERE h.experiment_id = ?
+                ORDER BY h.fitness DESC
+                LIMIT ?
+                ''', (experiment_id, k)).fetchall()
+            if len(records) == k:
+                return self.__parse_to_entities(records)
+            # There may be fewer evaluated individuals, or the hall of fame was backfilled
+            # with fewer individuals than its current size
+        if generations is not None and generations.step < 0:
+            raise ValueError('The range of generations must be increasing')
+        start, stop, step = (1, 1 << 62, 1) if generations is None \
+            else (generations.start, generations.stop, generations.step)
+        with self.__reader() as cur:
+            records = cur.execute('''
+            SELECT i.id, gn.id, gn.codec, gn.encoding, i.fitness
+            FROM individuals AS i
+            JOIN generations AS ge ON ge.id = i.generation_id
+            JOIN genomes AS gn ON gn.id = i.genome_id
+            WHERE i.fitness IS NOT NULL AND ge.experiment_id = ?
+              AND ge.seq >= ? AND ge.seq < ? AND (ge.seq - ?) % ? = 0
+            ORDER BY i.fitness DESC
+            LIMIT ?
+            ''', (experiment_id, start, stop, start, step, k)).fetchall()
+        return self.__parse_to_entities(records)
+
+    def apply_retention(self, experiment_id: UUID, last_generation_seq: int | None = None):
+        """
+        :param last_generation_seq: the hot generations are counted back from it instead of the
+        last generation stored, e.g. when the experiment goes on in another storage
+        """
+        policy = self._retention
+        if policy is None:
+            return
+        self.flush()
+        with self.__reader() as cur:
+            res = cur.execute('''
+            SELECT g.id, g.seq
+            FROM generations AS g
+            LEFT JOIN archived_generations AS a ON a.generation_id = g.id
+            WHERE g.experiment_id = ? AND a.generation_id IS NULL
+              AND g.seq <= COALESCE(?, (SELECT last_generation_seq FROM experiments
+                                        WHERE id = ?)) - ?
+            ORDER BY g.seq
+            ''', (experiment_id, last_generation_seq, experiment_id,
+                  max(1, policy.hot_generations)))
+            generations = res.fetchall()
+        for generation_id, seq in generations:
+            self.__archive_generation(experiment_id, generation_id, seq)
+
+    def __archive_generation(self, experiment_id: UUID, generation_id: UUID, seq: int):
+        with self.__reader() as cur:
+            records = cur.execute('''
+            SELECT i.id, g.id, g.codec, g.encoding, i.fitness
+            FROM individuals AS i JOIN genomes AS g ON g.id = i.genome_id
+            WHERE i.generation_id = ?
+            ''', (generation_id,)).fetchall()
+        # The segment is written first, if the process stops before committing, the
+        # generation is archived again later and the reader finds the first copy
+        segment = self._archive.append(experiment_id, seq, generation_id, records)
+        fitness = [record[4] for record in records if record[4] is not None]
+        with self.__writer() as cur:
+            cur.execute('''
+            INSERT INTO archived_generations (generation_id, segment, individuals_count,
+                evaluated_count, fitness_min, fitness_max, fitness_mean)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (generation_id, segment, len(records), len(fitness),
+                  min(fitness, default=None), max(fitness, default=None),
+                  sum(fitness) / len(fitness) if fitness else None))
+            cur.execute('''
+            DELETE FROM individuals
+            WHERE generation_id = ? AND id NOT IN (
+                SELECT id FROM individuals
+                WHERE generation_id = ? AND fitness IS NOT NULL
+                ORDER BY fitness DESC
+                LIMIT ?
+            ) AND id NOT IN (SELECT individual_id FROM hall_of_fame WHERE experiment_id = ?)
+            ''', (generation_id, generation_id, self._retention.keep_elites, experiment_id))
+            # Remove the genomes that are not referenced anymore
+            cur.executemany('''
+            DELETE FROM genomes
+            WHERE id = ? AND NOT EXISTS (SELECT 1 FROM individuals WHERE genome_id = ?)
+            ''', [(genome_id, genome_id) for genome_id in {record[1] for record in records}])
+            self.con.commit()
+
+    def __read_archived_population(self, generation_id: UUID) -> List[IndividualEntity[T]] | None:
+        """
+        :return: the full population of an archived generation, None if it is not archived
+        """
+        with self.__reader() as cur:
+            res = cur.execute('SELECT segment FROM archived_generations WHERE generation_id = ?',
+                              (generation_id,)).fetchone()
+        if res is None:
+            return None
+        records = ArchiveSegments.read(res[0], generation_id)
+        if records is None:
+            raise FileNotFoundError(f'Generation {generation_id} is missing in the archive '
+                                    f'segment {res[0]}')
+        return self.__parse_to_entities(records)
+
+    @staticmethod
+    def __select_untested(cur: sqlite3.Cursor,
+                          individual_ids: List[UUID]) -> Iterator[Tuple[UUID, UUID, UUID]]:
+        """
+        :return: the id, generation id and experiment id of the given individuals that don't
+        have a fitness
+        """
+        for start in range(0, len(individual_ids), 500):
+            chunk = individual_ids[start:start + 500]
+            res = cur.execute(f'''
+            SELECT i.id, i.generation_id, g.experiment_id
+            FROM individuals AS i JOIN generations AS g ON g.id = i.generation_id
+            WHERE i.fitness IS NULL AND i.id IN ({','.join('?' * len(chunk))})
+            ''', chunk)
+            yield from res.fetchall()
+
+    def __merge_generation_stats(self, cur: sqlite3.Cursor, stats: Dict[UUID, RunningStats]):
+        for generation_id, new_stats in stats.items():
+            row = cur.execute('''
+            SELECT count, sum, sum_squares, min, max, sketch
+            FROM generation_stats WHERE generation_id = ?
+            ''', (generation_id,)).fetchone()
+            if row is not None:
+                if row[0] is None:  # rebuilt from the population when it is read
+                    continue
+                merged = self.__to_running_stats(row)
+                merged.merge(new_stats)
+                new_stats = merged
+            self.__write_generation_stats(cur, generation_id, new_stats)
+
+    def __update_hall_of_fame(self, cur: sqlite3.Cursor, experiment_id: UUID,
+                              candidates: List[Tuple[UUID, FitnessScore]]):
+        size = self._hall_of_fame_size
+        if size == 0:
+            return
+        count, threshold = cur.execute('''
+        SELECT COUNT(*), MIN(fitness) FROM hall_of_fame WHERE experiment_id = ?
+        ''', (experiment_id,)).fetchone()
+        if count >= size:  # only the candidates better than the worst one can get in
+            candidates = [c for c in candidates if c[1] > threshold]
+            if not candidates:
+                return
+        cur.executemany('''
+        INSERT OR REPLACE INTO hall_of_fame (individual_id, experiment_id, fitness)
+        VALUES (?, ?, ?)
+        ''', [(_id, experiment_id, fitness) for _id, fitness in candidates])
+        if count + len(candidates) > size:
+            cur.execute('''
+            DELETE FROM hall_of_fame
+            WHERE experiment_id = ? AND individual_id NOT IN (
+                SELECT individual_id FROM hall_of_fame
+                WHERE experiment_id = ?
+                ORDER BY fitness DESC
+                LIMIT ?
+            )''', (experiment_id, experiment_id, size))
+
+    def __rebuild_generation_stats(self, generation_id: UUID) -> RunningStats:
+        stats = RunningStats()
+        for ind in self.iter_population(generation_id):
+            if ind.fitness is not None:
+                stats.add(ind.fitness)
+        with self.__writer() as cur:
+            self.__write_generation_stats(cur, generation_id, stats)
+            self.con.commit()
+        return stats
+
+    @staticmethod
+    def __write_generation_stats(cur: sqlite3.Cursor, generation_id: UUID, stats: RunningStats):
+        cur.execute('''
+        INSERT OR REPLACE INTO generation_stats
+            (generation_id, count, sum, sum_squares, min, max, sketch)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (generation_id, stats.count, stats.sum, stats.sum_squares, stats.min, stats.max,
+              stats.sketch.to_bytes()))
+
+    @staticmethod
+    def __to_running_stats(row: Iterable) -> RunningStats:
+        count, total, sum_squares, minimum, maximum, sketch = row
+        return RunningStats(count=count, sum=total, sum_squares=sum_squares, min=minimum,
+                            max=maximum,
+                            sketch=QuantileSketch() if sketch is None
+                            else QuantileSketch.from_bytes(sketch))
+
+    def __iter_individuals(self, generation_id: UUID, chunk_size: int,
+                           untested_only: bool) -> Iterator[IndividualEntity[T]]:
+        """
+        Paginates by id (keyset pagination), so no connection or lock is held between chunks
+        """
+        condition = 'AND i.fitness IS NULL' if untested_only else ''
+        query = f'''
+        SELECT i.id, g.id, g.codec, g.encoding, i.fitness
+        FROM individuals AS i JOIN genomes AS g ON g.id = i.genome_id
+        WHERE i.generation_id = ? AND i.id > ? {condition}
+        ORDER BY i.id
+        LIMIT ?
+        '''
+        last_id = -1
+        while True:
+            with self.__reader() as cur:
+                records = cur.execute(query, (generation_id, last_id, chunk_size)).fetchall()
+            if not records:
+                return
+            yield from self.__parse_to_entities(records)
+            if len(records) < chunk_size:
+                return
+            last_id = records[-1][0]
+
+    @contextmanager
+    def __writer(self):
+        """
+        Provides the cursor of the only connection allowed to write
+        """
+        with self._write_lock:
+            yield self.cur
+
+    @contextmanager
+    def __reader(self):
+        """
+        Provides a cursor of a read-only connection taken from the pool. If there is no pool
+        (WAL disabled) the writer cursor is provided instead
+        """
+        if self._readers is None:
+            with self.__writer() as cur:
+                yield cur
+            return
+        con = self._readers.get()
+        try:
+            yield con.cursor()
+        finally:
+            self._readers.put(con)
+
+    def __open_readers(self, readers_count: int):
+        uri = f'{Path(self._database).resolve().as_uri()}?mode=ro'
+        self._readers = Queue()
+        for _ in range(readers_count):
+            con = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            con.execute('PRAGMA query_only=ON')
+            self._readers.put(con)
+
     def __database_init(self):
         setup_script_path = os.path.join(os.path.dirname(__file__), self.__SETUP_SCRIPT)
         with open(setup_script_path, 'r') as f:
             commands = f.readlines()
             cmd_string = f'BEGIN; {''.join(commands)} COMMIT;'
-            self.cur.executescript(cmd_string)
+        with self.__writer() as cur:
+            cur.executescript(cmd_string)
+            self.__apply_migrations(cur)
+
+    def __apply_migrations(self, cur: sqlite3.Cursor):
+        """
+        Applies, in order, the migration scripts whose number is greater than the schema
+        version of the database. Scripts are named as NNN_description.sql
+        """
+        migrations_dir = os.path.join(os.path.dirname(__file__), self.__MIGRATIONS_DIR)
+        version = cur.execute('PRAGMA user_version').fetchone()[0]
+        for file_name in sorted(os.listdir(migrations_dir)):
+            if not file_name.endswith('.sql'):
+                continue
+            number = int(file_name.split('_', 1)[0])
+            if number <= version:
+                continue
+            with open(os.path.join(migrations_dir, file_name), 'r') as f:
+                script = f.read()
+            cur.executescript(f'BEGIN; {script} PRAGMA user_version = {number}; COMMIT;')
+
+    def __parse_to_entities(self, records) -> List[IndividualEntity[T]]:
+        """
+        Every row is decoded on its own, so individuals sharing a genome only share the stored
+        bytes and their encodings can be mutated independently
+        """
+        get_codec = self._codecs.get
+        return [IndividualEntity(id=_id, encoding=get_codec(codec_id).decode(raw_encoding),
+                                 fitness=fitness)
+                for _id, _, codec_id, raw_encoding, fitness in records]
+
+    def __reencode(self, codec_id: str, raw_encoding: str | bytes) -> bytes:
+        """
+        Encodes again a stored encoding with its codec, so it has the same bytes (and hash) as
+        a new write of the same genome
+        """
+        codec = self._codecs.get(codec_id)
+        return codec.encode(codec.decode(raw_encoding))
 
     @staticmethod
-    def __parse_to_entities(records):
-        try:
-            return [IndividualEntity[T](id=_id, encoding=json.loads(encoding), fitness=fitness)
-                    for _id, encoding, fitness in records]
-        except:
-            return [IndividualEntity[T](id=_id, encoding=encoding, fitness=fitness)
-                    for _id, encoding, fitness in records]
+    def __genome_hash(codec_id: str, raw_encoding: str | bytes) -> bytes:
+        if isinstance(raw_encoding, str):  # encodings stored as text before the codecs
+            raw_encoding = raw_encoding.encode()
+        return hashlib.sha256(codec_id.encode() + b'\0' + raw_encoding).digest()
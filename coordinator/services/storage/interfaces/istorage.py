@@ -1,9 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import Tuple, List, Generic, TypeVar
+from typing import Tuple, List, Generic, TypeVar, Iterator
 
 from shared.annotations.custom import UUID, FitnessScore
 from shared.models.entities.individual import IndividualEntity
-from shared.models.value_objects.individual import IndividualValue
+from shared.models.value_objects.generation_stats import GenerationStats
+from shared.models.value_objects.individual import IndividualValue, IndividualFitnessValue
+from shared.models.value_objects.population import PopulationBatch
 
 T = TypeVar('T')
 
@@ -29,6 +31,30 @@ class IStorage(ABC, Generic[T]):
     def store_individual_fitness(self, individual_id: UUID, fitness: FitnessScore):
         raise NotImplementedError
 
+    @abstractmethod
+    def store_fitness_batch(self, fitness_values: List[IndividualFitnessValue]):
+        """
+        Stores the fitness scores of many individuals at once
+        :param fitness_values: pairs of individual id and fitness score
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def flush(self):
+        """
+        Persists any buffered write. Implementations that do not buffer writes can ignore it
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def apply_retention(self, experiment_id: UUID):
+        """
+        Moves the generations of the experiment that are out of the retention policy of the
+        storage to the archive. The archived generations can still be read through
+        get_population and iter_population. Storages without a retention policy ignore it
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def get_experiment_id(self, experiment_name: str) -> UUID | None:
         raise NotImplementedError
@@ -45,10 +71,82 @@ class IStorage(ABC, Generic[T]):
     def get_population(self, generation_id: UUID) -> List[IndividualEntity[T]]:
         raise NotImplementedError
 
+    @abstractmethod
+    def get_population_batch(self, generation_id: UUID) -> PopulationBatch:
+        """
+        Same as get_population but the population is returned as NumPy arrays
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def get_non_evaluated_individuals(self, generation_id: UUID) -> List[IndividualEntity[T]]:
         raise NotImplementedError
 
+    @abstractmethod
+    def get_non_evaluated_ids(self, generation_id: UUID) -> List[UUID]:
+        """
+        Same as get_non_evaluated_individuals but only the ids are returned, so no encoding
+        is loaded
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_population(self, generation_id: UUID,
+                        chunk_size: int = 1000) -> Iterator[IndividualEntity[T]]:
+        """
+        Lazily yields the population of a generation, at most chunk_size individuals are
+        loaded at a time
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_untested(self, generation_id: UUID,
+                      chunk_size: int = 1000) -> Iterator[IndividualEntity[T]]:
+        """
+        Lazily yields the individuals of a generation that don't have a fitness, at most
+        chunk_size individuals are loaded at a time
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def has_population(self, generation_id: UUID) -> bool:
+        """
+        Checks if at least one individual is stored for a generation without loading it
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_non_evaluated_individuals(self, generation_id: UUID) -> int:
+        raise NotImplementedError
+
     @abstractmethod
     def count_generations(self, experiment_id: UUID) -> int:
         raise NotImplementedError
+
+    @abstractmethod
+    def get_generation_stats(self, experiment_id: UUID,
+                             generations: range | None = None) -> List[GenerationStats]:
+        """
+        Provides the fitness statistics of the generations of an experiment. The statistics
+        are updated as the fitness scores are stored, so no population is loaded
+        :param experiment_id:
+        :param generations: the generation numbers (starting from 1) to include, all the
+        generations if not provided
+        :return: the statistics ordered by generation number
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_top_k(self, experiment_id: UUID, k: int,
+                  generations: range | None = None) -> List[IndividualEntity[T]]:
+        """
+        Provides the best evaluated individuals of an experiment without loading its
+        populations. Only the elites and the hall of fame of archived generations are kept,
+        so they are the only individuals of those generations that can be returned
+        :param experiment_id:
+        :param k: max number of individuals returned
+        :param generations: the generation numbers (starting from 1) to search, all the
+        generations if not provided
+        :return: the individuals ordered from the highest to the lowest fitness
+        """
+        raise NotImplementedError
@@ -0,0 +1,20 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    Defines which generations are kept in the storage (hot generations) and which ones are
+    moved to compressed archive segments
+    :param hot_generations: number of latest generations of every experiment that are never
+    archived
+    :param generations_per_segment: number of consecutive generations stored in the same
+    archive segment file
+    :param keep_elites: number of best individuals (highest fitness) of every archived
+    generation that are also kept in the storage
+    :param archive_dir: directory where the archive segment files are written
+    """
+    hot_generations: int = 10
+    generations_per_segment: int = 10
+    keep_elites: int = 0
+    archive_dir: str = 'archive'
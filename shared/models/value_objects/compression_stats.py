@@ -0,0 +1,40 @@
+from typing import NamedTuple
+
+
+class CompressionStats(NamedTuple):
+    """
+    What the compression of the message bodies saved so far
+    - sent_messages, compressed_messages: messages sent and how many of them were compressed
+    - original_bytes, sent_bytes: size of the bodies sent, before and after the compression
+    - received_bytes, decompressed_bytes: size of the compressed bodies received, before and
+    after the decompression
+    """
+    sent_messages: int = 0
+    compressed_messages: int = 0
+    original_bytes: int = 0
+    sent_bytes: int = 0
+    compression_seconds: float = 0.0
+    decompressed_messages: int = 0
+    received_bytes: int = 0
+    decompressed_bytes: int = 0
+    decompression_seconds: float = 0.0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.sent_bytes + self.decompressed_bytes - self.received_bytes
+
+    @property
+    def ratio(self) -> float | None:
+        """
+        :return: size of the bodies sent relative to their original size
+        """
+        return self.sent_bytes / self.original_bytes if self.original_bytes else None
+
+    def time_saved(self, bandwidth: float) -> float:
+        """
+        :param bandwidth: bytes per second of the link to the broker
+        :return: seconds saved transferring fewer bytes, minus the seconds spent compressing
+        and decompressing. Negative when the compression does not pay off
+        """
+        return (self.bytes_saved / bandwidth
+                - self.compression_seconds - self.decompression_seconds)
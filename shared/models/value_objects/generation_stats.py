@@ -0,0 +1,53 @@
+import math
+from typing import NamedTuple
+
+from shared.annotations.custom import UUID
+from shared.utils.quantile_sketch import QuantileSketch
+from shared.utils.running_stats import RunningStats
+
+
+class GenerationStats(NamedTuple):
+    """
+    Fitness statistics of the evaluated individuals of a generation
+    - generation_number: the position of the generation in the experiment, starting from 1
+    - sketch: used to estimate the quantiles, see the quantile method
+    """
+    generation_id: UUID
+    generation_number: int
+    count: int
+    sum: float
+    sum_squares: float
+    min: float | None
+    max: float | None
+    sketch: QuantileSketch
+
+    @classmethod
+    def from_running_stats(cls, generation_id: UUID, generation_number: int,
+                           stats: RunningStats) -> 'GenerationStats':
+        return cls(generation_id=generation_id, generation_number=generation_number,
+                   count=stats.count, sum=stats.sum, sum_squares=stats.sum_squares,
+                   min=stats.min, max=stats.max, sketch=stats.sketch)
+
+    @property
+    def mean(self) -> float | None:
+        return self.sum / self.count if self.count else None
+
+    @property
+    def variance(self) -> float | None:
+        if not self.count:
+            return None
+        mean = self.sum / self.count
+        return max(0.0, self.sum_squares / self.count - mean * mean)
+
+    @property
+    def std(self) -> float | None:
+        variance = self.variance
+        return None if variance is None else math.sqrt(variance)
+
+    def quantile(self, q: float) -> float | None:
+        """
+        :param q: between 0 and 1, e.g. 0.5 for the median
+        :return: the estimated fitness at the quantile, within the sketch's relative accuracy
+        """
+        value = self.sketch.quantile(q)
+        return None if value is None else min(max(value, self.min), self.max)
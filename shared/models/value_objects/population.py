@@ -0,0 +1,70 @@
+import math
+from typing import NamedTuple, List, Tuple, Any, Sequence
+
+from shared.models.entities.individual import IndividualEntity
+from shared.models.value_objects.individual import IndividualValue
+
+
+class PopulationBatch(NamedTuple):
+    """
+    A population as NumPy arrays, so the genetic operators can be applied as array operations.
+    NumPy is only required when a batch is created.
+    - ids: vector with the id of every individual
+    - fitness: float64 vector, NaN where an individual doesn't have a fitness
+    - encodings: 2-D matrix with one flattened genome per row, None if the genomes don't have
+    the same shape
+    - genome_shape: the shape of a single genome, used to restore the rows
+    """
+    ids: Any
+    fitness: Any
+    encodings: Any | None = None
+    genome_shape: Tuple[int, ...] | None = None
+
+    @classmethod
+    def from_entities(cls, individuals: Sequence[IndividualEntity]) -> 'PopulationBatch':
+        import numpy as np
+        ids = np.asarray([ind.id for ind in individuals])
+        fitness = np.fromiter((np.nan if ind.fitness is None else ind.fitness
+                               for ind in individuals),
+                              dtype=np.float64, count=len(individuals))
+        encodings, genome_shape = None, None
+        if len(individuals) > 0:
+            try:
+                matrix = np.asarray([ind.encoding for ind in individuals])
+            except ValueError:  # genomes with different shapes
+                matrix = None
+            if matrix is not None and matrix.dtype != object:
+                genome_shape = matrix.shape[1:]
+                encodings = matrix.reshape(len(individuals), -1)
+        return cls(ids=ids, fitness=fitness, encodings=encodings, genome_shape=genome_shape)
+
+    @classmethod
+    def from_encodings(cls, encodings, genome_shape: Tuple[int, ...] | None = None,
+                       fitness=None) -> 'PopulationBatch':
+        """
+        Creates a batch for a new population, the ids are assigned by the storage
+        :param encodings: 2-D matrix with one flattened genome per row
+        :param genome_shape: the shape of a single genome, by default the genomes are vectors
+        :param fitness: optional fitness vector, NaN where there is no fitness
+        """
+        import numpy as np
+        encodings = np.asarray(encodings)
+        if fitness is None:
+            fitness = np.full(len(encodings), np.nan)
+        return cls(ids=np.arange(len(encodings)), fitness=np.asarray(fitness, dtype=np.float64),
+                   encodings=encodings, genome_shape=genome_shape or encodings.shape[1:])
+
+    def to_individual_values(self, as_lists: bool = True) -> List[IndividualValue]:
+        """
+        :param as_lists: True to convert every genome to nested lists (e.g. for the json or
+        packed codecs), otherwise the genomes are kept as arrays
+        :return: the individuals of the batch
+        """
+        if self.encodings is None:
+            raise ValueError('The batch has no encodings matrix')
+        values = []
+        for row, fitness in zip(self.encodings, self.fitness.tolist()):
+            genome = row.reshape(self.genome_shape)
+            values.append(IndividualValue(encoding=genome.tolist() if as_lists else genome,
+                                          fitness=None if math.isnan(fitness) else fitness))
+        return values
@@ -0,0 +1,82 @@
+from typing import NamedTuple, Iterator
+
+# Headers of the manifest sent through the individuals queue in place of a large message
+_QUEUE_HEADER = 'x-dga-transfer-queue'
+_CHUNKS_HEADER = 'x-dga-transfer-chunks'
+_CHUNK_SIZE_HEADER = 'x-dga-transfer-chunk-size'
+_SIZE_HEADER = 'x-dga-transfer-size'
+# Header of every chunk, its position in the body
+CHUNK_HEADER = 'x-dga-chunk'
+
+
+class TransferManifest(NamedTuple):
+    """
+    Describes a body split in chunks. The chunks are published to a queue of their own, so
+    the consumer that receives the manifest gets every chunk even if other consumers share
+    the individuals queue
+    - queue: where the chunks are, it expires when nobody consumes it
+    - size: of the whole body in bytes
+    """
+    queue: str
+    chunks: int
+    chunk_size: int
+    size: int
+
+    @classmethod
+    def from_headers(cls, headers: dict | None) -> 'TransferManifest | None':
+        """
+        :return: the manifest, None if the headers don't describe a transfer
+        """
+        if not headers or _QUEUE_HEADER not in headers:
+            return None
+        try:
+            queue = headers[_QUEUE_HEADER]
+            manifest = cls(queue=queue.decode() if isinstance(queue, bytes) else queue,
+                           chunks=int(headers[_CHUNKS_HEADER]),
+                           chunk_size=int(headers[_CHUNK_SIZE_HEADER]),
+                           size=int(headers[_SIZE_HEADER]))
+        except (KeyError, TypeError, ValueError):
+            return None
+        return manifest
+
+    def to_headers(self) -> dict:
+        return {_QUEUE_HEADER: self.queue, _CHUNKS_HEADER: self.chunks,
+                _CHUNK_SIZE_HEADER: self.chunk_size, _SIZE_HEADER: self.size}
+
+
+def split_in_chunks(body: bytes, chunk_size: int) -> Iterator[bytes]:
+    for start in range(0, len(body), chunk_size):
+        yield body[start:start + chunk_size]
+
+
+class ChunkAssembler:
+    """
+    Writes the chunks of a transfer, in any order, into a buffer preallocated with the size
+    of the whole body
+    """
+
+    def __init__(self, manifest: TransferManifest):
+        self.manifest = manifest
+        self.buffer = bytearray(manifest.size)
+        self._received = bytearray(manifest.chunks)  # 1 for every chunk already written
+        self._missing = manifest.chunks
+
+    @property
+    def is_complete(self) -> bool:
+        return self._missing == 0
+
+    def add(self, index: int, chunk: bytes) -> bool:
+        """
+        :param index: position of the chunk in the body
+        :param chunk:
+        :return: False if the chunk does not match the manifest, duplicated chunks are ignored
+        """
+        start = index * self.manifest.chunk_size
+        end = min(start + self.manifest.chunk_size, self.manifest.size)
+        if not 0 <= index < self.manifest.chunks or len(chunk) != end - start:
+            return False
+        if not self._received[index]:
+            self.buffer[start:end] = chunk
+            self._received[index] = 1
+            self._missing -= 1
+        return True
@@ -0,0 +1,130 @@
+import math
+import struct
+from typing import TypeVar, Generic, Sequence, Tuple, List
+
+from shared.annotations.custom import UUID, FitnessScore
+from shared.services.messaging.codecs.interfaces.imessage_codec import IMessageCodec
+from shared.services.serialization.implementations.numpy_codec import NumpyGenomeCodec
+from shared.services.serialization.interfaces.igenome_codec import IGenomeCodec
+from shared.services.serialization.registry import GenomeCodecRegistry
+
+T = TypeVar('T')
+
+# magic, version, kind of message, number of records, length of the genome codec id
+_HEADER = struct.Struct('<3sBBIB')
+_MAGIC = b'DGA'
+_VERSION = 1
+_INDIVIDUALS, _RESULTS = 1, 2
+# Ids are either integers or text
+_INT_ID, _STR_ID = 0, 1
+_INT_ID_RECORD = struct.Struct('<Bq')
+_STR_ID_RECORD = struct.Struct('<BH')
+_LENGTH = struct.Struct('<I')
+_FITNESS = struct.Struct('<d')
+
+
+class BinaryMessageCodec(IMessageCodec[T], Generic[T]):
+    """
+    A versioned binary format, little-endian:
+    header (magic, version, kind, records count, genome codec id) | records
+    An individual record is its id followed by the length of the encoding and the encoding
+    packed with a genome codec (e.g. packed numeric arrays or raw NumPy buffers). A result
+    record is the id followed by the fitness as float64.
+    The encodings are decoded from memoryviews over the message body, so the NumPy arrays are
+    read-only views over the body and nothing is copied
+    """
+
+    def __init__(self, genome_codec: str | IGenomeCodec = 'json',
+                 codec_registry: GenomeCodecRegistry | None = None):
+        """
+        :param genome_codec: the codec (or its id) used to pack the encodings sent. The default
+        one keeps any JSON genome as is, 'packed' is more compact for numeric genomes but decodes
+        integers mixed with floats as floats
+        :param codec_registry: the codecs available to decode the encodings received. If not
+        provided, the default codecs are used, with the NumPy arrays decoded without copies
+        """
+        if codec_registry is None:
+            codec_registry = GenomeCodecRegistry().register(NumpyGenomeCodec(copy=False))
+        self._codecs = codec_registry
+        self._genome_codec = codec_registry.resolve(genome_codec)
+        self._genome_codec_id = self._genome_codec.codec_id.encode()
+
+    @property
+    def content_type(self) -> str:
+        return f'application/x-dga-binary; version={_VERSION}'
+
+    def encode_individuals(self, individuals: Sequence[Tuple[UUID, T]]) -> bytes:
+        encode = self._genome_codec.encode
+        parts = [self.__header(_INDIVIDUALS, len(individuals))]
+        for individual_id, encoding in individuals:
+            raw_encoding = encode(encoding)
+            parts.append(self.__pack_id(individual_id))
+            parts.append(_LENGTH.pack(len(raw_encoding)))
+            parts.append(raw_encoding)
+        return b''.join(parts)
+
+    def decode_individuals(self, body: bytes) -> List[Tuple[UUID, T]] | None:
+        try:
+            view, count, genome_codec, offset = self.__unpack_header(body, _INDIVIDUALS)
+            individuals = []
+            for _ in range(count):
+                individual_id, offset = self.__unpack_id(view, offset)
+                length, = _LENGTH.unpack_from(view, offset)
+                offset += _LENGTH.size
+                if offset + length > len(view):
+                    return None
+                individuals.append((individual_id,
+                                    genome_codec.decode(view[offset:offset + length])))
+                offset += length
+            return individuals
+        except (struct.error, ValueError, TypeError):
+            return None
+
+    def encode_results(self, results: Sequence[Tuple[UUID, FitnessScore]]) -> bytes:
+        parts = [self.__header(_RESULTS, len(results))]
+        for individual_id, fitness in results:
+            parts.append(self.__pack_id(individual_id))
+            parts.append(_FITNESS.pack(math.nan if fitness is None else fitness))
+        return b''.join(parts)
+
+    def decode_results(self, body: bytes) -> List[Tuple[UUID, FitnessScore]] | None:
+        try:
+            view, count, _, offset = self.__unpack_header(body, _RESULTS)
+            results = []
+            for _ in range(count):
+                individual_id, offset = self.__unpack_id(view, offset)
+                fitness, = _FITNESS.unpack_from(view, offset)
+                offset += _FITNESS.size
+                results.append((individual_id, None if math.isnan(fitness) else fitness))
+            return results
+        except (struct.error, ValueError, TypeError):
+            return None
+
+    def __header(self, kind: int, count: int) -> bytes:
+        return _HEADER.pack(_MAGIC, _VERSION, kind, count,
+                            len(self._genome_codec_id)) + self._genome_codec_id
+
+    def __unpack_header(self, body: bytes, expected_kind: int):
+        view = memoryview(body)
+        magic, version, kind, count, codec_id_length = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _VERSION or kind != expected_kind:
+            raise ValueError('Unexpected message')
+        offset = _HEADER.size + codec_id_length
+        genome_codec = self._codecs.get(bytes(view[_HEADER.size:offset]).decode())
+        return view, count, genome_codec, offset
+
+    @staticmethod
+    def __pack_id(individual_id: UUID) -> bytes:
+        if isinstance(individual_id, int):
+            return _INT_ID_RECORD.pack(_INT_ID, individual_id)
+        raw_id = str(individual_id).encode()
+        return _STR_ID_RECORD.pack(_STR_ID, len(raw_id)) + raw_id
+
+    @staticmethod
+    def __unpack_id(view: memoryview, offset: int) -> Tuple[UUID, int]:
+        if view[offset] == _INT_ID:
+            _, individual_id = _INT_ID_RECORD.unpack_from(view, offset)
+            return individual_id, offset + _INT_ID_RECORD.size
+        _, length = _STR_ID_RECORD.unpack_from(view, offset)
+        offset += _STR_ID_RECORD.size
+        return bytes(view[offset:offset + length]).decode(), offset + length
@@ -0,0 +1,84 @@
+import json
+from typing import TypeVar, Generic, Sequence, Tuple, List
+
+from shared.annotations.custom import UUID, FitnessScore
+from shared.services.messaging.codecs.interfaces.imessage_codec import IMessageCodec
+
+T = TypeVar('T')
+
+
+class JsonMessageCodec(IMessageCodec[T], Generic[T]):
+    """
+    A single individual is sent as {'id', 'encoding'} and many individuals are packed in an
+    envelope as {'individuals': [[id, encoding], ...]}. Likewise, results are sent as
+    {'id', 'fitness'} or {'results': [[id, fitness], ...]}.
+    It is the format used before the message codecs, so it is also used to decode the messages
+    without a content type
+    """
+
+    @property
+    def content_type(self) -> str:
+        return 'application/json'
+
+    def encode_individuals(self, individuals: Sequence[Tuple[UUID, T]]) -> bytes:
+        if len(individuals) == 1:
+            individual_id, encoding = individuals[0]
+            return self.__dumps({'id': individual_id, 'encoding': encoding})
+        return self.__dumps({'individuals': [[_id, encoding] for _id, encoding in individuals]})
+
+    def decode_individuals(self, body: bytes) -> List[Tuple[UUID, T]] | None:
+        msg = self.__loads(body)
+        if msg is None:
+            return None
+        if 'individuals' in msg:
+            return self.__pairs(msg['individuals'])
+        if 'id' not in msg or 'encoding' not in msg:
+            return None
+        return [(msg['id'], msg['encoding'])]
+
+    def encode_results(self, results: Sequence[Tuple[UUID, FitnessScore]]) -> bytes:
+        if len(results) == 1:
+            individual_id, fitness = results[0]
+            return self.__dumps({'id': individual_id, 'fitness': fitness})
+        return self.__dumps({'results': [[_id, fitness] for _id, fitness in results]})
+
+    def decode_results(self, body: bytes) -> List[Tuple[UUID, FitnessScore]] | None:
+        msg = self.__loads(body)
+        if msg is None:
+            return None
+        if 'results' in msg:
+            results = self.__pairs(msg['results'])
+        elif 'id' in msg and 'fitness' in msg:
+            results = [(msg['id'], msg['fitness'])]
+        else:
+            return None
+        if results is None or not all(self.__is_fitness(fitness) for _, fitness in results):
+            return None
+        return results
+
+    @staticmethod
+    def __pairs(records) -> List[tuple] | None:
+        """
+        :return: the [id, value] records as tuples, None if any of them is not a pair
+        """
+        if not isinstance(records, list) \
+                or not all(isinstance(record, list) and len(record) == 2 for record in records):
+            return None
+        return [(_id, value) for _id, value in records]
+
+    @staticmethod
+    def __is_fitness(fitness) -> bool:
+        return fitness is None or (isinstance(fitness, (int, float))
+                                   and not isinstance(fitness, bool))
+
+    @staticmethod
+    def __dumps(msg: dict) -> bytes:
+        return json.dumps(msg, separators=(',', ':')).encode()
+
+    @staticmethod
+    def __loads(body: str | bytes | bytearray) -> dict | None:
+        try:
+            msg = json.loads(body)
+        except (TypeError, ValueError):
+            return None
+        return msg if isinstance(msg, dict) else None
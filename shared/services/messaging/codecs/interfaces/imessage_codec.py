@@ -0,0 +1,41 @@
+from abc import ABC, abstractmethod
+from typing import Generic, TypeVar, Sequence, Tuple, List
+
+from shared.annotations.custom import UUID, FitnessScore
+
+T = TypeVar('T')
+
+
+class IMessageCodec(ABC, Generic[T]):
+    """
+    Converts the messages exchanged through the message bus to bytes and back. A message can
+    carry one or many individuals (or results). Every codec is identified by the content type
+    sent along with the messages, so the receiver knows how to decode them
+    """
+
+    @property
+    @abstractmethod
+    def content_type(self) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def encode_individuals(self, individuals: Sequence[Tuple[UUID, T]]) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode_individuals(self, body: bytes) -> List[Tuple[UUID, T]] | None:
+        """
+        :return: pairs of id and encoding, None if the message is not valid
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def encode_results(self, results: Sequence[Tuple[UUID, FitnessScore]]) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode_results(self, body: bytes) -> List[Tuple[UUID, FitnessScore]] | None:
+        """
+        :return: pairs of id and fitness score, None if the message is not valid
+        """
+        raise NotImplementedError
@@ -0,0 +1,34 @@
+from typing import Dict
+
+from shared.services.messaging.codecs.implementations.binary_message_codec import BinaryMessageCodec
+from shared.services.messaging.codecs.implementations.json_message_codec import JsonMessageCodec
+from shared.services.messaging.codecs.interfaces.imessage_codec import IMessageCodec
+
+
+class MessageCodecRegistry:
+    """
+    Finds the codec of the messages received by their content type. The built-in codecs (JSON
+    and binary) are always registered, and the messages without a content type are decoded as
+    JSON
+    """
+
+    def __init__(self):
+        self._codecs: Dict[str, IMessageCodec] = {}
+        self._fallback = JsonMessageCodec()
+        self.register(self._fallback).register(BinaryMessageCodec())
+
+    def register(self, codec: IMessageCodec):
+        """
+        Adds a codec, replacing any other with the same content type
+        :param codec:
+        """
+        self._codecs[codec.content_type] = codec
+        return self
+
+    def get(self, content_type: str | None) -> IMessageCodec | None:
+        """
+        :return: the codec of the content type, None if it is unknown
+        """
+        if not content_type:
+            return self._fallback
+        return self._codecs.get(content_type)
@@ -0,0 +1,104 @@
+import threading
+from collections import deque
+from concurrent.futures import Future
+from functools import wraps
+from typing import Callable, Deque, Tuple
+
+
+class ChannelCommandQueue:
+    """
+    Runs the channel operations on the thread of the pika ioloop, since pika channels are
+    not thread-safe. Any thread can submit a command, the commands are run in order and all
+    the commands queued when the ioloop wakes up are run in the same loop iteration.
+    Commands submitted before the ioloop is attached (or while it is detached) wait for it
+    """
+
+    def __init__(self):
+        self._commands: Deque[Tuple[Future, Callable, tuple, dict]] = deque()
+        self._lock = threading.Lock()
+        self._ioloop = None
+        self._ioloop_thread: int | None = None
+        self._is_scheduled = False
+        self._is_running = False
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._commands)
+
+    def attach(self, ioloop):
+        """
+        Must be called on the thread of the ioloop, the pending commands are run right away
+        """
+        with self._lock:
+            self._ioloop = ioloop
+            self._ioloop_thread = threading.get_ident()
+            self._is_scheduled = False
+        self.__run_pending()
+
+    def detach(self, error: Exception | None = None):
+        """
+        The commands submitted from now on wait for the next ioloop
+        :param error: if provided, the pending commands fail with it instead of waiting
+        """
+        failed = deque()
+        with self._lock:
+            self._ioloop = None
+            self._ioloop_thread = None
+            self._is_scheduled = False
+            if error is not None:
+                failed, self._commands = self._commands, deque()
+        for future, _, _, _ in failed:
+            future.set_exception(error)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        :return: a future resolved with the value returned by the command once it runs
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        if threading.get_ident() == self._ioloop_thread:
+            # Already on the ioloop: the queued commands go first, unless they are being run
+            if not self._is_running:
+                self.__run_pending()
+            self.__run(future, fn, args, kwargs)
+            return future
+        with self._lock:
+            self._commands.append((future, fn, args, kwargs))
+            ioloop = self._ioloop
+            should_schedule = ioloop is not None and not self._is_scheduled
+            if should_schedule:
+                self._is_scheduled = True
+        if should_schedule:
+            ioloop.add_callback_threadsafe(self.__run_pending)
+        return future
+
+    def __run_pending(self):
+        with self._lock:
+            commands, self._commands = self._commands, deque()
+            self._is_scheduled = False
+        self._is_running = True
+        try:
+            for future, fn, args, kwargs in commands:
+                self.__run(future, fn, args, kwargs)
+        finally:
+            self._is_running = False
+
+    @staticmethod
+    def __run(future: Future, fn: Callable, args: tuple, kwargs: dict):
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+
+
+def on_ioloop(method):
+    """
+    Makes a method of a class with a ChannelCommandQueue (_commands) run on the ioloop, it
+    returns a future instead of the value
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs) -> Future:
+        return self._commands.submit(method, self, *args, **kwargs)
+
+    return wrapper
+
@@ -0,0 +1,98 @@
+import lzma
+import time
+import zlib
+from threading import Lock
+from typing import Tuple
+
+from shared.models.value_objects.compression_stats import CompressionStats
+
+# The content encodings sent along with the compressed messages
+ZLIB, LZMA = 'zlib', 'lzma'
+
+
+class PayloadCompressor:
+    """
+    Compresses the message bodies larger than a threshold and decompresses the bodies
+    received according to their content encoding. Every compressor decompresses both
+    algorithms, so workers and coordinators with different settings can share a bus
+    """
+
+    def __init__(self, algorithm: str | None = ZLIB, level: int | None = None,
+                 threshold: int = 16 * 1024):
+        """
+        :param algorithm: zlib or lzma. If None, nothing is compressed but the compressed
+        bodies received are still decompressed
+        :param level: zlib from 0 to 9, lzma presets from 0 to 9. The default level of the
+        algorithm if not provided
+        :param threshold: min size in bytes of the bodies compressed. Smaller bodies are
+        not worth the time
+        """
+        if algorithm not in (ZLIB, LZMA, None):
+            raise ValueError(f'Unknown compression algorithm "{algorithm}"')
+        self.algorithm = algorithm
+        self.level = level
+        self.threshold = threshold
+        self._stats = CompressionStats()
+        self._lock = Lock()
+
+    @property
+    def stats(self) -> CompressionStats:
+        return self._stats
+
+    def compress(self, body: bytes) -> Tuple[bytes, str | None]:
+        """
+        :return: the body to send and its content encoding, None if it was not compressed
+        (small bodies or bodies that do not shrink)
+        """
+        if self.algorithm is None or len(body) < self.threshold:
+            self.__record_sent(len(body), len(body), None)
+            return body, None
+        start = time.perf_counter()
+        if self.algorithm == ZLIB:
+            compressed = zlib.compress(body, -1 if self.level is None else self.level)
+        else:
+            compressed = lzma.compress(body, preset=self.level)
+        elapsed = time.perf_counter() - start
+        if len(compressed) >= len(body):
+            self.__record_sent(len(body), len(body), elapsed)
+            return body, None
+        self.__record_sent(len(body), len(compressed), elapsed)
+        return compressed, self.algorithm
+
+    def decompress(self, body: bytes, content_encoding: str | None) -> bytes | None:
+        """
+        :return: the original body, None if the encoding is unknown or the body is corrupted
+        """
+        if not content_encoding:
+            return body
+        start = time.perf_counter()
+        try:
+            if content_encoding == ZLIB:
+                original = zlib.decompress(body)
+            elif content_encoding == LZMA:
+                original = lzma.decompress(body)
+            else:
+                return None
+        except (zlib.error, lzma.LZMAError):
+            return None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats = self._stats._replace(
+                decompressed_messages=self._stats.decompressed_messages + 1,
+                received_bytes=self._stats.received_bytes + len(body),
+                decompressed_bytes=self._stats.decompressed_bytes + len(original),
+                decompression_seconds=self._stats.decompression_seconds + elapsed)
+        return original
+
+    def __record_sent(self, original_size: int, sent_size: int, elapsed: float | None):
+        """
+        :param elapsed: seconds spent compressing, None if the body was not compressed
+        """
+        with self._lock:
+            stats = self._stats
+            self._stats = stats._replace(
+                sent_messages=stats.sent_messages + 1,
+                compressed_messages=stats.compressed_messages + (sent_size < original_size),
+                original_bytes=stats.original_bytes + original_size,
+                sent_bytes=stats.sent_bytes + sent_size,
+                compression_seconds=stats.compression_seconds + (elapsed or 0.0))
@@ -1,23 +1,48 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import Future
 from dataclasses import dataclass
 from threading import Thread, Event
-from typing import Callable, List
+from typing import Callable, List, Dict, Tuple
 
 import pika
 
 from shared.annotations.custom import UUID
+from shared.models.value_objects.compression_stats import CompressionStats
+from shared.services.messaging.codecs.implementations.json_message_codec import JsonMessageCodec
+from shared.services.messaging.codecs.interfaces.imessage_codec import IMessageCodec
+from shared.services.messaging.codecs.registry import MessageCodecRegistry
+from shared.services.messaging.command_queue import ChannelCommandQueue, on_ioloop
+from shared.services.messaging.compression.payload_compressor import PayloadCompressor
 from shared.services.messaging.bus.interfaces.imessage_bus import IMessageBusControls
 from shared.services.messaging.pubsub.interfaces.ipubsub import IPubSubControls
 
+# The generation of the individuals (and results) carried by a message, and the generation
+# announced by the new generation signal
+GENERATION_HEADER = 'x-dga-generation'
+# The secs a worker spent evaluating each of the individuals of a message of results
+EVALUATION_SECS_HEADER = 'x-dga-evaluation-secs'
+
 
 @dataclass
 class PausableQueue:
     consumer_tag: str
     basic_consume_params: dict
+    channel: any = None  # the channel of the consumer, the main channel if not provided
 
 
 class RabbitMqMessagingBaseControls(IMessageBusControls, IPubSubControls, ABC):
-    def __init__(self, connection_string: str, experiment_id: UUID, total_queues: int = 0):
+    def __init__(self, connection_string: str, experiment_id: UUID, total_queues: int = 0,
+                 message_codec: IMessageCodec | None = None,
+                 compressor: PayloadCompressor | None = None):
+        """
+        :param connection_string:
+        :param experiment_id:
+        :param total_queues:
+        :param message_codec: the codec of the messages sent, JSON if not provided. Received
+        messages are decoded according to their content type
+        :param compressor: compresses the large messages sent. If not provided, nothing is
+        compressed but the compressed messages received are still decompressed
+        """
         ex_prefix = f'ex-{experiment_id}'
         self.individuals_q = f'{ex_prefix}-individuals'
         self.results_q = f'{ex_prefix}-results'
@@ -36,6 +61,15 @@ class RabbitMqMessagingBaseControls(IMessageBusControls, IPubSubControls, ABC):
         self._stop_event = Event()
         self._queue_count = total_queues
         self._queue_declared_count = 0
+        # Payloads
+        self._message_codec = message_codec or JsonMessageCodec()
+        self._message_codecs = MessageCodecRegistry().register(self._message_codec)
+        self._compressor = compressor or PayloadCompressor(algorithm=None)
+        # By content encoding and priority
+        self._payload_properties: Dict[Tuple[str | None, int | None], pika.BasicProperties] = {}
+        self._payload_headers: dict | None = None
+        # The channel operations requested from other threads run on the ioloop
+        self._commands = ChannelCommandQueue()
 
     @abstractmethod
     def on_channel_open(self, channel):  # protected method
@@ -54,6 +88,13 @@ class RabbitMqMessagingBaseControls(IMessageBusControls, IPubSubControls, ABC):
     def is_stopped(self) -> bool:
         return self._is_stopped
 
+    @property
+    def compression_stats(self) -> CompressionStats:
+        """
+        :return: bytes (and seconds) saved by compressing the messages sent and received
+        """
+        return self._compressor.stats
+
     @property
     def _is_fully_initialized(self) -> bool:
         return (self._queue_declared_count >= self._queue_count
@@ -70,22 +111,30 @@ class RabbitMqMessagingBaseControls(IMessageBusControls, IPubSubControls, ABC):
                                                 on_close_callback=self.__on_close)
         self.connection.ioloop.start()
 
+    @on_ioloop
     def pause(self):
         if not self.channel:
             return
         for pq in self.pausable_queues:
-            self.channel.basic_cancel(consumer_tag=pq.consumer_tag)
+            (pq.channel or self.channel).basic_cancel(consumer_tag=pq.consumer_tag)
 
+    @on_ioloop
     def resume(self):
         if not self.channel:
             return
         for pq in self.pausable_queues:
-            pq.consumer_tag = self.channel.basic_consume(**pq.basic_consume_params)
+            pq.consumer_tag = (pq.channel or self.channel).basic_consume(**pq.basic_consume_params)
+
+    def generation_queue(self, generation_id: UUID) -> str:
+        """
+        :return: the queue of the individuals of a generation
+        """
+        return f'{self.individuals_q}-gen-{generation_id}'
 
     def stop(self):
         if not self._is_stopped:
             self._is_stopped = True
-            self.connection.close()
+            self._commands.submit(self.connection.close)
 
     def _start_keep_alive_thread(self):
         """
@@ -96,8 +145,73 @@ class RabbitMqMessagingBaseControls(IMessageBusControls, IPubSubControls, ABC):
         self._keep_alive_thread = Thread(target=self.__keep_alive, daemon=True)
         self._keep_alive_thread.start()
 
+    def _publish_payload(self, routing_key: str, body: bytes,
+                         headers: dict | None = None) -> Future:
+        """
+        Publishes a body created by the message codec, compressed if it is large enough. The
+        compression runs on the calling thread and the publication on the ioloop
+        :param headers: of this message only, along with the ones set by _set_payload_headers
+        """
+        body, properties = self._compress_payload(body, headers=headers)
+        return self._commands.submit(lambda: self.channel.basic_publish(
+            exchange='', routing_key=routing_key, body=body, properties=properties))
+
+    def _compress_payload(self, body: bytes, priority: int | None = None,
+                          headers: dict | None = None) -> Tuple[bytes, pika.BasicProperties]:
+        """
+        :param priority: of the message, for queues declared with x-max-priority
+        :param headers: of this message only, along with the ones set by _set_payload_headers
+        :return: the body to send, compressed if it is large enough, and its properties
+        """
+        body, content_encoding = self._compressor.compress(body)
+        if headers:
+            return body, pika.BasicProperties(content_type=self._message_codec.content_type,
+                                              content_encoding=content_encoding,
+                                              headers={**(self._payload_headers or {}),
+                                                       **headers},
+                                              priority=priority)
+        return body, self.__payload_properties(content_encoding, priority)
+
+    def _read_payload(self, properties, body: bytes) -> Tuple[IMessageCodec | None, bytes | None]:
+        """
+        :return: the codec of a message received and its decompressed body. None instead of
+        the codec if the content type is unknown, and instead of the body if the content
+        encoding is
+        """
+        return (self._message_codecs.get(properties.content_type),
+                self._compressor.decompress(body, properties.content_encoding))
+
+    def _set_payload_headers(self, headers: dict | None):
+        """
+        :param headers: sent along with the payloads published from now on
+        """
+        self._payload_headers = headers
+        self._payload_properties = {}
+
+    def _on_keep_alive(self):
+        """
+        Called periodically on the ioloop by the keep alive thread
+        """
+        self.channel.queue_declare(queue=self.results_q, passive=True)
+
+    def __payload_properties(self, content_encoding: str | None,
+                             priority: int | None = None) -> pika.BasicProperties:
+        properties = self._payload_properties.get((content_encoding, priority))
+        if properties is None:
+            properties = pika.BasicProperties(content_type=self._message_codec.content_type,
+                                              content_encoding=content_encoding,
+                                              headers=self._payload_headers,
+                                              priority=priority)
+            self._payload_properties[(content_encoding, priority)] = properties
+        return properties
+
     def __on_open(self, connection):
-        connection.channel(on_open_callback=self.on_channel_open)
+        connection.channel(on_open_callback=self.__on_channel_open)
+
+    def __on_channel_open(self, channel):
+        self.on_channel_open(channel)
+        # The operations requested before the channel was ready run now
+        self._commands.attach(self.connection.ioloop)
 
     def _acknowledge_queue_declaration(self, _):
         self._queue_declared_count += 1
@@ -110,6 +224,7 @@ class RabbitMqMessagingBaseControls(IMessageBusControls, IPubSubControls, ABC):
             self._start_cb = None
 
     def __on_close(self, a, b):
+        self._commands.detach(ConnectionError('The connection is closed'))
         self._stop_event.set()  # stops the thread
         if self._keep_alive_thread.is_alive():
             self._keep_alive_thread.join()  # wait until it finishes
@@ -119,5 +234,5 @@ class RabbitMqMessagingBaseControls(IMessageBusControls, IPubSubControls, ABC):
         Periodically makes a request to the server to avoid being offline due to inactivity
         """
         while not self._stop_event.is_set():
-            self.channel.queue_declare(queue=self.individuals_q, passive=True)
+            self._commands.submit(self._on_keep_alive)
             self._stop_event.wait(15)
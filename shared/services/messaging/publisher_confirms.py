@@ -0,0 +1,232 @@
+import threading
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from itertools import takewhile
+from typing import Deque, Dict
+
+import pika
+from pika.spec import Basic
+
+
+class PublishDispatch:
+    """
+    The messages published by a single send. Its future is resolved once every message is
+    confirmed by the broker (or written, without confirms), or fails with the first error.
+    It is updated on the thread of the ioloop
+    """
+
+    def __init__(self):
+        self.future = Future()
+        self._pending = 0
+        self._is_sealed = False
+
+    def add(self):
+        self._pending += 1
+
+    def confirm(self):
+        self._pending -= 1
+        self.__resolve_if_done()
+
+    def fail(self, error: Exception):
+        if not self.future.done():
+            self.future.set_exception(error)
+
+    def seal(self):
+        """
+        No more messages are added, the future is resolved once the pending ones are confirmed
+        """
+        self._is_sealed = True
+        self.__resolve_if_done()
+
+    def __resolve_if_done(self):
+        if self._is_sealed and self._pending == 0 and not self.future.done():
+            self.future.set_result(None)
+
+
+@dataclass(slots=True)
+class _Message:
+    exchange: str
+    routing_key: str
+    body: bytes
+    properties: pika.BasicProperties | None
+    dispatch: PublishDispatch | None
+    nacks: int = 0
+
+
+class PublisherConfirms:
+    """
+    Publishes the messages of a channel in confirm mode. Up to a window of messages are
+    published without waiting for their confirmations (pipelined), the rest wait in a backlog
+    until the broker confirms the previous ones. Only the messages rejected by the broker (nack)
+    are published again. While the broker blocks the connection (e.g. it is low on memory or
+    disk) the messages are held in the backlog instead of being written to the connection.
+    The senders reserve room for their messages first (see reserve), so the backlog is bounded.
+    Every other method must be called on the thread of the ioloop
+    """
+
+    def __init__(self, window: int = 1024, max_retransmissions: int = 3,
+                 max_backlog: int = 8192):
+        """
+        :param window: max messages published and not confirmed yet
+        :param max_retransmissions: max times a rejected message is published again, its
+        dispatch fails afterwards
+        :param max_backlog: max messages waiting to be published, the senders wait for room
+        beyond it
+        """
+        self.window = max(1, window)
+        self.max_retransmissions = max_retransmissions
+        self.max_backlog = max(0, max_backlog)
+        self._channel = None
+        self._next_delivery_tag = 1
+        self._backlog: Deque[_Message] = deque()
+        self._in_flight: Dict[int, _Message] = {}  # by delivery tag, in publication order
+        self._is_blocked = False
+        self._retransmitted_count = 0
+        # Messages reserved and not confirmed (or failed) yet, they fit in the window plus the
+        # backlog. The senders wait on the condition while there is no room
+        self._reserved_count = 0
+        self._room = threading.Condition()
+        self._ioloop_thread: int | None = None
+
+    @property
+    def in_flight_count(self) -> int:
+        return len(self._in_flight)
+
+    @property
+    def backlog_count(self) -> int:
+        """
+        :return: messages not published yet, either waiting for the window or held while blocked
+        """
+        return len(self._backlog)
+
+    @property
+    def is_blocked(self) -> bool:
+        return self._is_blocked
+
+    @property
+    def retransmitted_count(self) -> int:
+        """
+        :return: times a message rejected by the broker was published again
+        """
+        return self._retransmitted_count
+
+    def attach(self, channel):
+        """
+        Puts a channel in confirm mode, before anything is published on it
+        """
+        self._channel = channel
+        self._ioloop_thread = threading.get_ident()
+        self._next_delivery_tag = 1  # delivery tags are scoped to the channel
+        channel.confirm_delivery(ack_nack_callback=self.__on_confirmation)
+        self.__flush()
+
+    def reserve(self, count: int = 1):
+        """
+        Called on the sending thread before submitting messages to publish, it waits until
+        they fit in the window plus the backlog. It doesn't wait on the thread of the ioloop,
+        which must not block, so the messages sent from it can exceed the backlog. A send
+        larger than the window plus the backlog only waits for every previous message
+        :param count: messages to be published
+        """
+        with self._room:
+            if threading.get_ident() != self._ioloop_thread:
+                capacity = self.window + self.max_backlog
+                self._room.wait_for(lambda: self._reserved_count == 0
+                                    or self._reserved_count + count <= capacity)
+            self._reserved_count += count
+
+    def publish(self, exchange: str, routing_key: str, body: bytes,
+                properties: pika.BasicProperties | None = None,
+                dispatch: PublishDispatch | None = None):
+        """
+        :param dispatch: notified when the message is confirmed, or rejected too many times
+        """
+        if self._channel is None:
+            self.__release(1)
+            if dispatch is not None:
+                dispatch.fail(ConnectionError('The channel is closed'))
+            return
+        if dispatch is not None:
+            dispatch.add()
+        self._backlog.append(_Message(exchange, routing_key, body, properties, dispatch))
+        self.__flush()
+
+    def block(self):
+        """
+        Called when the broker blocks the connection, the publications are paused
+        """
+        self._is_blocked = True
+
+    def unblock(self):
+        self._is_blocked = False
+        self.__flush()
+
+    def fail(self, error: Exception):
+        """
+        Called when the channel closes, the dispatches of every unconfirmed message fail
+        """
+        self._channel = None
+        messages = [*self._in_flight.values(), *self._backlog]
+        self._in_flight.clear()
+        self._backlog.clear()
+        # Including the reservations of the messages not submitted yet, they fail once published
+        with self._room:
+            self._reserved_count = 0
+            self._room.notify_all()
+        for message in messages:
+            if message.dispatch is not None:
+                message.dispatch.fail(error)
+
+    def __flush(self):
+        while (self._backlog and self._channel is not None and not self._is_blocked
+               and len(self._in_flight) < self.window):
+            message = self._backlog.popleft()
+            try:
+                self._channel.basic_publish(exchange=message.exchange,
+                                            routing_key=message.routing_key,
+                                            body=message.body, properties=message.properties)
+            except Exception as e:
+                self.__release(1)
+                if message.dispatch is not None:
+                    message.dispatch.fail(e)
+                continue
+            self._in_flight[self._next_delivery_tag] = message
+            self._next_delivery_tag += 1
+
+    def __on_confirmation(self, frame):
+        method = frame.method
+        if method.multiple:
+            delivery_tags = list(takewhile(lambda tag: tag <= method.delivery_tag, self._in_flight))
+        else:
+            delivery_tags = [method.delivery_tag] if method.delivery_tag in self._in_flight else []
+        is_ack = isinstance(method, Basic.Ack)
+        rejected = []
+        for delivery_tag in delivery_tags:
+            message = self._in_flight.pop(delivery_tag)
+            if is_ack:
+                if message.dispatch is not None:
+                    message.dispatch.confirm()
+            elif message.nacks >= self.max_retransmissions:
+                if message.dispatch is not None:
+                    message.dispatch.fail(ConnectionError(
+                        f'The broker rejected a message {message.nacks + 1} times'))
+            else:
+                message.nacks += 1
+                rejected.append(message)
+        # The rejected messages are published again before the backlog, in their order
+        self._backlog.extendleft(reversed(rejected))
+        self._retransmitted_count += len(rejected)
+        self.__release(len(delivery_tags) - len(rejected))
+        self.__flush()
+
+    def __release(self, count: int):
+        """
+        Makes room for other messages once some are confirmed or failed
+        """
+        if count <= 0:
+            return
+        with self._room:
+            # The reservations are cleared when the channel closes
+            self._reserved_count = max(0, self._reserved_count - count)
+            self._room.notify_all()
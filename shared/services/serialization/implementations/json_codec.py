@@ -0,0 +1,24 @@
+import json
+from typing import TypeVar, Generic
+
+from shared.services.serialization.interfaces.igenome_codec import IGenomeCodec
+
+T = TypeVar('T')
+
+
+class JsonGenomeCodec(IGenomeCodec[T], Generic[T]):
+    """
+    Stores any JSON serializable encoding as UTF-8 text
+    """
+
+    @property
+    def codec_id(self) -> str:
+        return 'json'
+
+    def encode(self, encoding: T) -> bytes:
+        return json.dumps(encoding, separators=(',', ':')).encode()
+
+    def decode(self, raw: str | bytes | memoryview) -> T:
+        if not isinstance(raw, str):
+            raw = str(raw, 'utf-8')  # faster than letting json detect the encoding
+        return json.loads(raw)
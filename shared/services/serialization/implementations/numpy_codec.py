@@ -0,0 +1,45 @@
+import struct
+from typing import Any
+
+from shared.services.serialization.interfaces.igenome_codec import IGenomeCodec
+
+_HEADER = struct.Struct('<BB')  # length of the dtype descriptor, number of dimensions
+_DIMENSION = struct.Struct('<Q')
+
+
+class NumpyGenomeCodec(IGenomeCodec[Any]):
+    """
+    Stores NumPy arrays as their raw buffer preceded by the dtype and the shape.
+    NumPy is only required when this codec is actually used.
+    """
+
+    def __init__(self, copy: bool = True):
+        """
+        :param copy: if False, decoded arrays are read-only views over the given buffer, so no
+        data is copied
+        """
+        self._copy = copy
+
+    @property
+    def codec_id(self) -> str:
+        return 'numpy'
+
+    def encode(self, encoding) -> bytes:
+        import numpy as np
+        encoding = np.ascontiguousarray(encoding)
+        dtype = encoding.dtype.str.encode()
+        header = _HEADER.pack(len(dtype), encoding.ndim) + dtype
+        shape = b''.join(_DIMENSION.pack(dim) for dim in encoding.shape)
+        return header + shape + encoding.tobytes()
+
+    def decode(self, raw: bytes | memoryview):
+        import numpy as np
+        dtype_length, ndim = _HEADER.unpack_from(raw)
+        offset = _HEADER.size
+        dtype = np.dtype(bytes(raw[offset:offset + dtype_length]).decode())
+        offset += dtype_length
+        shape = tuple(_DIMENSION.unpack_from(raw, offset + i * _DIMENSION.size)[0]
+                      for i in range(ndim))
+        offset += ndim * _DIMENSION.size
+        array = np.frombuffer(raw, dtype=dtype, offset=offset).reshape(shape)
+        return array.copy() if self._copy else array
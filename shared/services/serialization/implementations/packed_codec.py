@@ -0,0 +1,61 @@
+import struct
+import sys
+from array import array
+from typing import List
+
+from shared.annotations.custom import Genome
+from shared.services.serialization.interfaces.igenome_codec import IGenomeCodec
+
+_HEADER = struct.Struct('<BcI')  # depth, array typecode, number of rows
+_INT, _FLOAT = b'q', b'd'
+
+
+class PackedGenomeCodec(IGenomeCodec[Genome]):
+    """
+    Packs numeric genomes, either a flat list of numbers or a list of lists of numbers (rows
+    can have different lengths), as little-endian 64-bit arrays.
+    If all the genes are integers they are stored as int64, otherwise all of them are stored
+    as float64, so integers mixed with floats are decoded as floats.
+    """
+
+    @property
+    def codec_id(self) -> str:
+        return 'packed'
+
+    def encode(self, encoding: Genome | List[float | int]) -> bytes:
+        is_nested = len(encoding) > 0 and isinstance(encoding[0], (list, tuple))
+        rows = encoding if is_nested else [encoding]
+        genes = [gene for row in rows for gene in row]
+        for gene in genes:
+            if not isinstance(gene, (int, float)):
+                raise TypeError(f'Only numeric genes can be packed, found {type(gene).__name__}')
+        typecode = _INT if all(isinstance(gene, int) for gene in genes) else _FLOAT
+        values = array(typecode.decode(), genes)
+        header = _HEADER.pack(2 if is_nested else 1, typecode, len(rows))
+        lengths = array('I', [len(row) for row in rows]) if is_nested else array('I')
+        if sys.byteorder == 'big':
+            values.byteswap()
+            lengths.byteswap()
+        return header + lengths.tobytes() + values.tobytes()
+
+    def decode(self, raw: bytes | memoryview) -> Genome | List[float | int]:
+        raw = memoryview(raw)
+        depth, typecode, rows_count = _HEADER.unpack_from(raw)
+        offset = _HEADER.size
+        lengths = array('I')
+        if depth == 2:
+            lengths.frombytes(raw[offset:offset + rows_count * lengths.itemsize])
+            offset += rows_count * lengths.itemsize
+        values = array(typecode.decode())
+        values.frombytes(raw[offset:])
+        if sys.byteorder == 'big':
+            values.byteswap()
+            lengths.byteswap()
+        values = values.tolist()
+        if depth == 1:
+            return values
+        genome, start = [], 0
+        for length in lengths:
+            genome.append(values[start:start + length])
+            start += length
+        return genome
@@ -0,0 +1,24 @@
+from abc import ABC, abstractmethod
+from typing import Generic, TypeVar
+
+T = TypeVar('T')
+
+
+class IGenomeCodec(ABC, Generic[T]):
+    """
+    Converts genome encodings to bytes and back. Every codec is identified by a short, unique
+    id that is stored along with the bytes so they can be decoded later
+    """
+
+    @property
+    @abstractmethod
+    def codec_id(self) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def encode(self, encoding: T) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode(self, raw: bytes | memoryview) -> T:
+        raise NotImplementedError
@@ -0,0 +1,54 @@
+from typing import Dict
+
+from shared.services.serialization.implementations.json_codec import JsonGenomeCodec
+from shared.services.serialization.implementations.numpy_codec import NumpyGenomeCodec
+from shared.services.serialization.implementations.packed_codec import PackedGenomeCodec
+from shared.services.serialization.interfaces.igenome_codec import IGenomeCodec
+
+
+class GenomeCodecRegistry:
+    """
+    Keeps the available genome codecs by their id. The built-in codecs (json, packed and
+    numpy) are always registered
+    """
+    __default = None
+
+    def __init__(self):
+        self._codecs: Dict[str, IGenomeCodec] = {}
+        self.register(JsonGenomeCodec()) \
+            .register(PackedGenomeCodec()) \
+            .register(NumpyGenomeCodec())
+
+    @classmethod
+    def default(cls) -> 'GenomeCodecRegistry':
+        """
+        :return: the registry shared by the components that don't receive one explicitly
+        """
+        if cls.__default is None:
+            cls.__default = GenomeCodecRegistry()
+        return cls.__default
+
+    def register(self, codec: IGenomeCodec):
+        """
+        Adds a codec, replacing any other with the same id
+        :param codec:
+        """
+        self._codecs[codec.codec_id] = codec
+        return self
+
+    def get(self, codec_id: str) -> IGenomeCodec:
+        codec = self._codecs.get(codec_id)
+        if codec is None:
+            raise ValueError(f'Unknown genome codec "{codec_id}"')
+        return codec
+
+    def resolve(self, codec: str | IGenomeCodec) -> IGenomeCodec:
+        """
+        :param codec: a codec id or a codec instance, which is registered if it wasn't
+        :return: the codec instance
+        """
+        if isinstance(codec, IGenomeCodec):
+            if codec.codec_id not in self._codecs:
+                self.register(codec)
+            return codec
+        return self.get(codec)
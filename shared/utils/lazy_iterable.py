@@ -0,0 +1,15 @@
+from typing import Generic, TypeVar, Callable, Iterator
+
+T = TypeVar('T')
+
+
+class LazyIterable(Generic[T]):
+    """
+    An iterable whose items are produced on demand. Every iteration calls the factory to get
+    a new iterator, so it can be iterated more than once (e.g. by many listeners)
+    """
+    def __init__(self, iterator_factory: Callable[[], Iterator[T]]):
+        self._iterator_factory = iterator_factory
+
+    def __iter__(self) -> Iterator[T]:
+        return self._iterator_factory()
@@ -0,0 +1,120 @@
+import math
+import struct
+from array import array
+from typing import Dict
+
+# version, relative accuracy, max buckets, zeros count, negative buckets, positive buckets
+_HEADER = struct.Struct('<BdIQII')
+_VERSION = 1
+# Values closer to 0 than this are counted as zeros
+_MIN_MAGNITUDE = 1e-12
+
+
+class QuantileSketch:
+    """
+    A DDSketch-like quantile sketch. Values are counted in logarithmic buckets, so any quantile
+    is estimated within the relative accuracy, and two sketches are merged by adding the
+    counts of their buckets. If there are more than max_buckets, the buckets closest to zero
+    are collapsed, so only the accuracy of the lowest quantiles degrades.
+    Non-finite values (infinities and NaN) have no bucket, they are not counted.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('The relative accuracy must be between 0 and 1')
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._positive: Dict[int, int] = {}
+        self._negative: Dict[int, int] = {}  # buckets of the absolute values
+        self._zeros = 0
+        self.count = 0
+
+    def add(self, value: float, count: int = 1):
+        if not math.isfinite(value):
+            return
+        magnitude = abs(value)
+        if magnitude < _MIN_MAGNITUDE:
+            self._zeros += count
+        else:
+            buckets = self._positive if value > 0 else self._negative
+            index = math.ceil(math.log(magnitude) / self._log_gamma)
+            buckets[index] = buckets.get(index, 0) + count
+            if len(buckets) > self.max_buckets:
+                self.__collapse(buckets)
+        self.count += count
+
+    def merge(self, other: 'QuantileSketch'):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Only sketches with the same relative accuracy can be merged')
+        for buckets, other_buckets in ((self._positive, other._positive),
+                                       (self._negative, other._negative)):
+            for index, count in other_buckets.items():
+                buckets[index] = buckets.get(index, 0) + count
+            if len(buckets) > self.max_buckets:
+                self.__collapse(buckets)
+        self._zeros += other._zeros
+        self.count += other.count
+
+    def quantile(self, q: float) -> float | None:
+        """
+        :param q: between 0 and 1
+        :return: the estimated value at the quantile q, None if the sketch is empty
+        """
+        if not 0 <= q <= 1:
+            raise ValueError('The quantile must be between 0 and 1')
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self._negative, reverse=True):  # from the lowest value
+            seen += self._negative[index]
+            if seen > rank:
+                return -self.__bucket_value(index)
+        seen += self._zeros
+        if seen > rank:
+            return 0.0
+        for index in sorted(self._positive):
+            seen += self._positive[index]
+            if seen > rank:
+                return self.__bucket_value(index)
+        return self.__bucket_value(max(self._positive))
+
+    def to_bytes(self) -> bytes:
+        parts = [_HEADER.pack(_VERSION, self.relative_accuracy, self.max_buckets, self._zeros,
+                              len(self._negative), len(self._positive))]
+        for buckets in (self._negative, self._positive):
+            parts.append(array('i', buckets.keys()).tobytes())
+            parts.append(array('Q', buckets.values()).tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes | memoryview) -> 'QuantileSketch':
+        version, relative_accuracy, max_buckets, zeros, negative_count, positive_count = \
+            _HEADER.unpack_from(data)
+        if version != _VERSION:
+            raise ValueError(f'Unknown quantile sketch version {version}')
+        sketch = cls(relative_accuracy, max_buckets)
+        sketch._zeros = zeros
+        offset = _HEADER.size
+        for buckets, size in ((sketch._negative, negative_count),
+                              (sketch._positive, positive_count)):
+            indexes, counts = array('i'), array('Q')
+            indexes.frombytes(data[offset:offset + 4 * size])
+            offset += 4 * size
+            counts.frombytes(data[offset:offset + 8 * size])
+            offset += 8 * size
+            buckets.update(zip(indexes, counts))
+        sketch.count = zeros + sum(sketch._negative.values()) + sum(sketch._positive.values())
+        return sketch
+
+    def __bucket_value(self, index: int) -> float:
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def __collapse(self, buckets: Dict[int, int]):
+        indexes = sorted(buckets)
+        excess = len(indexes) - self.max_buckets
+        target = indexes[excess]
+        for index in indexes[:excess]:
+            buckets[target] += buckets.pop(index)
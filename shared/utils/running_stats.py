@@ -0,0 +1,39 @@
+import math
+from dataclasses import dataclass, field
+
+from shared.utils.quantile_sketch import QuantileSketch
+
+
+@dataclass(slots=True)
+class RunningStats:
+    """
+    Summary of a stream of fitness scores that can be updated one score at a time and merged
+    with other summaries. Only the finite scores are summarized, the infinities and NaN are
+    skipped
+    """
+    count: int = 0
+    sum: float = 0.0
+    sum_squares: float = 0.0
+    min: float | None = None
+    max: float | None = None
+    sketch: QuantileSketch = field(default_factory=QuantileSketch)
+
+    def add(self, value: float):
+        if not math.isfinite(value):
+            return
+        self.count += 1
+        self.sum += value
+        self.sum_squares += value * value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sketch.add(value)
+
+    def merge(self, other: 'RunningStats'):
+        if other.count == 0:
+            return
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_squares += other.sum_squares
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.sketch.merge(other.sketch)
@@ -0,0 +1,46 @@
+from shared.services.messaging.chunked_transfer import ChunkAssembler, TransferManifest, split_in_chunks
+
+
+def _assembler(body: bytes, chunk_size: int) -> ChunkAssembler:
+    return ChunkAssembler(TransferManifest(queue='transfer', chunks=-(-len(body) // chunk_size),
+                                           chunk_size=chunk_size, size=len(body)))
+
+
+def test_chunks_in_any_order_rebuild_the_body():
+    body = bytes(range(256)) * 3
+    assembler = _assembler(body, 100)
+    chunks = list(enumerate(split_in_chunks(body, 100)))
+    for index, chunk in reversed(chunks):
+        assert not assembler.is_complete
+        assert assembler.add(index, chunk)
+    assert assembler.is_complete
+    assert assembler.buffer == body
+
+
+def test_duplicated_chunks_are_ignored():
+    body = b'abcdefghij'
+    assembler = _assembler(body, 4)
+    assert assembler.add(0, b'abcd')
+    assert assembler.add(0, b'xxxx')
+    assert not assembler.is_complete
+    assert assembler.add(1, b'efgh') and assembler.add(2, b'ij')
+    assert assembler.buffer == body
+
+
+def test_chunks_that_do_not_match_the_manifest_are_rejected():
+    assembler = _assembler(b'abcdefghij', 4)
+    assert not assembler.add(3, b'kl')
+    assert not assembler.add(-1, b'ij')
+    assert not assembler.add(0, b'abc')
+    assert not assembler.add(2, b'ijkl')  # the last chunk is shorter
+    assert not assembler.is_complete
+
+
+def test_manifest_round_trips_through_the_headers():
+    manifest = TransferManifest(queue='transfer', chunks=3, chunk_size=4, size=10)
+    headers = manifest.to_headers()
+    assert TransferManifest.from_headers(headers) == manifest
+    assert TransferManifest.from_headers({**headers, 'x-dga-transfer-queue': b'transfer'}) \
+        == manifest
+    assert TransferManifest.from_headers({'x-dga-transfer-queue': 'transfer'}) is None
+    assert TransferManifest.from_headers(None) is None
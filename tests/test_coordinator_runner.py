@@ -0,0 +1,82 @@
+import threading
+
+from coordinator.experimenter.coordinator.helpers.dispatch_leases import DispatchLeases
+from coordinator.experimenter.coordinator.helpers.runner import ExperimentCoordinatorRunner
+from coordinator.experimenter.coordinator.implementation import ExperimentCoordinator
+from coordinator.experimenter.experiments.interfaces.iexperiment import IExperiment
+from coordinator.services.storage.implementations.in_memory import InMemoryStorage
+from shared.models.value_objects.individual import IndividualValue
+from shared.utils.promise import Promise
+
+
+class _Experiment(IExperiment):
+    def apply_genetic_operations(self, generation_number, population, _next, _stop):
+        _stop()
+
+
+class _MessageBus:
+    """
+    Message bus and publisher whose queue is always empty
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.generations = []
+        self.resent = threading.Event()
+
+    def listen(self, callback=None):
+        callback()
+
+    @property
+    def pending_deliveries_count(self) -> Promise[int]:
+        promise = Promise[int]()
+        promise.handlers[0](0)
+        return promise
+
+    def start_generation(self, generation_id):
+        self.generations.append(generation_id)
+
+    def broadcast_new_generation_signal(self, generation_id=None):
+        pass
+
+    def send_individuals(self, individuals, cost=None):
+        individuals = list(individuals)
+        self.sent.extend(_id for _id, _ in individuals)
+        if individuals:
+            self.resent.set()
+
+    def add_on_results_received_listener(self, listener):
+        return self
+
+
+def _resumed_experiment():
+    storage = InMemoryStorage()
+    experiment_id, _ = storage.create_experiment('resumed')
+    generation_id = storage.create_generation(experiment_id)
+    storage.store_population(generation_id, [IndividualValue(encoding=[[i]]) for i in range(3)])
+    evaluated, *pending = storage.get_non_evaluated_ids(generation_id)
+    storage.store_individual_fitness(evaluated, 1.0)
+    coordinator = ExperimentCoordinator(experiment_id, _Experiment(), storage,
+                                        leases=DispatchLeases(lease_secs=0.05))
+    return coordinator, pending
+
+
+def test_pending_individuals_are_sent_again_after_resuming():
+    coordinator, pending = _resumed_experiment()
+    bus = _MessageBus()
+    runner = ExperimentCoordinatorRunner(coordinator, bus, bus, monitor_interval_secs=0.01)
+    runner.run(should_await=True)
+    try:
+        assert bus.resent.wait(5)
+    finally:
+        runner.stop_threaded_monitor()
+    assert sorted(bus.sent) == sorted(pending)
+
+
+def test_the_generation_is_started_after_resuming():
+    coordinator, _ = _resumed_experiment()
+    bus = _MessageBus()
+    runner = ExperimentCoordinatorRunner(coordinator, bus, bus, monitor_interval_secs=60)
+    runner.run(should_await=True)
+    runner.stop_threaded_monitor()
+    assert bus.generations == [coordinator.generation_id]
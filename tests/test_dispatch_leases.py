@@ -0,0 +1,98 @@
+import pytest
+
+from coordinator.experimenter.coordinator.helpers import dispatch_leases
+from coordinator.experimenter.coordinator.helpers.dispatch_leases import DispatchLeases
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(dispatch_leases.time, 'monotonic', clock)
+    return clock
+
+
+def test_only_the_expired_leases_are_renewed(clock):
+    leases = DispatchLeases(lease_secs=10)
+    leases.grant([1, 2])
+    clock.now += 5
+    leases.grant([3])
+    clock.now += 5
+    assert leases.expire() == [1, 2]
+    assert leases.expire() == []
+    assert leases.redispatched_count == 2
+
+
+def test_the_lease_grows_with_the_attempts(clock):
+    leases = DispatchLeases(lease_secs=10, backoff=2, max_lease_secs=30)
+    leases.grant([1])
+    expirations = []
+    for _ in range(4):
+        start = clock.now
+        while not leases.expire():
+            clock.now += 1
+        expirations.append(clock.now - start)
+    assert expirations == [10, 20, 30, 30]
+
+
+def test_individuals_past_the_max_attempts_keep_being_sent(clock):
+    leases = DispatchLeases(lease_secs=10, backoff=2, max_attempts=2)
+    leases.grant([1])
+    clock.now += 10
+    assert leases.expire() == [1]  # second attempt, 20 secs
+    assert leases.exhausted_count == 1
+    for _ in range(3):
+        clock.now += 19
+        assert leases.expire() == []
+        clock.now += 1
+        assert leases.expire() == [1]
+    leases.release(1)
+    assert leases.exhausted_count == 0
+
+
+def test_released_leases_do_not_expire(clock):
+    leases = DispatchLeases(lease_secs=10)
+    leases.grant([1, 2])
+    clock.now += 4
+    assert leases.release(1)
+    assert leases.turnaround_secs(1) == 4
+    assert leases.turnaround_secs(2) is None
+    clock.now += 10
+    assert leases.expire() == [2]
+
+
+def test_duplicate_results_are_counted(clock):
+    leases = DispatchLeases()
+    leases.grant([1])
+    assert leases.release(1)
+    assert not leases.release(1)
+    assert not leases.release(2)  # not leased
+    assert leases.duplicate_evaluations == 1
+
+
+def test_the_lease_time_does_not_run_while_paused(clock):
+    leases = DispatchLeases(lease_secs=10)
+    leases.grant([1])
+    leases.pause()
+    clock.now += 100
+    assert leases.expire() == []
+    leases.resume()
+    clock.now += 9
+    assert leases.expire() == []
+    clock.now += 1
+    assert leases.expire() == [1]
+
+
+def test_cleared_leases_are_not_sent_again(clock):
+    leases = DispatchLeases(lease_secs=10)
+    leases.grant([1])
+    leases.clear()
+    clock.now += 10
+    assert leases.expire() == []
@@ -0,0 +1,40 @@
+import os
+
+from coordinator.services.storage.checkpoints.store import GenerationCheckpoints
+from coordinator.services.storage.implementations.in_memory import InMemoryStorage
+from shared.models.value_objects.individual import IndividualValue
+
+
+def _generations(storage, count: int):
+    experiment_id, _ = storage.create_experiment('checkpoints')
+    generation_ids = []
+    for _ in range(count):
+        generation_id = storage.create_generation(experiment_id)
+        storage.store_population(generation_id, [IndividualValue(encoding=[[1, 2]])])
+        generation_ids.append(generation_id)
+    return experiment_id, generation_ids
+
+
+def test_the_latest_generations_are_kept_regardless_of_the_write_time(tmp_path):
+    storage = InMemoryStorage()
+    checkpoints = GenerationCheckpoints(str(tmp_path), keep=2)
+    experiment_id, (first, second, third) = _generations(storage, 3)
+    checkpoints.save(experiment_id, second, storage)
+    checkpoints.save(experiment_id, third, storage)
+    os.utime(checkpoints.path(experiment_id, third), ns=(0, 0))  # e.g. restored from a backup
+    checkpoints.save(experiment_id, first, storage)  # written again after a restart
+    assert [checkpoints.exists(experiment_id, _id) for _id in (first, second, third)] \
+        == [False, True, True]
+
+
+def test_the_iteration_stops_once_the_checkpoint_is_closed(tmp_path):
+    storage = InMemoryStorage()
+    checkpoints = GenerationCheckpoints(str(tmp_path))
+    experiment_id, (generation_id,) = _generations(storage, 1)
+    storage.store_population(generation_id, [IndividualValue(encoding=[[3]])])
+    checkpoints.save(experiment_id, generation_id, storage)
+    checkpoint = checkpoints.open(experiment_id, generation_id)
+    individuals = checkpoint.iter_individuals()
+    assert next(individuals).encoding == [[1, 2]]
+    checkpoint.close()
+    assert list(individuals) == []
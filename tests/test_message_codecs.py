@@ -0,0 +1,38 @@
+import pytest
+
+from shared.services.messaging.codecs.implementations.binary_message_codec import BinaryMessageCodec
+from shared.services.messaging.codecs.implementations.json_message_codec import JsonMessageCodec
+
+
+@pytest.mark.parametrize('body', [b'{"individuals":[1,2]}', b'{"individuals":[[1]]}',
+                                  b'{"individuals":{"1":2}}', b'[1,2]', b'not json'])
+def test_json_rejects_malformed_individuals(body):
+    assert JsonMessageCodec().decode_individuals(body) is None
+
+
+@pytest.mark.parametrize('body', [b'{"results":[[1]]}', b'{"results":[1,2]}',
+                                  b'{"results":[[1,"fit"]]}', b'{"id":1,"fitness":[2]}',
+                                  b'{"id":1}'])
+def test_json_rejects_malformed_results(body):
+    assert JsonMessageCodec().decode_results(body) is None
+
+
+@pytest.mark.parametrize('results', [[(1, 0.5)], [(1, 0.5), ('b', None), (3, 2)]])
+def test_json_results_round_trip(results):
+    codec = JsonMessageCodec()
+    assert codec.decode_results(codec.encode_results(results)) == results
+
+
+def test_binary_keeps_integers_mixed_with_floats():
+    codec = BinaryMessageCodec()
+    individuals = [(1, [[1, 2.5, 3]]), ('b', {'genes': [True, None]})]
+    decoded = codec.decode_individuals(codec.encode_individuals(individuals))
+    assert decoded == individuals
+    assert type(decoded[0][1][0][0]) is int
+
+
+def test_binary_rejects_truncated_messages():
+    codec = BinaryMessageCodec()
+    body = codec.encode_individuals([(1, [[1, 2]]), (2, [[3, 4]])])
+    assert codec.decode_individuals(body[:-3]) is None
+    assert codec.decode_results(body) is None
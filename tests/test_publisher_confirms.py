@@ -0,0 +1,141 @@
+import threading
+
+import pytest
+from pika.spec import Basic
+
+from shared.services.messaging.publisher_confirms import PublisherConfirms, PublishDispatch
+
+
+class _Frame:
+    def __init__(self, method):
+        self.method = method
+
+
+class _Channel:
+    def __init__(self):
+        self.published = []
+        self.on_confirmation = None
+
+    def confirm_delivery(self, ack_nack_callback):
+        self.on_confirmation = ack_nack_callback
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append(body)
+
+    def ack(self, delivery_tag: int, multiple=False):
+        self.on_confirmation(_Frame(Basic.Ack(delivery_tag=delivery_tag, multiple=multiple)))
+
+    def nack(self, delivery_tag: int, multiple=False):
+        self.on_confirmation(_Frame(Basic.Nack(delivery_tag=delivery_tag, multiple=multiple)))
+
+
+@pytest.fixture
+def channel():
+    return _Channel()
+
+
+def _publish(confirms: PublisherConfirms, *bodies: bytes, dispatch: PublishDispatch | None = None):
+    for body in bodies:
+        confirms.reserve()
+        confirms.publish('', 'queue', body, dispatch=dispatch)
+
+
+def test_messages_beyond_the_window_wait_in_the_backlog(channel):
+    confirms = PublisherConfirms(window=2)
+    confirms.attach(channel)
+    _publish(confirms, b'1', b'2', b'3')
+    assert channel.published == [b'1', b'2']
+    assert (confirms.in_flight_count, confirms.backlog_count) == (2, 1)
+    channel.ack(1)
+    assert channel.published == [b'1', b'2', b'3']
+    assert confirms.backlog_count == 0
+
+
+def test_the_dispatch_is_resolved_once_every_message_is_confirmed(channel):
+    confirms = PublisherConfirms(window=10)
+    confirms.attach(channel)
+    dispatch = PublishDispatch()
+    _publish(confirms, b'1', b'2', b'3', dispatch=dispatch)
+    dispatch.seal()
+    channel.ack(2, multiple=True)
+    assert not dispatch.future.done()
+    channel.ack(3)
+    assert dispatch.future.result(0) is None
+    assert confirms.in_flight_count == 0
+
+
+def test_only_the_rejected_messages_are_published_again(channel):
+    confirms = PublisherConfirms(window=10, max_retransmissions=1)
+    confirms.attach(channel)
+    dispatch = PublishDispatch()
+    _publish(confirms, b'1', b'2', dispatch=dispatch)
+    dispatch.seal()
+    channel.ack(1)
+    channel.nack(2)
+    assert channel.published == [b'1', b'2', b'2']
+    assert confirms.retransmitted_count == 1
+    channel.nack(3)
+    with pytest.raises(ConnectionError):
+        dispatch.future.result(0)
+
+
+def test_nothing_is_published_while_blocked(channel):
+    confirms = PublisherConfirms(window=10)
+    confirms.attach(channel)
+    confirms.block()
+    _publish(confirms, b'1', b'2')
+    assert channel.published == []
+    assert confirms.backlog_count == 2
+    confirms.unblock()
+    assert channel.published == [b'1', b'2']
+
+
+def test_the_unconfirmed_messages_fail_when_the_channel_closes(channel):
+    confirms = PublisherConfirms(window=1)
+    confirms.attach(channel)
+    dispatch = PublishDispatch()
+    _publish(confirms, b'1', b'2', dispatch=dispatch)
+    confirms.fail(ConnectionError('closed'))
+    with pytest.raises(ConnectionError):
+        dispatch.future.result(0)
+    assert (confirms.in_flight_count, confirms.backlog_count) == (0, 0)
+
+
+def test_senders_wait_while_the_backlog_is_full(channel):
+    confirms = PublisherConfirms(window=1, max_backlog=1)
+    confirms.attach(channel)  # this thread is the ioloop
+    _publish(confirms, b'1', b'2')
+    reserved = threading.Event()
+
+    def send():
+        confirms.reserve()
+        reserved.set()
+
+    sender = threading.Thread(target=send, daemon=True)
+    sender.start()
+    assert not reserved.wait(0.2)
+    channel.ack(1)
+    assert reserved.wait(5)
+    sender.join(5)
+
+
+def test_the_ioloop_does_not_wait_for_room(channel):
+    confirms = PublisherConfirms(window=1, max_backlog=1)
+    confirms.attach(channel)
+    _publish(confirms, b'1', b'2', b'3')  # beyond the backlog, but on the ioloop
+    assert confirms.backlog_count == 2
+
+
+def test_a_send_larger_than_the_capacity_waits_for_the_previous_ones(channel):
+    confirms = PublisherConfirms(window=1, max_backlog=1)
+    confirms.attach(channel)
+    reserved = threading.Event()
+
+    def send():
+        confirms.reserve(5)
+        reserved.set()
+
+    sender = threading.Thread(target=send, daemon=True)
+    sender.start()
+    assert reserved.wait(5)  # nothing else is pending
+    sender.join(5)
@@ -0,0 +1,125 @@
+import math
+import random
+
+import pytest
+
+from shared.utils.quantile_sketch import QuantileSketch
+from shared.utils.running_stats import RunningStats
+
+QUANTILES = (0, 0.01, 0.25, 0.5, 0.75, 0.99, 1)
+
+
+def exact_quantile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[math.floor(q * (len(ordered) - 1))]
+
+
+def assert_within_accuracy(sketch: QuantileSketch, values, quantiles=QUANTILES):
+    for q in quantiles:
+        expected = exact_quantile(values, q)
+        assert sketch.quantile(q) == pytest.approx(expected, rel=sketch.relative_accuracy), q
+
+
+def sketch_of(values, **kwargs) -> QuantileSketch:
+    sketch = QuantileSketch(**kwargs)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_empty_sketch_has_no_quantiles():
+    sketch = QuantileSketch()
+    assert sketch.count == 0
+    assert sketch.quantile(0.5) is None
+
+
+@pytest.mark.parametrize('q', [-0.1, 1.1])
+def test_quantile_must_be_between_0_and_1(q):
+    with pytest.raises(ValueError):
+        sketch_of([1.0]).quantile(q)
+
+
+@pytest.mark.parametrize('relative_accuracy', [0, 1])
+def test_relative_accuracy_must_be_between_0_and_1(relative_accuracy):
+    with pytest.raises(ValueError):
+        QuantileSketch(relative_accuracy)
+
+
+def test_quantiles_are_within_the_relative_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(0, 2) for _ in range(10000)]
+    sketch = sketch_of(values)
+    assert sketch.count == len(values)
+    assert_within_accuracy(sketch, values)
+
+
+def test_negative_values_and_zeros():
+    values = [-100.0, -5.0, -1.0, 0.0, 0.0, 1e-15, 2.0, 50.0]
+    sketch = sketch_of(values)
+    assert sketch.quantile(0.5) == 0.0
+    assert_within_accuracy(sketch, values, quantiles=(0, 0.2, 0.8, 1))
+
+
+def test_counts_are_weighted():
+    sketch = QuantileSketch()
+    sketch.add(1.0, count=9)
+    sketch.add(1000.0)
+    assert sketch.count == 10
+    assert sketch.quantile(0.5) == pytest.approx(1.0, rel=0.01)
+    assert sketch.quantile(1) == pytest.approx(1000.0, rel=0.01)
+
+
+def test_merge_is_the_sketch_of_both_streams():
+    rng = random.Random(11)
+    first = [rng.uniform(-10, 100) for _ in range(3000)]
+    second = [rng.uniform(50, 500) for _ in range(2000)]
+    merged = sketch_of(first)
+    merged.merge(sketch_of(second))
+    combined = sketch_of(first + second)
+    assert merged.count == combined.count
+    for q in QUANTILES:
+        assert merged.quantile(q) == combined.quantile(q)
+
+
+def test_only_sketches_with_the_same_accuracy_are_merged():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_bytes_round_trip():
+    rng = random.Random(3)
+    values = [rng.gauss(0, 50) for _ in range(5000)] + [0.0] * 10
+    sketch = sketch_of(values, relative_accuracy=0.02)
+    restored = QuantileSketch.from_bytes(sketch.to_bytes())
+    assert restored.count == sketch.count
+    assert restored.relative_accuracy == sketch.relative_accuracy
+    assert restored.max_buckets == sketch.max_buckets
+    for q in QUANTILES:
+        assert restored.quantile(q) == sketch.quantile(q)
+
+
+def test_unknown_version_is_rejected():
+    data = bytearray(QuantileSketch().to_bytes())
+    data[0] = 99
+    with pytest.raises(ValueError):
+        QuantileSketch.from_bytes(bytes(data))
+
+
+def test_collapsing_keeps_the_highest_quantiles_accurate():
+    values = [10 ** (i / 100) for i in range(1000)]  # spans 10 orders of magnitude
+    sketch = sketch_of(values, max_buckets=64)
+    assert sketch.count == len(values)
+    assert_within_accuracy(sketch, values, quantiles=(0.95, 0.99, 1))
+    assert sketch.quantile(0) > values[0]  # the lowest buckets were collapsed
+
+
+@pytest.mark.parametrize('value', [math.inf, -math.inf, math.nan])
+def test_non_finite_values_are_skipped(value):
+    sketch = sketch_of([1.0, 2.0])
+    sketch.add(value)
+    assert sketch.count == 2
+    assert sketch.quantile(1) == pytest.approx(2.0, rel=0.01)
+    stats = RunningStats()
+    for score in (1.0, value, 3.0):
+        stats.add(score)
+    assert (stats.count, stats.sum, stats.min, stats.max) == (2, 4.0, 1.0, 3.0)
@@ -0,0 +1,87 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from coordinator.services.storage.implementations.sqlite.sqlite import SqliteStorage
+from shared.models.value_objects.individual import IndividualValue
+
+SQLITE_DIR = Path(__file__).resolve().parent.parent / 'coordinator' / 'services' / 'storage' \
+    / 'implementations' / 'sqlite'
+
+
+def latest_migration() -> int:
+    return max(int(name.split('_', 1)[0]) for name in os.listdir(SQLITE_DIR / 'migrations')
+               if name.endswith('.sql'))
+
+
+@pytest.fixture
+def legacy_database(tmp_path) -> str:
+    """
+    A database written before the migrations: encodings stored as JSON text and no counters
+    """
+    database = str(tmp_path / 'legacy.db')
+    con = sqlite3.connect(database)
+    con.executescript((SQLITE_DIR / 'setup.sql').read_text())
+    con.execute("INSERT INTO experiments (name) VALUES ('legacy')")
+    con.executemany('INSERT INTO generations (experiment_id) VALUES (?)', [(1,), (1,)])
+    con.executemany('INSERT INTO individuals (generation_id, encoding, fitness) VALUES (?, ?, ?)', [
+        (1, json.dumps([[1, 2], [3, 4]]), 0.5),
+        (1, json.dumps([[1, 2], [3, 4]]), 0.7),
+        (2, json.dumps([[5, 6]]), None),
+        (2, json.dumps([[7.5, 8]]), 0.9),
+    ])
+    con.commit()
+    con.close()
+    return database
+
+
+def test_migrations_reach_the_latest_version(legacy_database):
+    SqliteStorage(legacy_database)
+    con = sqlite3.connect(legacy_database)
+    assert con.execute('PRAGMA user_version').fetchone()[0] == latest_migration()
+
+
+def test_generation_counters_are_backfilled(legacy_database):
+    storage = SqliteStorage(legacy_database)
+    assert storage.count_generations(1) == 2
+    assert storage.get_latest_generation_id(1) == 2
+    generation_id = storage.create_generation(1)
+    assert storage.count_generations(1) == 3
+    assert storage.get_latest_generation_id(1) == generation_id
+
+
+def test_legacy_encodings_are_readable(legacy_database):
+    storage = SqliteStorage(legacy_database)
+    population = storage.get_population(1)
+    assert [(ind.id, ind.encoding, ind.fitness) for ind in population] == [
+        (1, [[1, 2], [3, 4]], 0.5),
+        (2, [[1, 2], [3, 4]], 0.7),
+    ]
+    assert storage.get_non_evaluated_ids(2) == [3]
+    assert storage.get_individual(4).encoding == [[7.5, 8]]
+
+
+def test_migrations_are_applied_once(legacy_database):
+    SqliteStorage(legacy_database).create_generation(1)
+    storage = SqliteStorage(legacy_database)
+    assert storage.count_generations(1) == 3
+    assert len(storage.get_population(1)) == 2
+
+
+def test_statistics_and_hall_of_fame_are_backfilled(legacy_database):
+    storage = SqliteStorage(legacy_database)
+    first, second = storage.get_generation_stats(1)
+    assert (first.count, first.min, first.max) == (2, 0.5, 0.7)
+    assert second.count == 1
+    assert [ind.id for ind in storage.get_top_k(1, 2)] == [4, 2]
+
+
+def test_legacy_genomes_hash_like_new_writes(legacy_database):
+    storage = SqliteStorage(legacy_database)
+    generation_id = storage.create_generation(1)
+    storage.store_population(generation_id, [IndividualValue(encoding=[[1, 2], [3, 4]])])
+    con = sqlite3.connect(legacy_database)
+    assert con.execute('SELECT COUNT(*) FROM genomes').fetchone()[0] == 3
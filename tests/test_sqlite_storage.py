@@ -0,0 +1,91 @@
+import math
+
+import pytest
+
+from coordinator.services.storage.implementations.in_memory import InMemoryStorage
+from coordinator.services.storage.implementations.sqlite.sharded import ShardedSqliteStorage
+from coordinator.services.storage.implementations.sqlite.sqlite import SqliteStorage
+from coordinator.services.storage.retention import RetentionPolicy
+from shared.models.value_objects.individual import IndividualValue, IndividualFitnessValue
+
+
+def test_individuals_sharing_a_genome_have_independent_encodings():
+    storage = SqliteStorage(':memory:')
+    experiment_id, _ = storage.create_experiment('shared genomes')
+    generation_id = storage.create_generation(experiment_id)
+    storage.store_population(generation_id, [IndividualValue(encoding=[[1, 2]]),
+                                             IndividualValue(encoding=[[1, 2]])])
+    first, second = storage.get_population(generation_id)
+    first.encoding[0][0] = 9
+    assert second.encoding == [[1, 2]]
+    assert [ind.encoding for ind in storage.get_population(generation_id)] == [[[1, 2]], [[1, 2]]]
+
+
+def _population(storage, size: int):
+    experiment_id, _ = storage.create_experiment('scores')
+    generation_id = storage.create_generation(experiment_id)
+    storage.store_population(generation_id, [IndividualValue(encoding=[[i]]) for i in range(size)])
+    return experiment_id, generation_id, storage.get_non_evaluated_ids(generation_id)
+
+
+@pytest.mark.parametrize('create_storage', [lambda: SqliteStorage(':memory:'), InMemoryStorage])
+def test_infinite_scores_are_stored_and_left_out_of_the_stats(create_storage):
+    storage = create_storage()
+    experiment_id, generation_id, ids = _population(storage, 3)
+    for individual_id, fitness in zip(ids, (1.0, math.inf, -math.inf)):
+        storage.store_individual_fitness(individual_id, fitness)
+    storage.flush()
+    assert storage.get_non_evaluated_ids(generation_id) == []
+    stats, = storage.get_generation_stats(experiment_id)
+    assert (stats.count, stats.min, stats.max) == (1, 1.0, 1.0)
+
+
+def test_nan_scores_are_left_out_of_the_stats():
+    storage = InMemoryStorage()
+    experiment_id, generation_id, ids = _population(storage, 2)
+    storage.store_fitness_batch([IndividualFitnessValue(ids[0], math.nan),
+                                 IndividualFitnessValue(ids[1], 2.0)])
+    assert storage.get_non_evaluated_ids(generation_id) == []
+    stats, = storage.get_generation_stats(experiment_id)
+    assert (stats.count, stats.sum) == (1, 2.0)
+
+
+def test_a_failed_flush_keeps_the_buffered_scores(monkeypatch):
+    storage = SqliteStorage(':memory:')
+    _, generation_id, ids = _population(storage, 2)
+    for individual_id in ids:
+        storage.store_individual_fitness(individual_id, 1.0)
+
+    def fail(_):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(storage, 'store_fitness_batch', fail)
+    with pytest.raises(RuntimeError):
+        storage.flush()
+    monkeypatch.undo()
+    storage.flush()
+    assert storage.get_non_evaluated_ids(generation_id) == []
+
+
+def test_retention_counts_the_generations_of_every_shard(tmp_path):
+    storage = ShardedSqliteStorage(str(tmp_path / 'shards'), generations_per_shard=2,
+                                   retention=RetentionPolicy(hot_generations=2,
+                                                             archive_dir=str(tmp_path / 'archive')))
+    experiment_id, _ = storage.create_experiment('sharded retention')
+    for _ in range(5):
+        generation_id = storage.create_generation(experiment_id)
+        storage.store_population(generation_id, [IndividualValue(encoding=[[1]])])
+    storage.apply_retention(experiment_id)
+    archived = [shard.con.execute('SELECT count(*) FROM archived_generations').fetchone()[0]
+                for shard in storage._storages.values()]
+    assert archived == [2, 1, 0]  # only generations 4 and 5 are hot
+
+
+@pytest.mark.parametrize('create_storage', [lambda: SqliteStorage(':memory:'), InMemoryStorage])
+def test_decreasing_ranges_of_generations_are_rejected(create_storage):
+    storage = create_storage()
+    experiment_id, _, _ = _population(storage, 1)
+    with pytest.raises(ValueError):
+        storage.get_generation_stats(experiment_id, range(1, 0, -1))
+    with pytest.raises(ValueError):
+        storage.get_top_k(experiment_id, 1, range(1, 0, -1))
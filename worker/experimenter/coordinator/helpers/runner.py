@@ -1,7 +1,7 @@
 from concurrent.futures import ThreadPoolExecutor
 from queue import Queue
 from threading import Thread, Event
-from typing import TypeVar, Generic, List
+from typing import TypeVar, Generic, List, Tuple
 
 from shared.annotations.custom import UUID
 from shared.models.entities.individual import IndividualEntity
@@ -79,12 +79,14 @@ class LocalCoordinatorRunner(Generic[T]):
 
         experiment_coordinator.is_busy \
             .observe(lambda it_is, _: message_bus.pause() if it_is else message_bus.resume())
+        experiment_coordinator.sample_size \
+            .observe(lambda size, _: message_bus.set_prefetch(size), trigger_now=True)
         experiment_coordinator.add_on_evaluation_complete_listener(self.__send_tested_sample)
 
         message_bus \
-            .add_on_individual_received_listener(self.__add_incoming_individual)
+            .add_on_individuals_received_listener(self.__add_incoming_individuals)
         pubsub_sub \
-            .add_on_new_generation_listener(experiment_coordinator.reset) \
+            .add_on_new_generation_listener(self.__discard_sample) \
             .add_on_experiment_termination_listener(experiment_coordinator.stop)
 
     @global_thread_safe
@@ -95,14 +97,24 @@ class LocalCoordinatorRunner(Generic[T]):
 
     @global_thread_safe
     @safe_pause_coordinator_thread
-    def __add_incoming_individual(self, _id: UUID, encoding: T):
-        individual = IndividualEntity(_id, encoding)
-        self.experiment_coordinator.add_untested_individual(individual)
+    def __add_incoming_individuals(self, individuals: List[Tuple[UUID, T]]) -> bool:
+        # Rejected while busy, the bus holds them until it is resumed
+        return self.experiment_coordinator.add_untested_individuals(
+            [IndividualEntity(_id, encoding) for _id, encoding in individuals])
 
     @global_thread_safe
     def __send_tested_sample(self, sample: List[IndividualEntity]):
-        for ind in sample:
-            self.message_bus.send_result(ind.id, ind.fitness)
+        secs = self.experiment_coordinator.evaluation_secs
+        self.message_bus.send_results(
+            [(ind.id, ind.fitness) for ind in sample],
+            evaluation_secs=secs / len(sample) if secs is not None and sample else None)
+        self.message_bus.acknowledge_individuals()
+
+    @global_thread_safe
+    def __discard_sample(self):
+        self.experiment_coordinator.reset()
+        # The individuals of the previous generation are not needed anymore
+        self.message_bus.acknowledge_individuals()
 
     @global_thread_safe
     def __monitor(self):
@@ -22,12 +22,14 @@ class LocalExperimentCoordinator(Generic[T]):
         :param execution_delay_secs: max time to wait before running the callback if the sample
          received smaller to the expected
         """
-        self._sample_size = sample_size
+        self._sample_size = ObservableScalar[int](sample_size)
         self._evaluator = evaluator
         self._local_sample: List[IndividualEntity[T]] = []
         self._exec_delay = execution_delay_secs
         self._is_monitoring = False
         self._iteration_start_time: float | None = None
+        self._evaluation_start_time: float | None = None
+        self._evaluation_secs: float | None = None
         self._is_busy = ObservableScalar[bool](False)
         self._is_terminated = ObservableScalar[bool](False)
         self._evaluation_complete_listeners = EventListener[OnEvaluationCompleteCb[T]]()
@@ -40,6 +42,21 @@ class LocalExperimentCoordinator(Generic[T]):
     def is_terminated(self):
         return self._is_terminated
 
+    @property
+    def sample_size(self):
+        """
+        Observable maximum number of individuals evaluated per iteration, it can be changed
+        while running
+        """
+        return self._sample_size
+
+    @property
+    def evaluation_secs(self) -> float | None:
+        """
+        :return: the secs the latest sample took to be evaluated, None until one is evaluated
+        """
+        return self._evaluation_secs
+
     @property
     def _is_ready_to_execute(self):
         sample_count = len(self._local_sample)
@@ -48,6 +65,7 @@ class LocalExperimentCoordinator(Generic[T]):
     def execute(self):
         if self._is_ready_to_execute:
             self._is_busy.value = True
+            self._evaluation_start_time = time.monotonic()
             Thread(target=self._evaluator.evaluate_sample,
                    args=(self._local_sample, self.__complete_experimentation,),
                    daemon=True
@@ -65,11 +83,28 @@ class LocalExperimentCoordinator(Generic[T]):
     def add_untested_individual(self, individual: IndividualEntity[T]):
         if self._is_busy.value:
             return
-        if len(self._local_sample) < self._sample_size:
+        if len(self._local_sample) < self._sample_size.value:
             self._local_sample.append(individual)
             self.__refresh_iteration_start_time()
-        if len(self._local_sample) >= self._sample_size:
+        if len(self._local_sample) >= self._sample_size.value:
+            self.execute()
+
+    def add_untested_individuals(self, individuals: List[IndividualEntity[T]]) -> bool:
+        """
+        Adds all the individuals, even if the sample gets bigger than the sample size, so none
+        of the individuals received in the same message is lost
+        :param individuals:
+        :return: False if the individuals were not added because a sample is being evaluated
+        """
+        if self._is_busy.value:
+            return False
+        if not individuals:
+            return True
+        self._local_sample.extend(individuals)
+        self.__refresh_iteration_start_time()
+        if len(self._local_sample) >= self._sample_size.value:
             self.execute()
+        return True
 
     def timeout(self) -> bool:
         if not self._is_ready_to_execute or self._is_busy.value:
@@ -87,6 +122,7 @@ class LocalExperimentCoordinator(Generic[T]):
         self._evaluation_complete_listeners.add_listener(listener)
 
     def __complete_experimentation(self, tested_sample: List[IndividualEntity[T]]):
+        self._evaluation_secs = time.monotonic() - self._evaluation_start_time
         self._evaluation_complete_listeners(tested_sample)
         self.reset()
         self._is_busy.value = False
@@ -1,7 +1,9 @@
 from abc import ABC
-from typing import TypeVar, Generic
+from typing import TypeVar, Generic, List, Tuple
 
-from worker.services.messaging.bus.interfaces.imessage_bus import IndividualReceivedListenerCb, IMessageBus
+from shared.annotations.custom import UUID
+from worker.services.messaging.bus.interfaces.imessage_bus import IndividualReceivedListenerCb, IMessageBus, \
+    IndividualsReceivedListenerCb
 from shared.utils.event_listener import EventListener
 
 T = TypeVar('T')
@@ -10,7 +12,25 @@ T = TypeVar('T')
 class MessageBusListeners(IMessageBus[T], ABC, Generic[T]):
     def __init__(self):
         self.individual_received_listeners = EventListener()
+        self.individuals_received_listeners = EventListener()
 
     def add_on_individual_received_listener(self, listener: IndividualReceivedListenerCb[T]):
         self.individual_received_listeners.add_listener(listener)
         return self
+
+    def add_on_individuals_received_listener(self, listener: IndividualsReceivedListenerCb[T]):
+        self.individuals_received_listeners.add_listener(listener)
+        return self
+
+    def _notify_individuals_received(self, individuals: List[Tuple[UUID, T]]) -> bool:
+        """
+        :return: False if a listener rejected the individuals, then they must be passed again
+        later
+        """
+        if self.individuals_received_listeners.listeners:
+            # Every listener is notified, even after one of them rejects the individuals
+            return all([listener(individuals) is not False
+                        for listener in self.individuals_received_listeners.listeners])
+        for individual_id, encoding in individuals:
+            self.individual_received_listeners(individual_id, encoding)
+        return True
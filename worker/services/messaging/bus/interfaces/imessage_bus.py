@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Generic, Callable, TypeVar, TypeAlias
+from typing import Generic, Callable, TypeVar, TypeAlias, List, Tuple, Sequence
 
 from shared.annotations.custom import UUID, FitnessScore
 from shared.services.messaging.bus.interfaces.imessage_bus import IMessageBusControls
@@ -7,6 +7,7 @@ from shared.services.messaging.bus.interfaces.imessage_bus import IMessageBusCon
 T = TypeVar('T')
 
 IndividualReceivedListenerCb: TypeAlias = Callable[[UUID, T], any]
+IndividualsReceivedListenerCb: TypeAlias = Callable[[List[Tuple[UUID, T]]], any]
 SignalListenerCb: TypeAlias = Callable[[], any]
 
 
@@ -15,6 +16,46 @@ class IMessageBus(IMessageBusControls, ABC, Generic[T]):
     def send_result(self, individual_id: UUID, fitness: FitnessScore):
         raise NotImplementedError
 
+    @abstractmethod
+    def send_results(self, results: Sequence[Tuple[UUID, FitnessScore]],
+                     evaluation_secs: float | None = None):
+        """
+        Sends the fitness scores of a whole evaluated sample in a single message
+        :param results: pairs of individual id and fitness score
+        :param evaluation_secs: the secs spent evaluating each individual on average, sent
+        along with the results so the coordinator can learn how expensive they are
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_prefetch(self, individuals_count: int):
+        """
+        Sets how many individuals can be delivered to the worker without being acknowledged
+        :param individuals_count:
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def acknowledge_individuals(self):
+        """
+        Acknowledges all the individuals delivered so far. It should be called once they are
+        evaluated (or discarded), so they are delivered to another worker if this one stops
+        before
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def add_on_individual_received_listener(self, listener: IndividualReceivedListenerCb[T]):
         return self
+
+    @abstractmethod
+    def add_on_individuals_received_listener(self, listener: IndividualsReceivedListenerCb[T]):
+        """
+        Listeners receive all the individuals of a message (an envelope) at once, as pairs of
+        id and encoding. If there are no such listeners, the individuals are passed one by one
+        to the individual received listeners.
+        A listener returns False to reject the individuals, e.g. while the worker is busy, then
+        they are not acknowledged and are passed again once the bus is resumed
+        :param listener:
+        """
+        return self
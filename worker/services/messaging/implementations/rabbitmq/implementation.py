@@ -1,8 +1,16 @@
-import json
-from typing import TypeVar, Generic, Tuple
+import math
+from concurrent.futures import Future
+from dataclasses import dataclass
+from threading import Lock
+from typing import TypeVar, Generic, Sequence, Tuple, List, Dict
 
 from shared.annotations.custom import UUID, FitnessScore
-from shared.services.messaging.implementations.rabbitmq import RabbitMqMessagingBaseControls, PausableQueue
+from shared.services.messaging.chunked_transfer import TransferManifest, ChunkAssembler, CHUNK_HEADER
+from shared.services.messaging.codecs.interfaces.imessage_codec import IMessageCodec
+from shared.services.messaging.command_queue import on_ioloop
+from shared.services.messaging.compression.payload_compressor import PayloadCompressor
+from shared.services.messaging.implementations.rabbitmq import RabbitMqMessagingBaseControls, PausableQueue, \
+    GENERATION_HEADER, EVALUATION_SECS_HEADER
 from worker.services.messaging.bus.abstract.message_bus_listeners import MessageBusListeners
 from worker.services.messaging.bus.interfaces.imessage_bus import IMessageBus
 from worker.services.messaging.implementations.rabbitmq.utils.setup_queues import create_temporal_exchange_queue
@@ -11,7 +19,12 @@ from worker.services.messaging.pubsub.subscriber.interfaces.ipubsub_subscriber i
 
 T = TypeVar('T')
 
-COUNT = 0
+
+@dataclass
+class _Transfer:
+    properties: any  # of the manifest, they describe the whole body
+    assembler: ChunkAssembler
+    consumer_tag: str | None = None  # None until the chunks are consumed
 
 
 class RabbitMqMessaging(RabbitMqMessagingBaseControls,
@@ -19,22 +32,129 @@ class RabbitMqMessaging(RabbitMqMessagingBaseControls,
                         IMessageBus[T], IPubSubSubscriber,
                         Generic[T]):
 
-    def __init__(self, connection_string: str, experiment_id: UUID):
-        RabbitMqMessagingBaseControls.__init__(self, connection_string, experiment_id)
+    def __init__(self, connection_string: str, experiment_id: UUID, prefetch: int | None = None,
+                 qos_backpressure: bool = True, message_codec: IMessageCodec[T] | None = None,
+                 compressor: PayloadCompressor | None = None, transfer_timeout: float = 60):
+        """
+        :param connection_string:
+        :param experiment_id:
+        :param prefetch: max number of individuals delivered and not acknowledged. If not
+        provided, it follows the values given to set_prefetch (the sample size of the worker)
+        :param qos_backpressure: if True, pause and resume keep the consumer and rely on the
+        prefetch window instead: since the individuals are acknowledged after the evaluation,
+        a full window stops the deliveries by itself, otherwise the window is shrunk while
+        paused. Messages delivered while paused are held and passed to the listeners on
+        resume. If False, the consumer is cancelled and created again
+        :param message_codec: the codec of the results sent, JSON if not provided. Received
+        messages are decoded according to their content type
+        :param compressor: compresses the results larger than its threshold. Compressed
+        individuals received are decompressed either way
+        :param transfer_timeout: max secs to receive every chunk of a message split by the
+        coordinator, incomplete transfers are discarded afterwards
+        """
+        RabbitMqMessagingBaseControls.__init__(self, connection_string, experiment_id,
+                                               message_codec=message_codec, compressor=compressor)
         MessageBusListeners.__init__(self)
         PusSubSubscriberListeners.__init__(self)
         self.ex_id = experiment_id
+        self._is_prefetch_fixed = prefetch is not None
+        self._prefetch_individuals = max(1, prefetch or 1)
+        self._envelope_size = 1  # individuals per message, as seen in the latest delivery
+        self._last_delivery_tag: int | None = None
+        self._unacked_count = 0  # messages delivered since the latest acknowledgement
+        self._qos_backpressure = qos_backpressure
+        self._is_paused = False
+        self._is_window_shrunk = False
+        self._is_consumer_cancelled = False  # paused without qos_backpressure
+        # The generation announced by the coordinator, its queue is the one consumed
+        self._generation_id: UUID | None = None
+        # The generation each individual was delivered with, its result is tagged with it.
+        # Only the individuals of the current and previous generations are kept
+        self._individual_generations: Dict[UUID, UUID] = {}
+        self._generations_lock = Lock()
+        # Messages delivered while paused or rejected by the listeners: delivery tag (None if
+        # already acknowledged) and individuals
+        self._held_messages: List[Tuple[int | None, List[Tuple[UUID, T]]]] = []
+        self._consumer_channel = None
+        # Chunked transfers in progress by the queue of their chunks
+        self._transfers: Dict[str, _Transfer] = {}
+        self._transfer_timeout = transfer_timeout
+        self._transfer_channel = None
+
+    def send_result(self, individual_id: UUID, fitness: FitnessScore) -> Future:
+        return self.send_results([(individual_id, fitness)])
+
+    def send_results(self, results: Sequence[Tuple[UUID, FitnessScore]],
+                     evaluation_secs: float | None = None) -> Future | None:
+        """
+        The results are sent in a message per generation they were delivered with
+        :return: the future of the latest message
+        """
+        if not results:
+            return None
+        by_generation: Dict[UUID | None, List[Tuple[UUID, FitnessScore]]] = {}
+        with self._generations_lock:
+            for individual_id, fitness in results:
+                generation_id = self._individual_generations.pop(individual_id, None)
+                by_generation.setdefault(generation_id, []).append((individual_id, fitness))
+        future = None
+        for generation_id, generation_results in by_generation.items():
+            headers = {}
+            if generation_id is not None:
+                headers[GENERATION_HEADER] = generation_id
+            if evaluation_secs is not None:
+                headers[EVALUATION_SECS_HEADER] = evaluation_secs
+            future = self._publish_payload(
+                self.results_q, self._message_codec.encode_results(generation_results), headers)
+        return future
+
+    def set_prefetch(self, individuals_count: int):
+        if self._is_prefetch_fixed or individuals_count == self._prefetch_individuals:
+            return
+        # Set right away, a consumer channel opened later already uses it
+        self._prefetch_individuals = max(1, individuals_count)
+        self._commands.submit(self.__apply_prefetch)
 
-    def send_result(self, individual_id: UUID, fitness: FitnessScore):
-        msg = {'id': individual_id, 'fitness': fitness}
-        msg_json = json.dumps(msg)
-        self.channel.basic_publish(exchange='', body=msg_json,
-                                   routing_key=self.results_q)
+    @on_ioloop
+    def acknowledge_individuals(self):
+        if self._last_delivery_tag is None or not self.__is_consuming:
+            return
+        # Acknowledges every message delivered up to the latest one
+        self._consumer_channel.basic_ack(delivery_tag=self._last_delivery_tag, multiple=True)
+        self._last_delivery_tag = None
+        self._unacked_count = sum(1 for tag, _ in self._held_messages if tag is not None)
+
+    @on_ioloop
+    def pause(self):
+        if not self._qos_backpressure:
+            self._is_consumer_cancelled = True
+            super().pause()
+            return
+        self._is_paused = True
+        # A full window already stops the deliveries, otherwise no more than the messages that
+        # are not acknowledged yet are allowed (the broker ignores a prefetch of 0)
+        if self.__is_consuming and self._unacked_count < self.__prefetch_count:
+            self._consumer_channel.basic_qos(prefetch_count=max(1, self._unacked_count),
+                                             global_qos=True)
+            self._is_window_shrunk = True
+
+    @on_ioloop
+    def resume(self):
+        if not self._qos_backpressure:
+            self._is_consumer_cancelled = False
+            super().resume()
+        else:
+            self._is_paused = False
+            if self._is_window_shrunk:
+                self._is_window_shrunk = False
+                self.__apply_prefetch()
+        # The messages held while paused, or rejected by the listeners before the pause
+        held, self._held_messages = self._held_messages, []
+        for delivery_tag, individuals in held:
+            self.__on_individuals(delivery_tag, individuals)
 
     def on_channel_open(self, channel):
         self.channel = channel
-        # Consume one message at a time
-        channel.basic_qos(prefetch_count=1, callback=lambda _: self.__setup_queues(channel))
         # Setup exchanges
         # new generation signal
         channel.exchange_declare(exchange=self.new_gen_ex,
@@ -42,18 +162,15 @@ class RabbitMqMessaging(RabbitMqMessagingBaseControls,
         # experiment termination signal
         channel.exchange_declare(exchange=self.termination_ex,
                                  exchange_type='fanout')
+        self.__setup_queues(channel)
 
     def __setup_queues(self, channel):
-        # Setup queues
-        channel.queue_declare(queue=self.results_q)
-        channel.queue_declare(queue=self.individuals_q)
-        ind_q_bc_params = {
-            'queue': self.individuals_q,
-            'on_message_callback': self.__on_individual_received_msg
-        }
-        c_tag = channel.basic_consume(**ind_q_bc_params)
-        self.pausable_queues.append(PausableQueue(consumer_tag=c_tag,
-                                                  basic_consume_params=ind_q_bc_params))
+        # Setup queues. The individuals are consumed on their own channel, so its prefetch
+        # window (shared by the consumers of the channel) only limits them and can be changed
+        # while consuming
+        channel.queue_declare(queue=self.results_q,
+                              callback=lambda _: self.connection.channel(
+                                  on_open_callback=self.__on_consumer_channel_open))
         # setup temporal, exclusive receiver queues for exchanges
         create_temporal_exchange_queue(channel, exchange_name=self.new_gen_ex) \
             .then(lambda q_name: channel
@@ -68,28 +185,199 @@ class RabbitMqMessaging(RabbitMqMessagingBaseControls,
         if self._is_fully_initialized:
             self._call_start_callback()
 
-    def __on_individual_received_msg(self, channel, method, _, body):
-        ind = self.__message_parser(body)
-        if ind:
-            self.individual_received_listeners(ind[0], ind[1])
+    def __on_consumer_channel_open(self, channel):
+        self._consumer_channel = channel
+        self._last_delivery_tag = None  # delivery tags are scoped to the channel
+        self._unacked_count = 0
+        # they will be redelivered, except the chunked transfers that are already acknowledged
+        self._held_messages = [(tag, inds) for tag, inds in self._held_messages if tag is None]
+        self._is_window_shrunk = False
+        # The messages are acknowledged after the evaluation, so the prefetch bounds the
+        # individuals a worker holds
+        channel.basic_qos(prefetch_count=self.__prefetch_count, global_qos=True,
+                          callback=lambda _: self.__consume_individuals(channel))
+
+    def __consume_individuals(self, channel):
+        """
+        Consumes the queue of the current generation, instead of the queue of the previous one
+        """
+        if self._generation_id is None:
+            return  # consumed once the coordinator announces the generation
+        for pq in self.pausable_queues:
+            if not self._is_consumer_cancelled and pq.channel.is_open:
+                pq.channel.basic_cancel(consumer_tag=pq.consumer_tag)
+        self.pausable_queues.clear()
+        ind_q_bc_params = {
+            'queue': self.generation_queue(self._generation_id),
+            'on_message_callback': self.__on_individual_received_msg
+        }
+        # If paused, the consumer is created on resume
+        c_tag = None if self._is_consumer_cancelled else channel.basic_consume(**ind_q_bc_params)
+        self.pausable_queues.append(PausableQueue(consumer_tag=c_tag,
+                                                  basic_consume_params=ind_q_bc_params,
+                                                  channel=channel))
+
+    @property
+    def __is_consuming(self) -> bool:
+        return self._consumer_channel is not None and self._consumer_channel.is_open
+
+    @property
+    def __prefetch_count(self) -> int:
+        """
+        The prefetch in messages, it depends on how many individuals are packed per message
+        """
+        return max(1, math.ceil(self._prefetch_individuals / self._envelope_size))
+
+    def __apply_prefetch(self):
+        if self.__is_consuming and not self._is_window_shrunk:
+            self._consumer_channel.basic_qos(prefetch_count=self.__prefetch_count,
+                                             global_qos=True)
+
+    def __on_individual_received_msg(self, channel, method, properties, body):
+        if self.__is_stale(properties):  # dropped unread
             channel.basic_ack(delivery_tag=method.delivery_tag)
+            return
+        manifest = TransferManifest.from_headers(properties.headers)
+        if manifest is not None:
+            self.__start_transfer(channel, method.delivery_tag, properties, manifest)
+            return
+        individuals = self.__decode_individuals(properties, body)
+        if individuals:
+            self.__track_generation(properties, individuals)
+            self._unacked_count += 1
+            self.__on_individuals(method.delivery_tag, individuals)
         else:
-            channel.basic_nack(delivery_tag=method.delivery_tag)
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+
+    def __decode_individuals(self, properties, body) -> List[Tuple[UUID, T]] | None:
+        codec, body = self._read_payload(properties, body)
+        return codec.decode_individuals(body) if codec and body is not None else None
+
+    def __on_individuals(self, delivery_tag: int | None, individuals: List[Tuple[UUID, T]]):
+        """
+        :param delivery_tag: None if the message is already acknowledged
+        """
+        if len(individuals) != self._envelope_size:
+            self._envelope_size = len(individuals)
+            self.__apply_prefetch()
+        # Held until they are evaluated, without being acknowledged. pause runs on the ioloop
+        # after the worker gets busy, so the listeners can reject a message delivered before
+        if self._is_paused or self._held_messages \
+                or not self._notify_individuals_received(individuals):
+            self._held_messages.append((delivery_tag, individuals))
+            return
+        if delivery_tag is not None:  # acknowledged after the evaluation
+            self._last_delivery_tag = max(delivery_tag, self._last_delivery_tag or 0)
+
+    def __start_transfer(self, channel, delivery_tag: int, properties,
+                         manifest: TransferManifest):
+        # The manifest is acknowledged right away: the chunks arrive at their own pace, and
+        # a later acknowledgement of many messages at once must not include it. If the
+        # transfer fails, the individuals are sent again once the coordinator times out
+        channel.basic_ack(delivery_tag=delivery_tag)
+        if manifest.queue in self._transfers:
+            return
+        transfer = _Transfer(properties=properties, assembler=ChunkAssembler(manifest))
+        self._transfers[manifest.queue] = transfer
+        self.connection.ioloop.call_later(self._transfer_timeout,
+                                          lambda: self.__end_transfer(manifest.queue))
+        # The chunks are consumed on their own channel, so a transfer queue that expired
+        # (the broker closes the channel) doesn't affect the other consumers
+        if self._transfer_channel is None or self._transfer_channel.is_closed:
+            self._transfer_channel = self.connection.channel(
+                on_open_callback=self.__on_transfer_channel_open)
+            self._transfer_channel.add_on_close_callback(self.__on_transfer_channel_closed)
+        elif self._transfer_channel.is_open:
+            self.__consume_chunks(self._transfer_channel, manifest.queue, transfer)
+        # otherwise, the chunks are consumed once the channel is open
+
+    def __on_transfer_channel_open(self, channel):
+        for queue, transfer in self._transfers.items():
+            if transfer.consumer_tag is None:
+                self.__consume_chunks(channel, queue, transfer)
+
+    def __on_transfer_channel_closed(self, _, __):
+        for queue, transfer in list(self._transfers.items()):
+            if transfer.consumer_tag is not None:
+                self.__end_transfer(queue)
+
+    def __consume_chunks(self, channel, queue: str, transfer: _Transfer):
+        transfer.consumer_tag = channel.basic_consume(
+            queue=queue, auto_ack=True,
+            on_message_callback=lambda _, __, properties, body:
+            self.__on_chunk_received_msg(queue, properties, body))
 
-    def __on_new_generation_signal_msg(self, channel, method, _, __):
+    def __on_chunk_received_msg(self, queue: str, properties, body):
+        transfer = self._transfers.get(queue)
+        if transfer is None:
+            return
+        index = (properties.headers or {}).get(CHUNK_HEADER)
+        if not isinstance(index, int) or not transfer.assembler.add(index, body):
+            self.__end_transfer(queue)  # discarded
+            return
+        if transfer.assembler.is_complete:
+            self.__end_transfer(queue)
+            if self.__is_stale(transfer.properties):
+                return
+            individuals = self.__decode_individuals(transfer.properties,
+                                                    transfer.assembler.buffer)
+            if individuals:
+                self.__track_generation(transfer.properties, individuals)
+                self.__on_individuals(None, individuals)
+
+    def __end_transfer(self, queue: str):
+        """
+        Stops consuming the chunks of a transfer and deletes its queue. Called once it is
+        complete, and after the timeout to discard it if it is still in progress
+        """
+        transfer = self._transfers.pop(queue, None)
+        if transfer is None:
+            return
+        channel = self._transfer_channel
+        if channel is not None and channel.is_open and transfer.consumer_tag is not None:
+            channel.basic_cancel(consumer_tag=transfer.consumer_tag)
+            channel.queue_delete(queue=queue)
+
+    def __is_stale(self, properties) -> bool:
+        """
+        :return: True if the message carries individuals of a previous generation
+        """
+        generation_id = (properties.headers or {}).get(GENERATION_HEADER)
+        return generation_id is not None and generation_id != self._generation_id
+
+    def __track_generation(self, properties, individuals: List[Tuple[UUID, T]]):
+        generation_id = (properties.headers or {}).get(GENERATION_HEADER)
+        if generation_id is None:
+            return
+        with self._generations_lock:
+            for individual_id, _ in individuals:
+                self._individual_generations[individual_id] = generation_id
+
+    def __on_new_generation_signal_msg(self, channel, method, properties, __):
         channel.basic_ack(delivery_tag=method.delivery_tag)
+        generation_id = (properties.headers or {}).get(GENERATION_HEADER)
+        if generation_id is not None:
+            if generation_id == self._generation_id:
+                return  # announced again for the workers that just joined
+            self.__start_generation(generation_id)
         self.new_generation_listeners()
 
+    def __start_generation(self, generation_id: UUID):
+        previous_id, self._generation_id = self._generation_id, generation_id
+        # The results of the previous generation may still be sent, the older ones won't
+        with self._generations_lock:
+            self._individual_generations = {_id: gen_id for _id, gen_id
+                                            in self._individual_generations.items()
+                                            if gen_id == previous_id}
+        # The held individuals belong to the previous generation
+        held, self._held_messages = self._held_messages, []
+        for tag, _ in held:
+            if tag is not None and self.__is_consuming:
+                self._consumer_channel.basic_ack(delivery_tag=tag)
+        self._unacked_count -= sum(1 for tag, _ in held if tag is not None)
+        if self.__is_consuming:
+            self.__consume_individuals(self._consumer_channel)
+
     def __on_experiment_termination_signal_msg(self, channel, method, _, __):
         self.experiment_termination_listeners()
         channel.basic_ack(delivery_tag=method.delivery_tag)
-
-    @staticmethod
-    def __message_parser(raw_msg: str | bytes | bytearray) -> Tuple[UUID, T] | None:
-        try:
-            msg = json.loads(raw_msg)
-        except TypeError:
-            return None
-        if 'id' not in msg or 'encoding' not in msg:
-            return None
-        return msg['id'], msg['encoding']